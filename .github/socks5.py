@@ -22,6 +22,13 @@ import geoip2.database # 需要 pip install geoip2
 import logging
 import platform
 
+# 批量地理位置查询（项目根目录的 geo_batch.py，可选）
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+try:
+    from geo_batch import GeoBatchResolver
+except ImportError:
+    GeoBatchResolver = None
+
 # ================== 高级配置 ===================
 SOURCES = [
     # 主流高质量源（高覆盖面）
@@ -176,6 +183,7 @@ class IndustrialCleaner:
         self.clean_proxies = []
         self.reader = None
         self.fetch_connector = None
+        self.ip_info_cache = {}  # 批量预查询得到的 IP 信息
         self.logger = logging.getLogger(__name__)
         if USE_LOCAL_DB:
             try:
@@ -375,9 +383,37 @@ class IndustrialCleaner:
 
         return score, reasons
 
+    async def prefetch_ip_info(self, exit_ips):
+        """从本机通过 ip-api /batch 批量查询已通过探测的代理的出口 IP（每批100个），
+        避免逐个经过慢速代理查询；未解析到的 IP 由 fetch_ip_info 逐个兜底"""
+        exit_ips = {ip for ip in exit_ips if ip and ip not in self.ip_info_cache}
+        if not exit_ips:
+            return
+        if GeoBatchResolver is None:
+            self.logger.info('geo_batch not available, falling back to per-proxy ip info lookups')
+            return
+
+        resolver = GeoBatchResolver()
+        try:
+            results = await resolver.resolve(exit_ips)
+        except Exception as e:
+            self.logger.warning('batch ip info lookup failed, falling back to per-proxy lookups: %s', e)
+            return
+        for ip, geo in results.items():
+            self.ip_info_cache[ip] = {
+                'status': 'success',
+                'countryCode': geo.get('country_code'),
+                'isp': geo.get('isp'),
+                'mobile': geo.get('mobile', False),
+                'hosting': geo.get('hosting', False),
+                'query': ip,
+            }
+        self.logger.info('batch-resolved ip info for %s/%s exit ips in %s batches',
+                         len(results), len(exit_ips), resolver.batches_sent)
+
     async def fetch_ip_info(self, ip, connector):
         """轮询多个IP信息提供商，顺序优化以避免限流：ip-api > ipinfo > ipapi.co
-        每个请求加随机延迟(0.2-0.8s) 以规避并发限流"""
+        所有提供商复用同一个会话；仅在切换到下一个提供商前加随机延迟以规避限流"""
         import random
         
         providers = [
@@ -386,14 +422,15 @@ class IndustrialCleaner:
             ('ipapi', 'https://ipapi.co/{ip}/json/', 0.8),  # 放在最后以规避其限流
         ]
         
-        for prov_name, url_tpl, base_delay in providers:
-            # 随机延迟 + base_delay，避免并发一起请求同一提供商
-            delay = base_delay + random.uniform(0.2, 0.8)
-            await asyncio.sleep(delay)
-            
-            url = url_tpl.format(ip=ip)
-            try:
-                async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=10)) as session:
+        async with aiohttp.ClientSession(connector=connector, connector_owner=False,
+                                         timeout=aiohttp.ClientTimeout(total=10)) as session:
+            for index, (prov_name, url_tpl, base_delay) in enumerate(providers):
+                if index > 0:
+                    # 上一个提供商失败，随机延迟后再请求下一个
+                    await asyncio.sleep(base_delay + random.uniform(0.2, 0.8))
+                
+                url = url_tpl.format(ip=ip)
+                try:
                     async with session.get(url, ssl=False) as resp:
                         if resp.status != 200:
                             continue
@@ -420,8 +457,8 @@ class IndustrialCleaner:
                                 'hosting': data.get('is_datacenter', False),
                                 'query': ip,
                             }
-            except Exception:
-                continue
+                except Exception:
+                    continue
         return None
 
     async def test_proxy_connectivity(self, proxy_url, connector, timeout=8):
@@ -435,7 +472,8 @@ class IndustrialCleaner:
         ]
         try:
             # 使用传入的 ProxyConnector 去请求外部 URL
-            async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+            async with aiohttp.ClientSession(connector=connector, connector_owner=False,
+                                             timeout=aiohttp.ClientTimeout(total=timeout)) as session:
                 for url in test_urls:
                     try:
                         async with session.get(url, ssl=False) as resp:
@@ -449,7 +487,34 @@ class IndustrialCleaner:
             return False
         return False
 
-    async def verify_proxy(self, ip_port):
+    async def fetch_exit_ip(self, connector, timeout=8):
+        """经代理请求回显服务，返回出口 IP（同时确认代理可用），失败返回 None"""
+        echo_urls = [
+            ("https://www.cloudflare.com/cdn-cgi/trace", 'trace'),
+            ("https://api.ipify.org", 'text'),
+        ]
+        try:
+            async with aiohttp.ClientSession(connector=connector, connector_owner=False,
+                                             timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+                for url, kind in echo_urls:
+                    try:
+                        async with session.get(url, ssl=False) as resp:
+                            if resp.status != 200:
+                                continue
+                            text = (await resp.text()).strip()
+                    except Exception:
+                        continue
+                    if kind == 'trace':
+                        # cdn-cgi/trace 每行 key=value，其中 ip= 为请求来源地址
+                        text = next((line[3:] for line in text.splitlines() if line.startswith('ip=')), '')
+                    if re.match(r'^[0-9a-fA-F:.]+$', text):
+                        return text
+        except Exception:
+            return None
+        return None
+
+    async def probe_proxy(self, ip_port):
+        """第一阶段：本地库初筛 + 经代理实测，返回探测结果（含出口 IP），不可用返回 None"""
         ip = ip_port.split(":")[0]
         try:
             port = int(ip_port.split(":")[1])
@@ -460,10 +525,9 @@ class IndustrialCleaner:
         if USE_LOCAL_DB and not self.check_local_db(ip):
             return None
 
-        # --- 第三道防线：真机实测 (最慢，最后做) ---
+        # --- 第二道防线：真机实测 ---
         proxy_url = f"socks5://{ip_port}"
         connector = ProxyConnector.from_url(proxy_url, rdns=True)
-        
         try:
             # 真实外网连通性测试（可配置强度，默认禁用以提高通过率）
             connectivity_ok = True  # 默认跳过，除非用户显式启用
@@ -476,7 +540,36 @@ class IndustrialCleaner:
                     # balanced/lenient 继续，但稍后会扣分
                     connectivity_ok = False
 
-            data = await self.fetch_ip_info(ip, connector)
+            # 获取出口 IP 即确认代理可用；地理信息稍后按出口 IP 批量查询
+            exit_ip = await self.fetch_exit_ip(connector, timeout=getattr(self, 'connectivity_timeout', 8))
+            if not exit_ip:
+                return None
+            return {
+                'ip_port': ip_port,
+                'ip': ip,
+                'port': port,
+                'exit_ip': exit_ip,
+                'connectivity_ok': connectivity_ok,
+            }
+        except Exception as e:
+            self.logger.debug("probe_proxy failed for %s: %s", ip_port, e)
+            return None
+        finally:
+            await connector.close()
+
+    async def evaluate_proxy(self, probe):
+        """第二阶段：按出口 IP 的地理信息（批量结果，缺失时逐个兜底查询）、DNSBL 和打分做决策"""
+        ip_port, ip, port = probe['ip_port'], probe['ip'], probe['port']
+        proxy_url = f"socks5://{ip_port}"
+
+        try:
+            data = self.ip_info_cache.get(probe['exit_ip'])
+            if not data:
+                connector = ProxyConnector.from_url(proxy_url, rdns=True)
+                try:
+                    data = await self.fetch_ip_info(probe['exit_ip'], connector)
+                finally:
+                    await connector.close()
             if not data:
                 return None
 
@@ -500,7 +593,7 @@ class IndustrialCleaner:
                 reasons.append('dnsbl')
 
             # 连通性测试在 balanced/lenient 模式下扣分
-            if not connectivity_ok and FILTER_MODE in ('balanced', 'lenient'):
+            if not probe['connectivity_ok'] and FILTER_MODE in ('balanced', 'lenient'):
                 score -= 0.5
                 reasons.append('connectivity_weak')
 
@@ -528,20 +621,34 @@ class IndustrialCleaner:
                 self.logger.info('%s rejected by score %.2f < %.2f', ip_port, score, threshold)
                 return None
         except Exception as e:
-            if hasattr(self, 'logger'):
-                self.logger.debug("verify_proxy failed for %s: %s", ip_port, e)
+            self.logger.debug("evaluate_proxy failed for %s: %s", ip_port, e)
             return None
 
+    async def verify_proxy(self, ip_port):
+        """单个代理的完整检测（探测 -> 出口 IP 信息 -> 打分）"""
+        probe = await self.probe_proxy(ip_port)
+        if not probe:
+            return None
+        await self.prefetch_ip_info([probe['exit_ip']])
+        return await self.evaluate_proxy(probe)
+
     async def run(self):
         await self.fetch_sources()
         
         sem = asyncio.Semaphore(MAX_CONCURRENCY)
-        async def bounded(p):
+        async def bounded(coro_func, arg):
             async with sem:
-                res = await self.verify_proxy(p)
-                if res: self.clean_proxies.append(res)
+                return await coro_func(arg)
+
+        # 先探测全部候选，只为探测通过的代理按出口 IP 批量查询地理信息，再逐个打分
+        probes = await asyncio.gather(*[bounded(self.probe_proxy, p) for p in self.raw_proxies])
+        probes = [probe for probe in probes if probe]
+        self.logger.info('%s/%s candidates passed probing', len(probes), len(self.raw_proxies))
+
+        await self.prefetch_ip_info(probe['exit_ip'] for probe in probes)
 
-        await asyncio.gather(*[bounded(p) for p in self.raw_proxies])
+        results = await asyncio.gather(*[bounded(self.evaluate_proxy, probe) for probe in probes])
+        self.clean_proxies.extend(res for res in results if res)
 
         if self.clean_proxies:
             with open("Industrial_Socks5.txt", "w", encoding='utf-8') as f:
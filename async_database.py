@@ -0,0 +1,132 @@
+"""
+异步数据库访问模块
+在事件循环外执行 ProxyDatabase 的同步调用：写操作排入单个写线程的队列按提交顺序执行，
+读操作由一个小的读线程池并发执行（WAL 模式下读取不被写入阻塞）。
+方法名与 ProxyDatabase 相同，只是需要 await，事件循环不再因磁盘 I/O 停顿
+"""
+
+import asyncio
+import functools
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Union
+
+from proxy_database import ProxyDatabase
+
+
+# 只读方法，交给读线程池；其余公开方法一律视为写操作，在写线程上串行执行
+READ_METHODS = frozenset({
+    'is_blacklisted',
+    'get_blacklisted_proxies',
+    'get_blacklist_index',
+    'get_blacklist_stats',
+    'get_proxy_stats',
+    'get_stats_bulk',
+    'get_latency_percentiles',
+    'get_best_proxies',
+    'get_all_active_proxies',
+    'get_subnet_proxies',
+    'get_daily_history',
+    'get_database_stats',
+    'get_source_health',
+})
+
+
+class AsyncProxyDatabase:
+    """ProxyDatabase 的异步外观（一个写线程 + 读线程池）"""
+
+    def __init__(self, db: Union[ProxyDatabase, str] = "proxies.db", readers: int = 4):
+        """
+        Args:
+            db: 已创建的 ProxyDatabase 或数据库路径
+            readers: 读线程数
+        """
+        self.db = db if isinstance(db, ProxyDatabase) else ProxyDatabase(db)
+        self.logger = logging.getLogger(__name__)
+
+        # 单线程执行器即一个先进先出的写队列：写操作之间不争用写锁，且按提交顺序生效
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='db-writer')
+        self._readers = ThreadPoolExecutor(max_workers=max(1, readers), thread_name_prefix='db-reader')
+
+    def __getattr__(self, name: str):
+        """
+        按 ProxyDatabase 的同名方法生成协程函数
+
+        私有成员和非方法属性（如 db_path）直接返回原值
+        """
+        attr = getattr(self.db, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+
+        executor = self._readers if name in READ_METHODS else self._writer
+
+        @functools.wraps(attr)
+        async def call(*args, **kwargs):
+            return await self.run(executor, attr, *args, **kwargs)
+
+        # 缓存到实例上，之后的访问不再经过 __getattr__
+        setattr(self, name, call)
+        return call
+
+    async def run(self, executor: ThreadPoolExecutor, func, *args, **kwargs):
+        """在指定的执行器中运行同步函数并等待结果"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+
+    async def read(self, func, *args, **kwargs):
+        """在读线程池中运行任意只读函数（如直接使用 self.db 的组合查询）"""
+        return await self.run(self._readers, func, *args, **kwargs)
+
+    async def write(self, func, *args, **kwargs):
+        """排入写队列运行任意写函数"""
+        return await self.run(self._writer, func, *args, **kwargs)
+
+    async def close(self):
+        """等待已提交的读写完成，停止线程并关闭所有连接"""
+        await asyncio.to_thread(self._shutdown)
+
+    def _shutdown(self):
+        self._readers.shutdown(wait=True)
+        self._writer.shutdown(wait=True)
+        self.db.close()
+
+    async def __aenter__(self) -> 'AsyncProxyDatabase':
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+
+async def example_usage():
+    """示例：写入一批验证结果的同时，事件循环上的心跳任务不受影响"""
+    import random
+    import tempfile
+    from pathlib import Path
+
+    from db_benchmark import make_entries
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        async with AsyncProxyDatabase(str(Path(tmp_dir) / 'proxies.db')) as db:
+            stalls = []
+
+            async def heartbeat():
+                while True:
+                    start = time.perf_counter()
+                    await asyncio.sleep(0.01)
+                    stalls.append(time.perf_counter() - start - 0.01)
+
+            ticker = asyncio.create_task(heartbeat())
+            for _ in range(5):
+                await db.save_validation_batch(make_entries(5000, 5000, rng))
+            best, stats = await asyncio.gather(db.get_best_proxies(limit=5, min_checks=1),
+                                               db.get_database_stats())
+            ticker.cancel()
+
+            print(f"写入 {stats['total_validations']} 条验证记录, 最佳代理 {len(best)} 个")
+            print(f"事件循环最长停顿 {max(stalls) * 1000:.1f}ms (心跳 {len(stalls)} 次)")
+
+
+if __name__ == "__main__":
+    asyncio.run(example_usage())
@@ -0,0 +1,202 @@
+"""
+流式带宽测量模块
+分块读取测试文件，按滑动窗口估算吞吐量，估值稳定或明显低于下限时提前结束，
+返回真实的 KB/s 和首字节时间 (TTFB)，而不是只给出分档评分
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Dict, Optional
+
+import aiohttp
+from aiohttp import web
+
+
+# 默认测试文件（约100KB）
+DEFAULT_BANDWIDTH_URL = "http://speedtest.ftp.otenet.gr/files/test100k.db"
+
+CHUNK_SIZE = 16 * 1024
+
+
+async def measure_bandwidth(session: aiohttp.ClientSession, url: str = DEFAULT_BANDWIDTH_URL,
+                            timeout: float = 15, max_bytes: int = 1024 * 1024,
+                            window: float = 0.5, min_bytes: int = 64 * 1024,
+                            stable_tolerance: float = 0.1, floor_kbps: float = 20,
+                            floor_grace: float = 2.0) -> Dict:
+    """
+    流式测量下载带宽
+
+    Args:
+        session: aiohttp 会话（通常经过代理）
+        url: 测试文件地址
+        timeout: 总超时(秒)
+        max_bytes: 最多读取的字节数
+        window: 滑动窗口长度(秒)
+        min_bytes: 判定估值稳定前至少读取的字节数
+        stable_tolerance: 连续两个窗口估值的相对差不超过该值即视为稳定
+        floor_kbps: 速度下限(KB/s)，读取 floor_grace 秒后仍低于下限则提前结束
+        floor_grace: 判定低于下限前的观察时间(秒)
+
+    Returns:
+        {'bandwidth_kbps', 'ttfb', 'bytes', 'duration', 'stopped'}，
+        stopped 为结束原因: complete / stable / below_floor / max_bytes
+    """
+    start = time.monotonic()
+    ttfb = None
+    total = 0
+    samples = deque()  # (时间, 累计字节)
+    last_estimate = None
+    final_estimate = None  # 触发提前结束的窗口估值
+    next_check = None
+    stopped = 'complete'
+
+    async with session.get(url, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+        if response.status != 200:
+            raise aiohttp.ClientResponseError(
+                response.request_info, response.history, status=response.status
+            )
+
+        async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+            now = time.monotonic()
+            if ttfb is None:
+                ttfb = now - start
+                # 从首字节开始计时，排除握手和服务器响应延迟
+                samples.append((now, 0))
+                next_check = now + window
+
+            total += len(chunk)
+            samples.append((now, total))
+            while len(samples) > 2 and now - samples[1][0] >= window:
+                samples.popleft()
+
+            if total >= max_bytes:
+                stopped = 'max_bytes'
+                break
+
+            # 每个窗口评估一次，比较相邻两个窗口的估值
+            if now < next_check:
+                continue
+            next_check = now + window
+
+            span = now - samples[0][0]
+            estimate = (total - samples[0][1]) / 1024 / span
+            if total >= min_bytes and last_estimate and \
+                    abs(estimate - last_estimate) <= stable_tolerance * last_estimate:
+                stopped = 'stable'
+                final_estimate = estimate
+                break
+            if now - start >= floor_grace and estimate < floor_kbps:
+                stopped = 'below_floor'
+                final_estimate = estimate
+                break
+            last_estimate = estimate
+
+    duration = time.monotonic() - start
+    transfer_time = duration - (ttfb or 0)
+    if final_estimate is not None:
+        kbps = final_estimate
+    else:
+        kbps = total / 1024 / transfer_time if transfer_time > 0 else 0.0
+
+    return {
+        'bandwidth_kbps': round(kbps, 2),
+        'ttfb': round(ttfb, 4) if ttfb is not None else None,
+        'bytes': total,
+        'duration': round(duration, 4),
+        'stopped': stopped,
+    }
+
+
+def bandwidth_score(kbps: Optional[float]) -> int:
+    """
+    将 KB/s 映射为 0-10 的带宽评分
+
+    >1000KB/s=10分, >500=8分, >200=6分, >100=4分, >50=2分, 其余=1分
+    """
+    if not kbps:
+        return 0
+    if kbps > 1000:
+        return 10
+    elif kbps > 500:
+        return 8
+    elif kbps > 200:
+        return 6
+    elif kbps > 100:
+        return 4
+    elif kbps > 50:
+        return 2
+    return 1
+
+
+# ========== 本地文件服务器（测试用） ==========
+
+def create_file_server_app(size: int = 1024 * 1024, rate_kbps: Optional[float] = None,
+                           delay: float = 0) -> web.Application:
+    """
+    创建提供测试文件的 aiohttp 应用
+
+    Args:
+        size: 文件大小(字节)
+        rate_kbps: 限速(KB/s)，None 表示不限速
+        delay: 发送首字节前的延迟(秒)，用于模拟 TTFB
+    """
+    app = web.Application()
+
+    async def handle_file(request: web.Request) -> web.StreamResponse:
+        response = web.StreamResponse(headers={'Content-Type': 'application/octet-stream'})
+        response.content_length = size
+        await response.prepare(request)
+
+        if delay:
+            await asyncio.sleep(delay)
+
+        chunk = b'\0' * CHUNK_SIZE
+        sent = 0
+        try:
+            while sent < size:
+                part = chunk[:min(CHUNK_SIZE, size - sent)]
+                await response.write(part)
+                sent += len(part)
+                if rate_kbps:
+                    await asyncio.sleep(len(part) / 1024 / rate_kbps)
+            await response.write_eof()
+        except ConnectionResetError:
+            pass  # 客户端提前结束测量
+        return response
+
+    app.router.add_get('/{name:.*}', handle_file)
+    return app
+
+
+async def start_file_server(size: int = 1024 * 1024, rate_kbps: Optional[float] = None,
+                            delay: float = 0, host: str = '127.0.0.1', port: int = 0):
+    """
+    启动本地文件服务器
+
+    Returns:
+        (runner, file_url)，用完后调用 await runner.cleanup()
+    """
+    runner = web.AppRunner(create_file_server_app(size, rate_kbps, delay))
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+
+    bound_port = runner.addresses[0][1]
+    return runner, f"http://{host}:{bound_port}/test.bin"
+
+
+async def example_usage():
+    """示例：对本地限速文件服务器测量带宽"""
+    for rate in (None, 400, 10):
+        runner, url = await start_file_server(size=2 * 1024 * 1024, rate_kbps=rate, delay=0.05)
+        try:
+            async with aiohttp.ClientSession() as session:
+                result = await measure_bandwidth(session, url)
+            print(f"限速 {rate or '无'} KB/s: {result} -> 评分 {bandwidth_score(result['bandwidth_kbps'])}")
+        finally:
+            await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(example_usage())
@@ -0,0 +1,221 @@
+"""
+黑名单紧凑索引模块
+将 IPv4 ip:port 打包为 48 位整数 (ip << 16 | port)，排序后存入 array('Q')，
+按二分查找判断成员关系；非 IPv4 地址退回精确的字符串集合。
+批量过滤时先按字符串哈希预筛，命中的少数候选再精确判断。
+索引可持久化到数据库旁的二进制文件，启动时直接加载，无需重新查询和构建
+"""
+
+import bisect
+import logging
+import socket
+import struct
+import sys
+import time
+from array import array
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+
+from atomic_writer import atomic_write
+
+
+logger = logging.getLogger(__name__)
+
+# 文件头: 魔数, 数据来源指纹(两个整数), 整数键数量, 回退字符串区字节数
+_HEADER = struct.Struct('<4sqqQQ')
+_MAGIC = b'PBL1'
+
+
+def pack_address(address: str) -> Optional[int]:
+    """
+    将 "ip:port" 打包为 48 位整数
+
+    只接受规范写法（无前导零、无空白），保证打包前后的文本一一对应
+
+    Returns:
+        (ip << 16) | port，不是规范的 IPv4 地址和端口时返回 None
+    """
+    host, sep, port = address.rpartition(':')
+    if not (sep and port.isascii() and port.isdigit() and len(port) <= 5):
+        return None
+    if port[0] == '0' and port != '0':
+        return None
+    try:
+        packed_ip = socket.inet_pton(socket.AF_INET, host)
+    except OSError:
+        return None
+    port_number = int(port)
+    if port_number > 0xFFFF:
+        return None
+    return int.from_bytes(packed_ip, 'big') << 16 | port_number
+
+
+def unpack_address(key: int) -> str:
+    """将 48 位整数还原为 "ip:port" """
+    return f"{socket.inet_ntoa((key >> 16).to_bytes(4, 'big'))}:{key & 0xFFFF}"
+
+
+class BlacklistIndex:
+    """黑名单成员关系索引（排序整数数组 + 非 IPv4 地址的字符串集合）"""
+
+    __slots__ = ('keys', 'fallback', 'fingerprint', '_hashes')
+
+    def __init__(self, keys: Optional[array] = None, fallback: Iterable[str] = (),
+                 fingerprint: Tuple[int, int] = (0, 0)):
+        """
+        Args:
+            keys: 已排序、去重的打包地址
+            fallback: 无法打包的地址
+            fingerprint: 构建时数据来源的指纹，用于判断持久化文件是否过期
+        """
+        self.keys = keys if keys is not None else array('Q')
+        self.fallback = frozenset(fallback)
+        self.fingerprint = tuple(fingerprint)
+        self._hashes = None
+
+    @classmethod
+    def from_addresses(cls, addresses: Iterable[str],
+                       fingerprint: Tuple[int, int] = (0, 0)) -> 'BlacklistIndex':
+        """由地址列表构建"""
+        keys = set()
+        fallback = []
+        for address in addresses:
+            key = pack_address(address)
+            if key is None:
+                fallback.append(address)
+            else:
+                keys.add(key)
+        return cls(array('Q', sorted(keys)), fallback, fingerprint)
+
+    def __len__(self) -> int:
+        return len(self.keys) + len(self.fallback)
+
+    def __contains__(self, address: str) -> bool:
+        key = pack_address(address)
+        if key is None:
+            return address in self.fallback
+        index = bisect.bisect_left(self.keys, key)
+        return index < len(self.keys) and self.keys[index] == key
+
+    def __iter__(self):
+        for key in self.keys:
+            yield unpack_address(key)
+        yield from self.fallback
+
+    @property
+    def nbytes(self) -> int:
+        """整数键占用的内存(字节)"""
+        return self.keys.buffer_info()[1] * self.keys.itemsize
+
+    def filter(self, candidates: Iterable[str]) -> List[str]:
+        """
+        过滤掉黑名单中的候选地址
+
+        先用字符串哈希的排序数组整批预筛（NumPy 二分查找），
+        只有哈希命中的少数候选再做精确判断，避免逐个解析所有地址
+
+        Returns:
+            不在黑名单中的地址，顺序与输入一致
+        """
+        candidates = list(candidates)
+        if not candidates or not len(self):
+            return candidates
+
+        hashes = self._member_hashes()
+        values = np.fromiter(map(hash, candidates), dtype=np.int64, count=len(candidates))
+        positions = np.searchsorted(hashes, values)
+        np.minimum(positions, len(hashes) - 1, out=positions)
+
+        keep = np.ones(len(candidates), dtype=bool)
+        for position in np.flatnonzero(hashes[positions] == values).tolist():
+            if candidates[position] in self:
+                keep[position] = False
+        return [candidates[position] for position in np.flatnonzero(keep).tolist()]
+
+    def _member_hashes(self) -> np.ndarray:
+        """成员地址字符串哈希的排序数组（首次过滤时构建，哈希随进程变化，不持久化）"""
+        if self._hashes is None:
+            members = list(self)
+            self._hashes = np.sort(np.fromiter(map(hash, members), dtype=np.int64, count=len(members)))
+        return self._hashes
+
+    def to_bytes(self) -> bytes:
+        """序列化（整数键按小端存储，回退地址以换行分隔）"""
+        keys = self.keys
+        if sys.byteorder == 'big':
+            keys = array('Q', keys)
+            keys.byteswap()
+        fallback = '\n'.join(sorted(self.fallback)).encode('utf-8')
+        header = _HEADER.pack(_MAGIC, self.fingerprint[0], self.fingerprint[1], len(keys), len(fallback))
+        return header + keys.tobytes() + fallback
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'BlacklistIndex':
+        """从序列化数据恢复（格式不符时抛出 ValueError）"""
+        if len(data) < _HEADER.size:
+            raise ValueError("黑名单索引数据不完整")
+        magic, count, max_id, key_count, fallback_size = _HEADER.unpack_from(data)
+        keys_end = _HEADER.size + key_count * 8
+        if magic != _MAGIC or len(data) != keys_end + fallback_size:
+            raise ValueError("黑名单索引数据格式错误")
+
+        keys = array('Q')
+        keys.frombytes(data[_HEADER.size:keys_end])
+        if sys.byteorder == 'big':
+            keys.byteswap()
+        fallback_data = data[keys_end:].decode('utf-8')
+        fallback = fallback_data.split('\n') if fallback_data else []
+        return cls(keys, fallback, (count, max_id))
+
+    def save(self, path: Union[str, Path]) -> bool:
+        """原子写入到文件"""
+        return atomic_write(path, self.to_bytes(), mode='wb')
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> Optional['BlacklistIndex']:
+        """从文件加载，文件不存在或已损坏时返回 None"""
+        try:
+            return cls.from_bytes(Path(path).read_bytes())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"黑名单索引文件 {path} 无法读取: {e}")
+            return None
+
+
+def example_usage():
+    """示例：10 万候选代理对 1 万条黑名单过滤"""
+    import random
+    import tempfile
+
+    rng = random.Random(0)
+    candidates = [
+        f"{rng.randrange(1, 224)}.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(256)}"
+        f":{rng.randrange(1, 65536)}"
+        for _ in range(100_000)
+    ]
+    blacklisted = rng.sample(candidates, 10_000)
+
+    index = BlacklistIndex.from_addresses(blacklisted, fingerprint=(len(blacklisted), len(blacklisted)))
+    as_set = set(blacklisted)
+    set_bytes = sys.getsizeof(as_set) + sum(sys.getsizeof(address) for address in as_set)
+    print(f"黑名单 {len(index)} 条: 索引 {index.nbytes / 1024:.0f}KB, 字符串集合 {set_bytes / 1024:.0f}KB")
+
+    start = time.perf_counter()
+    remaining = index.filter(candidates)
+    print(f"过滤 {len(candidates)} 个候选耗时 {(time.perf_counter() - start) * 1000:.1f}ms, "
+          f"剩余 {len(remaining)} 个")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = Path(tmp_dir) / 'proxies.db.blacklist'
+        index.save(path)
+        start = time.perf_counter()
+        loaded = BlacklistIndex.load(path)
+        print(f"从文件加载耗时 {(time.perf_counter() - start) * 1000:.2f}ms, "
+              f"文件 {path.stat().st_size / 1024:.0f}KB, 一致: {loaded.keys == index.keys}")
+
+
+if __name__ == "__main__":
+    example_usage()
@@ -2,8 +2,10 @@
 配置文件模块
 """
 
-from dataclasses import dataclass
-from typing import List, Dict
+from dataclasses import dataclass, field
+from typing import List, Dict, FrozenSet, Optional, Tuple
+
+from country_codes import compile_country_set
 
 
 @dataclass
@@ -21,10 +23,24 @@ class Config:
     # 验证配置
     test_urls: List[str] = None
     max_retries: int = 2
+    # Judge 地址: 一次请求同时得到可用性、出口IP和匿名级别
+    # 可用 judge_server.py 自建，默认使用格式兼容的 httpbin.org/get
+    judge_url: str = "http://httpbin.org/get"
+    
+    # 评分权重 (键同 scoring.ScoringWeights，None 表示默认权重)
+    scoring_weights: Dict = None
     
     # 过滤配置
     min_score: float = 0.0
     target_countries: List[str] = None  # 国家白名单
+    # 探测前用本地 GeoIP 库按入口IP预过滤国家 (GeoLite2-Country/City .mmdb 路径，None 表示不启用)
+    geoip_db_path: str = None
+    geoip_tolerance: float = 0.05  # 入口IP不在白名单的候选仍按此比例抽样探测（出口IP可能在别国）
+    
+    # 国家白名单编译结果缓存: (白名单快照, 代码集合)
+    _country_codes_cache: Optional[Tuple[Tuple[str, ...], FrozenSet[str]]] = field(
+        default=None, init=False, repr=False, compare=False
+    )
     
     def __post_init__(self):
         if self.sources is None:
@@ -88,21 +104,17 @@ class Config:
                 # ❌ 已移除: Hong Kong (审查风险，稳定性差)
             ]
         
-        # 国家名称映射（用于处理不同的国家名称格式）
-        self.country_aliases = {
-            "US": "United States",
-            "USA": "United States", 
-            "UK": "United Kingdom",
-            "TW": "Taiwan",
-            "KR": "South Korea",
-            "JP": "Japan",
-            "SG": "Singapore",
-            "CA": "Canada",
-            "AU": "Australia",
-            "NL": "Netherlands",
-            "CH": "Switzerland",
-            "SE": "Sweden",
-            "DE": "Germany",
-            "FR": "France",
-            "GB": "United Kingdom",
-        }
\ No newline at end of file
+        # 启动时即编译一次国家白名单，拼写错误尽早报出
+        self.target_country_codes
+    
+    @property
+    def target_country_codes(self) -> FrozenSet[str]:
+        """
+        国家白名单编译成的 ISO 两字母代码集合（名称/别名/代码均可，见 country_codes.py）
+
+        过滤和分组时直接做集合查找；target_countries 被重新赋值或修改后自动重新编译
+        """
+        key = tuple(self.target_countries or ())
+        if self._country_codes_cache is None or self._country_codes_cache[0] != key:
+            self._country_codes_cache = (key, compile_country_set(key))
+        return self._country_codes_cache[1]
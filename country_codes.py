@@ -0,0 +1,620 @@
+"""
+ISO-3166 国家代码表模块
+提供国家名称/别名/三字母代码 → 两字母代码的标准化，以及国家白名单集合的预编译
+"""
+
+import logging
+from typing import Dict, FrozenSet, Iterable, Optional
+
+
+logger = logging.getLogger(__name__)
+
+# 未知国家代码（与数据库和订阅文件中的历史取值保持一致）
+UNKNOWN_CODE = 'UN'
+
+# ISO-3166-1 alpha-2 → 常用名称（与 ip-api 返回的国家名一致）
+COUNTRY_NAMES: Dict[str, str] = {
+    'AD': 'Andorra',
+    'AE': 'United Arab Emirates',
+    'AF': 'Afghanistan',
+    'AG': 'Antigua and Barbuda',
+    'AI': 'Anguilla',
+    'AL': 'Albania',
+    'AM': 'Armenia',
+    'AO': 'Angola',
+    'AQ': 'Antarctica',
+    'AR': 'Argentina',
+    'AS': 'American Samoa',
+    'AT': 'Austria',
+    'AU': 'Australia',
+    'AW': 'Aruba',
+    'AX': 'Åland',
+    'AZ': 'Azerbaijan',
+    'BA': 'Bosnia and Herzegovina',
+    'BB': 'Barbados',
+    'BD': 'Bangladesh',
+    'BE': 'Belgium',
+    'BF': 'Burkina Faso',
+    'BG': 'Bulgaria',
+    'BH': 'Bahrain',
+    'BI': 'Burundi',
+    'BJ': 'Benin',
+    'BL': 'Saint Barthélemy',
+    'BM': 'Bermuda',
+    'BN': 'Brunei',
+    'BO': 'Bolivia',
+    'BQ': 'Bonaire, Sint Eustatius, and Saba',
+    'BR': 'Brazil',
+    'BS': 'Bahamas',
+    'BT': 'Bhutan',
+    'BV': 'Bouvet Island',
+    'BW': 'Botswana',
+    'BY': 'Belarus',
+    'BZ': 'Belize',
+    'CA': 'Canada',
+    'CC': 'Cocos (Keeling) Islands',
+    'CD': 'DR Congo',
+    'CF': 'Central African Republic',
+    'CG': 'Congo Republic',
+    'CH': 'Switzerland',
+    'CI': 'Ivory Coast',
+    'CK': 'Cook Islands',
+    'CL': 'Chile',
+    'CM': 'Cameroon',
+    'CN': 'China',
+    'CO': 'Colombia',
+    'CR': 'Costa Rica',
+    'CU': 'Cuba',
+    'CV': 'Cabo Verde',
+    'CW': 'Curaçao',
+    'CX': 'Christmas Island',
+    'CY': 'Cyprus',
+    'CZ': 'Czechia',
+    'DE': 'Germany',
+    'DJ': 'Djibouti',
+    'DK': 'Denmark',
+    'DM': 'Dominica',
+    'DO': 'Dominican Republic',
+    'DZ': 'Algeria',
+    'EC': 'Ecuador',
+    'EE': 'Estonia',
+    'EG': 'Egypt',
+    'EH': 'Western Sahara',
+    'ER': 'Eritrea',
+    'ES': 'Spain',
+    'ET': 'Ethiopia',
+    'FI': 'Finland',
+    'FJ': 'Fiji',
+    'FK': 'Falkland Islands',
+    'FM': 'Micronesia',
+    'FO': 'Faroe Islands',
+    'FR': 'France',
+    'GA': 'Gabon',
+    'GB': 'United Kingdom',
+    'GD': 'Grenada',
+    'GE': 'Georgia',
+    'GF': 'French Guiana',
+    'GG': 'Guernsey',
+    'GH': 'Ghana',
+    'GI': 'Gibraltar',
+    'GL': 'Greenland',
+    'GM': 'Gambia',
+    'GN': 'Guinea',
+    'GP': 'Guadeloupe',
+    'GQ': 'Equatorial Guinea',
+    'GR': 'Greece',
+    'GS': 'South Georgia and the South Sandwich Islands',
+    'GT': 'Guatemala',
+    'GU': 'Guam',
+    'GW': 'Guinea-Bissau',
+    'GY': 'Guyana',
+    'HK': 'Hong Kong',
+    'HM': 'Heard and McDonald Islands',
+    'HN': 'Honduras',
+    'HR': 'Croatia',
+    'HT': 'Haiti',
+    'HU': 'Hungary',
+    'ID': 'Indonesia',
+    'IE': 'Ireland',
+    'IL': 'Israel',
+    'IM': 'Isle of Man',
+    'IN': 'India',
+    'IO': 'British Indian Ocean Territory',
+    'IQ': 'Iraq',
+    'IR': 'Iran',
+    'IS': 'Iceland',
+    'IT': 'Italy',
+    'JE': 'Jersey',
+    'JM': 'Jamaica',
+    'JO': 'Jordan',
+    'JP': 'Japan',
+    'KE': 'Kenya',
+    'KG': 'Kyrgyzstan',
+    'KH': 'Cambodia',
+    'KI': 'Kiribati',
+    'KM': 'Comoros',
+    'KN': 'St Kitts and Nevis',
+    'KP': 'North Korea',
+    'KR': 'South Korea',
+    'KW': 'Kuwait',
+    'KY': 'Cayman Islands',
+    'KZ': 'Kazakhstan',
+    'LA': 'Laos',
+    'LB': 'Lebanon',
+    'LC': 'Saint Lucia',
+    'LI': 'Liechtenstein',
+    'LK': 'Sri Lanka',
+    'LR': 'Liberia',
+    'LS': 'Lesotho',
+    'LT': 'Lithuania',
+    'LU': 'Luxembourg',
+    'LV': 'Latvia',
+    'LY': 'Libya',
+    'MA': 'Morocco',
+    'MC': 'Monaco',
+    'MD': 'Moldova',
+    'ME': 'Montenegro',
+    'MF': 'Saint Martin',
+    'MG': 'Madagascar',
+    'MH': 'Marshall Islands',
+    'MK': 'North Macedonia',
+    'ML': 'Mali',
+    'MM': 'Myanmar',
+    'MN': 'Mongolia',
+    'MO': 'Macao',
+    'MP': 'Northern Mariana Islands',
+    'MQ': 'Martinique',
+    'MR': 'Mauritania',
+    'MS': 'Montserrat',
+    'MT': 'Malta',
+    'MU': 'Mauritius',
+    'MV': 'Maldives',
+    'MW': 'Malawi',
+    'MX': 'Mexico',
+    'MY': 'Malaysia',
+    'MZ': 'Mozambique',
+    'NA': 'Namibia',
+    'NC': 'New Caledonia',
+    'NE': 'Niger',
+    'NF': 'Norfolk Island',
+    'NG': 'Nigeria',
+    'NI': 'Nicaragua',
+    'NL': 'Netherlands',
+    'NO': 'Norway',
+    'NP': 'Nepal',
+    'NR': 'Nauru',
+    'NU': 'Niue',
+    'NZ': 'New Zealand',
+    'OM': 'Oman',
+    'PA': 'Panama',
+    'PE': 'Peru',
+    'PF': 'French Polynesia',
+    'PG': 'Papua New Guinea',
+    'PH': 'Philippines',
+    'PK': 'Pakistan',
+    'PL': 'Poland',
+    'PM': 'Saint Pierre and Miquelon',
+    'PN': 'Pitcairn Islands',
+    'PR': 'Puerto Rico',
+    'PS': 'Palestine',
+    'PT': 'Portugal',
+    'PW': 'Palau',
+    'PY': 'Paraguay',
+    'QA': 'Qatar',
+    'RE': 'Réunion',
+    'RO': 'Romania',
+    'RS': 'Serbia',
+    'RU': 'Russia',
+    'RW': 'Rwanda',
+    'SA': 'Saudi Arabia',
+    'SB': 'Solomon Islands',
+    'SC': 'Seychelles',
+    'SD': 'Sudan',
+    'SE': 'Sweden',
+    'SG': 'Singapore',
+    'SH': 'Saint Helena',
+    'SI': 'Slovenia',
+    'SJ': 'Svalbard and Jan Mayen',
+    'SK': 'Slovakia',
+    'SL': 'Sierra Leone',
+    'SM': 'San Marino',
+    'SN': 'Senegal',
+    'SO': 'Somalia',
+    'SR': 'Suriname',
+    'SS': 'South Sudan',
+    'ST': 'Sao Tome and Principe',
+    'SV': 'El Salvador',
+    'SX': 'Sint Maarten',
+    'SY': 'Syria',
+    'SZ': 'Eswatini',
+    'TC': 'Turks and Caicos Islands',
+    'TD': 'Chad',
+    'TF': 'French Southern Territories',
+    'TG': 'Togo',
+    'TH': 'Thailand',
+    'TJ': 'Tajikistan',
+    'TK': 'Tokelau',
+    'TL': 'Timor-Leste',
+    'TM': 'Turkmenistan',
+    'TN': 'Tunisia',
+    'TO': 'Tonga',
+    'TR': 'Turkey',
+    'TT': 'Trinidad and Tobago',
+    'TV': 'Tuvalu',
+    'TW': 'Taiwan',
+    'TZ': 'Tanzania',
+    'UA': 'Ukraine',
+    'UG': 'Uganda',
+    'UM': 'U.S. Minor Outlying Islands',
+    'US': 'United States',
+    'UY': 'Uruguay',
+    'UZ': 'Uzbekistan',
+    'VA': 'Vatican City',
+    'VC': 'St Vincent and Grenadines',
+    'VE': 'Venezuela',
+    'VG': 'British Virgin Islands',
+    'VI': 'U.S. Virgin Islands',
+    'VN': 'Vietnam',
+    'VU': 'Vanuatu',
+    'WF': 'Wallis and Futuna',
+    'WS': 'Samoa',
+    'YE': 'Yemen',
+    'YT': 'Mayotte',
+    'ZA': 'South Africa',
+    'ZM': 'Zambia',
+    'ZW': 'Zimbabwe',
+    # 非 ISO 但被地理位置服务广泛使用的代码
+    'XK': 'Kosovo',
+}
+
+# ISO-3166-1 alpha-2 → alpha-3
+COUNTRY_ALPHA3: Dict[str, str] = {
+    'AD': 'AND', 'AE': 'ARE', 'AF': 'AFG', 'AG': 'ATG', 'AI': 'AIA', 'AL': 'ALB', 'AM': 'ARM',
+    'AO': 'AGO', 'AQ': 'ATA', 'AR': 'ARG', 'AS': 'ASM', 'AT': 'AUT', 'AU': 'AUS', 'AW': 'ABW',
+    'AX': 'ALA', 'AZ': 'AZE', 'BA': 'BIH', 'BB': 'BRB', 'BD': 'BGD', 'BE': 'BEL', 'BF': 'BFA',
+    'BG': 'BGR', 'BH': 'BHR', 'BI': 'BDI', 'BJ': 'BEN', 'BL': 'BLM', 'BM': 'BMU', 'BN': 'BRN',
+    'BO': 'BOL', 'BQ': 'BES', 'BR': 'BRA', 'BS': 'BHS', 'BT': 'BTN', 'BV': 'BVT', 'BW': 'BWA',
+    'BY': 'BLR', 'BZ': 'BLZ', 'CA': 'CAN', 'CC': 'CCK', 'CD': 'COD', 'CF': 'CAF', 'CG': 'COG',
+    'CH': 'CHE', 'CI': 'CIV', 'CK': 'COK', 'CL': 'CHL', 'CM': 'CMR', 'CN': 'CHN', 'CO': 'COL',
+    'CR': 'CRI', 'CU': 'CUB', 'CV': 'CPV', 'CW': 'CUW', 'CX': 'CXR', 'CY': 'CYP', 'CZ': 'CZE',
+    'DE': 'DEU', 'DJ': 'DJI', 'DK': 'DNK', 'DM': 'DMA', 'DO': 'DOM', 'DZ': 'DZA', 'EC': 'ECU',
+    'EE': 'EST', 'EG': 'EGY', 'EH': 'ESH', 'ER': 'ERI', 'ES': 'ESP', 'ET': 'ETH', 'FI': 'FIN',
+    'FJ': 'FJI', 'FK': 'FLK', 'FM': 'FSM', 'FO': 'FRO', 'FR': 'FRA', 'GA': 'GAB', 'GB': 'GBR',
+    'GD': 'GRD', 'GE': 'GEO', 'GF': 'GUF', 'GG': 'GGY', 'GH': 'GHA', 'GI': 'GIB', 'GL': 'GRL',
+    'GM': 'GMB', 'GN': 'GIN', 'GP': 'GLP', 'GQ': 'GNQ', 'GR': 'GRC', 'GS': 'SGS', 'GT': 'GTM',
+    'GU': 'GUM', 'GW': 'GNB', 'GY': 'GUY', 'HK': 'HKG', 'HM': 'HMD', 'HN': 'HND', 'HR': 'HRV',
+    'HT': 'HTI', 'HU': 'HUN', 'ID': 'IDN', 'IE': 'IRL', 'IL': 'ISR', 'IM': 'IMN', 'IN': 'IND',
+    'IO': 'IOT', 'IQ': 'IRQ', 'IR': 'IRN', 'IS': 'ISL', 'IT': 'ITA', 'JE': 'JEY', 'JM': 'JAM',
+    'JO': 'JOR', 'JP': 'JPN', 'KE': 'KEN', 'KG': 'KGZ', 'KH': 'KHM', 'KI': 'KIR', 'KM': 'COM',
+    'KN': 'KNA', 'KP': 'PRK', 'KR': 'KOR', 'KW': 'KWT', 'KY': 'CYM', 'KZ': 'KAZ', 'LA': 'LAO',
+    'LB': 'LBN', 'LC': 'LCA', 'LI': 'LIE', 'LK': 'LKA', 'LR': 'LBR', 'LS': 'LSO', 'LT': 'LTU',
+    'LU': 'LUX', 'LV': 'LVA', 'LY': 'LBY', 'MA': 'MAR', 'MC': 'MCO', 'MD': 'MDA', 'ME': 'MNE',
+    'MF': 'MAF', 'MG': 'MDG', 'MH': 'MHL', 'MK': 'MKD', 'ML': 'MLI', 'MM': 'MMR', 'MN': 'MNG',
+    'MO': 'MAC', 'MP': 'MNP', 'MQ': 'MTQ', 'MR': 'MRT', 'MS': 'MSR', 'MT': 'MLT', 'MU': 'MUS',
+    'MV': 'MDV', 'MW': 'MWI', 'MX': 'MEX', 'MY': 'MYS', 'MZ': 'MOZ', 'NA': 'NAM', 'NC': 'NCL',
+    'NE': 'NER', 'NF': 'NFK', 'NG': 'NGA', 'NI': 'NIC', 'NL': 'NLD', 'NO': 'NOR', 'NP': 'NPL',
+    'NR': 'NRU', 'NU': 'NIU', 'NZ': 'NZL', 'OM': 'OMN', 'PA': 'PAN', 'PE': 'PER', 'PF': 'PYF',
+    'PG': 'PNG', 'PH': 'PHL', 'PK': 'PAK', 'PL': 'POL', 'PM': 'SPM', 'PN': 'PCN', 'PR': 'PRI',
+    'PS': 'PSE', 'PT': 'PRT', 'PW': 'PLW', 'PY': 'PRY', 'QA': 'QAT', 'RE': 'REU', 'RO': 'ROU',
+    'RS': 'SRB', 'RU': 'RUS', 'RW': 'RWA', 'SA': 'SAU', 'SB': 'SLB', 'SC': 'SYC', 'SD': 'SDN',
+    'SE': 'SWE', 'SG': 'SGP', 'SH': 'SHN', 'SI': 'SVN', 'SJ': 'SJM', 'SK': 'SVK', 'SL': 'SLE',
+    'SM': 'SMR', 'SN': 'SEN', 'SO': 'SOM', 'SR': 'SUR', 'SS': 'SSD', 'ST': 'STP', 'SV': 'SLV',
+    'SX': 'SXM', 'SY': 'SYR', 'SZ': 'SWZ', 'TC': 'TCA', 'TD': 'TCD', 'TF': 'ATF', 'TG': 'TGO',
+    'TH': 'THA', 'TJ': 'TJK', 'TK': 'TKL', 'TL': 'TLS', 'TM': 'TKM', 'TN': 'TUN', 'TO': 'TON',
+    'TR': 'TUR', 'TT': 'TTO', 'TV': 'TUV', 'TW': 'TWN', 'TZ': 'TZA', 'UA': 'UKR', 'UG': 'UGA',
+    'UM': 'UMI', 'US': 'USA', 'UY': 'URY', 'UZ': 'UZB', 'VA': 'VAT', 'VC': 'VCT', 'VE': 'VEN',
+    'VG': 'VGB', 'VI': 'VIR', 'VN': 'VNM', 'VU': 'VUT', 'WF': 'WLF', 'WS': 'WSM', 'YE': 'YEM',
+    'YT': 'MYT', 'ZA': 'ZAF', 'ZM': 'ZMB', 'ZW': 'ZWE',
+}
+
+# 其它常见写法（ISO 正式名称、旧称、缩写等）→ alpha-2
+COUNTRY_ALIASES: Dict[str, str] = {
+    'Principality of Andorra': 'AD',
+    'UAE': 'AE',
+    'Islamic Republic of Afghanistan': 'AF',
+    'Republic of Albania': 'AL',
+    'Republic of Armenia': 'AM',
+    'Republic of Angola': 'AO',
+    'Argentine Republic': 'AR',
+    'Republic of Austria': 'AT',
+    'Aland Islands': 'AX',
+    'Åland Islands': 'AX',
+    'Republic of Azerbaijan': 'AZ',
+    'Republic of Bosnia and Herzegovina': 'BA',
+    "People's Republic of Bangladesh": 'BD',
+    'Kingdom of Belgium': 'BE',
+    'Republic of Bulgaria': 'BG',
+    'Kingdom of Bahrain': 'BH',
+    'Republic of Burundi': 'BI',
+    'Republic of Benin': 'BJ',
+    'Brunei Darussalam': 'BN',
+    'Bolivia, Plurinational State of': 'BO',
+    'Plurinational State of Bolivia': 'BO',
+    'Bonaire': 'BQ',
+    'Bonaire, Sint Eustatius and Saba': 'BQ',
+    'Caribbean Netherlands': 'BQ',
+    'Federative Republic of Brazil': 'BR',
+    'Commonwealth of the Bahamas': 'BS',
+    'Kingdom of Bhutan': 'BT',
+    'Republic of Botswana': 'BW',
+    'Republic of Belarus': 'BY',
+    'Congo (Kinshasa)': 'CD',
+    'Congo, The Democratic Republic of the': 'CD',
+    'Democratic Republic of the Congo': 'CD',
+    'Congo': 'CG',
+    'Congo (Brazzaville)': 'CG',
+    'Republic of the Congo': 'CG',
+    'Swiss Confederation': 'CH',
+    "Cote d'Ivoire": 'CI',
+    "Côte d'Ivoire": 'CI',
+    "Republic of Côte d'Ivoire": 'CI',
+    'Republic of Chile': 'CL',
+    'Republic of Cameroon': 'CM',
+    'Mainland China': 'CN',
+    "People's Republic of China": 'CN',
+    'Republic of Colombia': 'CO',
+    'Republic of Costa Rica': 'CR',
+    'Republic of Cuba': 'CU',
+    'Cape Verde': 'CV',
+    'Republic of Cabo Verde': 'CV',
+    'Curacao': 'CW',
+    'Republic of Cyprus': 'CY',
+    'Czech Republic': 'CZ',
+    'Federal Republic of Germany': 'DE',
+    'Republic of Djibouti': 'DJ',
+    'Kingdom of Denmark': 'DK',
+    'Commonwealth of Dominica': 'DM',
+    "People's Democratic Republic of Algeria": 'DZ',
+    'Republic of Ecuador': 'EC',
+    'Republic of Estonia': 'EE',
+    'Arab Republic of Egypt': 'EG',
+    'the State of Eritrea': 'ER',
+    'Kingdom of Spain': 'ES',
+    'Federal Democratic Republic of Ethiopia': 'ET',
+    'Republic of Finland': 'FI',
+    'Republic of Fiji': 'FJ',
+    'Falkland Islands (Malvinas)': 'FK',
+    'Federated States of Micronesia': 'FM',
+    'Micronesia, Federated States of': 'FM',
+    'French Republic': 'FR',
+    'Gabonese Republic': 'GA',
+    'Britain': 'GB',
+    'England': 'GB',
+    'Great Britain': 'GB',
+    'UK': 'GB',
+    'United Kingdom of Great Britain and Northern Ireland': 'GB',
+    'Republic of Ghana': 'GH',
+    'Republic of the Gambia': 'GM',
+    'Republic of Guinea': 'GN',
+    'Republic of Equatorial Guinea': 'GQ',
+    'Hellenic Republic': 'GR',
+    'Republic of Guatemala': 'GT',
+    'Republic of Guinea-Bissau': 'GW',
+    'Republic of Guyana': 'GY',
+    'Hong Kong SAR': 'HK',
+    'Hong Kong Special Administrative Region of China': 'HK',
+    'Heard Island and McDonald Islands': 'HM',
+    'Republic of Honduras': 'HN',
+    'Republic of Croatia': 'HR',
+    'Republic of Haiti': 'HT',
+    'Republic of Indonesia': 'ID',
+    'State of Israel': 'IL',
+    'Republic of India': 'IN',
+    'Republic of Iraq': 'IQ',
+    'Iran, Islamic Republic of': 'IR',
+    'Islamic Republic of Iran': 'IR',
+    'Republic of Iceland': 'IS',
+    'Italian Republic': 'IT',
+    'Hashemite Kingdom of Jordan': 'JO',
+    'Republic of Kenya': 'KE',
+    'Kyrgyz Republic': 'KG',
+    'Kingdom of Cambodia': 'KH',
+    'Republic of Kiribati': 'KI',
+    'Union of the Comoros': 'KM',
+    'Saint Kitts and Nevis': 'KN',
+    "Democratic People's Republic of Korea": 'KP',
+    "Korea, Democratic People's Republic of": 'KP',
+    'Korea': 'KR',
+    'Korea, Republic of': 'KR',
+    'Republic of Korea': 'KR',
+    'State of Kuwait': 'KW',
+    'Republic of Kazakhstan': 'KZ',
+    'Lao PDR': 'LA',
+    "Lao People's Democratic Republic": 'LA',
+    'Lebanese Republic': 'LB',
+    'Principality of Liechtenstein': 'LI',
+    'Democratic Socialist Republic of Sri Lanka': 'LK',
+    'Republic of Liberia': 'LR',
+    'Kingdom of Lesotho': 'LS',
+    'Republic of Lithuania': 'LT',
+    'Grand Duchy of Luxembourg': 'LU',
+    'Republic of Latvia': 'LV',
+    'Kingdom of Morocco': 'MA',
+    'Principality of Monaco': 'MC',
+    'Moldova, Republic of': 'MD',
+    'Republic of Moldova': 'MD',
+    'Saint Martin (French part)': 'MF',
+    'Republic of Madagascar': 'MG',
+    'Republic of the Marshall Islands': 'MH',
+    'Macedonia': 'MK',
+    'Republic of North Macedonia': 'MK',
+    'Republic of Mali': 'ML',
+    'Burma': 'MM',
+    'Republic of Myanmar': 'MM',
+    'Macao SAR': 'MO',
+    'Macao Special Administrative Region of China': 'MO',
+    'Macau': 'MO',
+    'Commonwealth of the Northern Mariana Islands': 'MP',
+    'Islamic Republic of Mauritania': 'MR',
+    'Republic of Malta': 'MT',
+    'Republic of Mauritius': 'MU',
+    'Republic of Maldives': 'MV',
+    'Republic of Malawi': 'MW',
+    'United Mexican States': 'MX',
+    'Republic of Mozambique': 'MZ',
+    'Republic of Namibia': 'NA',
+    'Republic of the Niger': 'NE',
+    'Federal Republic of Nigeria': 'NG',
+    'Republic of Nicaragua': 'NI',
+    'Holland': 'NL',
+    'Kingdom of the Netherlands': 'NL',
+    'The Netherlands': 'NL',
+    'Kingdom of Norway': 'NO',
+    'Federal Democratic Republic of Nepal': 'NP',
+    'Republic of Nauru': 'NR',
+    'Sultanate of Oman': 'OM',
+    'Republic of Panama': 'PA',
+    'Republic of Peru': 'PE',
+    'Independent State of Papua New Guinea': 'PG',
+    'Republic of the Philippines': 'PH',
+    'Islamic Republic of Pakistan': 'PK',
+    'Republic of Poland': 'PL',
+    'Pitcairn': 'PN',
+    'Palestine, State of': 'PS',
+    'Palestinian Territory': 'PS',
+    'State of Palestine': 'PS',
+    'the State of Palestine': 'PS',
+    'Portuguese Republic': 'PT',
+    'Republic of Palau': 'PW',
+    'Republic of Paraguay': 'PY',
+    'State of Qatar': 'QA',
+    'Reunion': 'RE',
+    'Republic of Serbia': 'RS',
+    'Russian Federation': 'RU',
+    'Rwandese Republic': 'RW',
+    'Kingdom of Saudi Arabia': 'SA',
+    'Republic of Seychelles': 'SC',
+    'Republic of the Sudan': 'SD',
+    'Kingdom of Sweden': 'SE',
+    'Republic of Singapore': 'SG',
+    'Saint Helena, Ascension and Tristan da Cunha': 'SH',
+    'Republic of Slovenia': 'SI',
+    'Slovak Republic': 'SK',
+    'Republic of Sierra Leone': 'SL',
+    'Republic of San Marino': 'SM',
+    'Republic of Senegal': 'SN',
+    'Federal Republic of Somalia': 'SO',
+    'Republic of Suriname': 'SR',
+    'Republic of South Sudan': 'SS',
+    'Democratic Republic of Sao Tome and Principe': 'ST',
+    'Republic of El Salvador': 'SV',
+    'Sint Maarten (Dutch part)': 'SX',
+    'Syrian Arab Republic': 'SY',
+    'Kingdom of Eswatini': 'SZ',
+    'Swaziland': 'SZ',
+    'Republic of Chad': 'TD',
+    'Togolese Republic': 'TG',
+    'Kingdom of Thailand': 'TH',
+    'Republic of Tajikistan': 'TJ',
+    'Democratic Republic of Timor-Leste': 'TL',
+    'East Timor': 'TL',
+    'Republic of Tunisia': 'TN',
+    'Kingdom of Tonga': 'TO',
+    'Republic of Türkiye': 'TR',
+    'Turkiye': 'TR',
+    'Türkiye': 'TR',
+    'Republic of Trinidad and Tobago': 'TT',
+    'Republic of China': 'TW',
+    'Taiwan, Province of China': 'TW',
+    'Tanzania, United Republic of': 'TZ',
+    'United Republic of Tanzania': 'TZ',
+    'Republic of Uganda': 'UG',
+    'United States Minor Outlying Islands': 'UM',
+    'America': 'US',
+    'USA': 'US',
+    'United States of America': 'US',
+    'Eastern Republic of Uruguay': 'UY',
+    'Republic of Uzbekistan': 'UZ',
+    'Holy See (Vatican City State)': 'VA',
+    'Vatican': 'VA',
+    'Saint Vincent and the Grenadines': 'VC',
+    'Bolivarian Republic of Venezuela': 'VE',
+    'Venezuela, Bolivarian Republic of': 'VE',
+    'Virgin Islands, British': 'VG',
+    'Virgin Islands of the United States': 'VI',
+    'Virgin Islands, U.S.': 'VI',
+    'Socialist Republic of Viet Nam': 'VN',
+    'Viet Nam': 'VN',
+    'Republic of Vanuatu': 'VU',
+    'Independent State of Samoa': 'WS',
+    'Republic of Yemen': 'YE',
+    'Republic of South Africa': 'ZA',
+    'Republic of Zambia': 'ZM',
+    'Republic of Zimbabwe': 'ZW',
+}
+
+
+def _build_lookup() -> Dict[str, str]:
+    """构建 小写名称/代码 → alpha-2 的查找表（导入时执行一次）"""
+    lookup = {}
+    for code, alpha3 in COUNTRY_ALPHA3.items():
+        lookup[alpha3.lower()] = code
+    for alias, code in COUNTRY_ALIASES.items():
+        lookup[alias.lower()] = code
+    for code, name in COUNTRY_NAMES.items():
+        lookup[name.lower()] = code
+        lookup[code.lower()] = code
+    return lookup
+
+
+_LOOKUP: Dict[str, str] = _build_lookup()
+
+
+def normalize_country(value: Optional[str]) -> str:
+    """
+    将国家名称、别名、alpha-2 或 alpha-3 代码标准化为 alpha-2 代码
+
+    Examples:
+        >>> normalize_country("United Arab Emirates")
+        'AE'
+        >>> normalize_country("usa")
+        'US'
+        >>> normalize_country("Atlantis")
+        'UN'
+    """
+    if not value:
+        return UNKNOWN_CODE
+    return _LOOKUP.get(str(value).strip().lower(), UNKNOWN_CODE)
+
+
+def country_name(code: Optional[str]) -> str:
+    """根据 alpha-2 代码获取常用国家名称，未知返回 'Unknown'"""
+    return COUNTRY_NAMES.get(normalize_country(code), 'Unknown')
+
+
+def resolve_country_code(country_code: Optional[str] = None, country: Optional[str] = None) -> str:
+    """
+    优先使用已有的国家代码，无效时再根据国家名称推断
+
+    Examples:
+        >>> resolve_country_code('jp')
+        'JP'
+        >>> resolve_country_code('UN', 'South Africa')
+        'ZA'
+    """
+    code = normalize_country(country_code)
+    if code == UNKNOWN_CODE:
+        code = normalize_country(country)
+    return code
+
+
+def compile_country_set(values: Optional[Iterable[str]]) -> FrozenSet[str]:
+    """
+    将国家白名单（名称/别名/代码混写）预编译为 alpha-2 代码集合
+
+    无法识别的条目记录警告后忽略；白名单非空但没有一项能识别时抛出 ValueError，
+    避免拼写错误的白名单把所有代理都过滤掉
+
+    Raises:
+        ValueError: 所有条目都无法识别
+    """
+    values = list(values or [])
+    codes = {normalize_country(value) for value in values}
+    codes.discard(UNKNOWN_CODE)
+
+    unknown = [value for value in values if normalize_country(value) == UNKNOWN_CODE]
+    if values and not codes:
+        raise ValueError(f"国家白名单中没有可识别的国家: {unknown}")
+    if unknown:
+        logger.warning(f"国家白名单中无法识别的条目已忽略: {unknown}")
+    return frozenset(codes)
@@ -0,0 +1,127 @@
+"""
+数据库读写并发基准测试
+模拟扫描器持续批量写入验证结果，同时另一个连接（API/面板）不断读取，
+报告写入吞吐量 (条/秒) 和读取延迟分位数
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from typing import Dict, List, Tuple
+
+from proxy_database import ProxyDatabase
+
+
+def make_entries(count: int, pool_size: int, rng: random.Random) -> List[Tuple[Dict, Dict]]:
+    """生成一批随机验证结果（地址从固定规模的代理池中抽取，模拟重复扫描）"""
+    entries = []
+    for _ in range(count):
+        n = rng.randrange(pool_size)
+        address = f"10.{n >> 16 & 255}.{n >> 8 & 255}.{n & 255}:1080"
+        is_valid = rng.random() < 0.6
+        response_time = rng.lognormvariate(0, 0.8) if is_valid else None
+        entries.append((
+            {'proxy': address, 'country': 'United States', 'country_code': 'US', 'city': 'Unknown'},
+            {'is_valid': is_valid, 'response_time': response_time,
+             'test_url': 'http://httpbin.org/ip', 'score': rng.uniform(0, 100) if is_valid else 0},
+        ))
+    return entries
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(int(q * len(sorted_values)), len(sorted_values) - 1)]
+
+
+def run_benchmark(db_path: str, total_writes: int = 50000, batch_size: int = 500,
+                  pool_size: int = 5000, seed: int = 0) -> Dict:
+    """
+    运行基准测试
+
+    Args:
+        db_path: 数据库路径
+        total_writes: 写入的验证结果总数
+        batch_size: 每个事务写入的结果数
+        pool_size: 代理池规模
+        seed: 随机种子
+
+    Returns:
+        {'writes', 'write_time', 'writes_per_sec', 'reads', 'read_p50_ms', 'read_p99_ms', 'read_max_ms'}
+    """
+    rng = random.Random(seed)
+    writer_db = ProxyDatabase(db_path)
+    # 读取方使用独立实例，相当于另一个进程中的 API / 面板
+    reader_db = ProxyDatabase(db_path)
+
+    batches = [make_entries(batch_size, pool_size, rng)
+               for _ in range(max(1, total_writes // batch_size))]
+    addresses = [entries[0][0]['proxy'] for entries in batches]
+
+    done = threading.Event()
+    read_latencies: List[float] = []
+
+    def reader():
+        local_rng = random.Random(seed + 1)
+        while not done.is_set():
+            start = time.perf_counter()
+            if local_rng.random() < 0.5:
+                reader_db.get_proxy_stats(local_rng.choice(addresses))
+            else:
+                reader_db.get_best_proxies(limit=20, min_checks=1)
+            read_latencies.append(time.perf_counter() - start)
+
+    reader_thread = threading.Thread(target=reader, daemon=True)
+    reader_thread.start()
+
+    start = time.perf_counter()
+    written = 0
+    for entries in batches:
+        written += writer_db.save_validation_batch(entries)
+    write_time = time.perf_counter() - start
+
+    done.set()
+    reader_thread.join()
+    writer_db.close()
+    reader_db.close()
+
+    latencies = sorted(read_latencies)
+    return {
+        'writes': written,
+        'write_time': write_time,
+        'writes_per_sec': written / write_time if write_time > 0 else 0.0,
+        'reads': len(latencies),
+        'read_p50_ms': _percentile(latencies, 0.5) * 1000,
+        'read_p99_ms': _percentile(latencies, 0.99) * 1000,
+        'read_max_ms': (latencies[-1] if latencies else 0.0) * 1000,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='代理数据库读写并发基准测试')
+    parser.add_argument('--db-path', type=str, default=None,
+                        help='数据库路径（默认使用临时文件，测试后删除）')
+    parser.add_argument('--writes', type=int, default=50000, help='写入的验证结果总数')
+    parser.add_argument('--batch-size', type=int, default=500, help='每个事务写入的结果数')
+    parser.add_argument('--pool-size', type=int, default=5000, help='代理池规模')
+    args = parser.parse_args()
+
+    tmp_dir = None
+    db_path = args.db_path
+    if db_path is None:
+        tmp_dir = tempfile.TemporaryDirectory()
+        db_path = os.path.join(tmp_dir.name, 'benchmark.db')
+
+    try:
+        result = run_benchmark(db_path, args.writes, args.batch_size, args.pool_size)
+    finally:
+        if tmp_dir:
+            tmp_dir.cleanup()
+
+    print(f"写入: {result['writes']} 条, 耗时 {result['write_time']:.2f}s, "
+          f"{result['writes_per_sec']:.0f} 条/秒")
+    print(f"读取: {result['reads']} 次, p50 {result['read_p50_ms']:.2f}ms, "
+          f"p99 {result['read_p99_ms']:.2f}ms, 最大 {result['read_max_ms']:.2f}ms")
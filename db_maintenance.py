@@ -0,0 +1,37 @@
+"""
+数据库维护命令
+需要独占数据库或耗时较长的一次性操作，不放在扫描器的例行清理中，
+应在扫描器、API 等写入者停止时手动执行
+"""
+
+import argparse
+import logging
+import sys
+
+from proxy_database import ProxyDatabase
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='代理数据库维护')
+    parser.add_argument('--db-path', type=str, default='proxies.db', help='数据库路径')
+    parser.add_argument('--enable-incremental-vacuum', action='store_true',
+                        help='将旧数据库转换为增量压缩模式（整库 VACUUM，期间独占数据库）')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    if not args.enable_incremental_vacuum:
+        parser.print_help()
+        return 1
+
+    db = ProxyDatabase(args.db_path)
+    try:
+        if not db.enable_incremental_vacuum():
+            print("数据库已是增量压缩模式，无需转换")
+    finally:
+        db.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
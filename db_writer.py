@@ -0,0 +1,140 @@
+"""
+后台批量写库模块
+扫描过程中从队列消费验证结果，每 N 条或每 T 毫秒在一个事务中落库，
+验证结束时数据库已基本写完，不再需要逐条连接、逐条提交
+"""
+
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+
+from async_database import AsyncProxyDatabase
+
+
+class DatabaseWriter:
+    """验证结果批量写入器（asyncio 后台任务）"""
+
+    def __init__(self, db: AsyncProxyDatabase, scorer=None, batch_size: int = 500,
+                 flush_interval_ms: int = 200, failure_test_url: Optional[str] = None):
+        """
+        Args:
+            db: 代理数据库（异步外观，写入排入其写线程队列）
+            scorer: 评分器（ProxyScorer），为成功的代理结合历史统计计算综合评分
+            batch_size: 每个事务最多写入的结果数
+            flush_interval_ms: 队列中有结果时最长等待多久就写入
+            failure_test_url: 失败结果未携带测试地址时记录的地址
+        """
+        self.db = db
+        self.scorer = scorer
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval_ms / 1000
+        self.failure_test_url = failure_test_url
+        self.logger = logging.getLogger(__name__)
+
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+
+        # 统计
+        self.valid_saved = 0
+        self.failed_saved = 0
+        self.errors = 0
+        self.transactions = 0
+        self.write_time = 0.0
+
+    def start(self):
+        """启动后台写入任务（需在事件循环中调用）"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def submit(self, result: Dict):
+        """提交一个验证结果（不阻塞，可直接作为验证器的 on_result 回调）"""
+        if result and result.get('proxy'):
+            self._queue.put_nowait(result)
+
+    async def close(self):
+        """写完队列中剩余的结果并结束后台任务"""
+        if self._task is None:
+            return
+        self._queue.put_nowait(None)
+        await self._task
+        self._task = None
+
+    async def _run(self):
+        """按批次数量或时间间隔取出结果并写入"""
+        loop = asyncio.get_running_loop()
+        finished = False
+
+        while not finished:
+            first = await self._queue.get()
+            if first is None:
+                break
+
+            batch = [first]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    finished = True
+                    break
+                batch.append(item)
+
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[Dict]):
+        """在数据库写线程中写入一批结果（一个事务）"""
+        entries = [self._build_entry(result) for result in batch]
+
+        start = time.time()
+        try:
+            await self.db.save_validation_batch(entries, self.scorer)
+        except Exception as e:
+            self.errors += len(batch)
+            self.logger.error(f"批量写入 {len(batch)} 条验证结果失败: {e}")
+            return
+        finally:
+            self.write_time += time.time() - start
+
+        self.transactions += 1
+        valid = sum(1 for result in batch if result.get('is_valid'))
+        self.valid_saved += valid
+        self.failed_saved += len(batch) - valid
+
+    def _build_entry(self, result: Dict) -> Tuple[Dict, Dict]:
+        """将验证结果转换为 (代理信息, 验证记录)"""
+        if result.get('is_valid'):
+            return result, {
+                'is_valid': True,
+                'response_time': result.get('response_time'),
+                'test_url': result.get('test_url'),
+                'score': result.get('score', 0),
+                'bandwidth_kbps': result.get('bandwidth_kbps'),
+                'ttfb': result.get('ttfb'),
+            }
+
+        # 失败的代理只有地址：新代理由数据库填入占位地理信息，已有代理保留原有信息
+        return {'proxy': result['proxy']}, {
+            'is_valid': False,
+            'response_time': None,
+            'test_url': result.get('test_url') or self.failure_test_url,
+            'error': result.get('error') or 'Validation failed',
+            'score': 0,
+        }
+
+    def get_stats(self) -> Dict:
+        """获取写入统计"""
+        saved = self.valid_saved + self.failed_saved
+        return {
+            'valid_saved': self.valid_saved,
+            'failed_saved': self.failed_saved,
+            'errors': self.errors,
+            'transactions': self.transactions,
+            'write_time': self.write_time,
+            'rows_per_sec': saved / self.write_time if self.write_time > 0 else 0.0,
+        }
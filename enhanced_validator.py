@@ -9,24 +9,48 @@ from aiohttp_socks import ProxyConnector
 import time
 import logging
 import json
-from typing import Dict, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 import socket
 
+from geo_cache import GeoCache
+from geo_batch import GeoBatchResolver
+from judge_server import detect_real_ip, parse_judge_response
+from country_codes import resolve_country_code
+from scoring import ScoringEngine, ScoringWeights
+from bandwidth_meter import DEFAULT_BANDWIDTH_URL, bandwidth_score, measure_bandwidth
+
+# 默认 Judge（与 judge_server.py 响应格式兼容）
+DEFAULT_JUDGE_URL = "http://httpbin.org/get"
+
 
 class EnhancedValidator:
     """增强的代理验证器"""
     
-    def __init__(self, timeout: int = 10):
+    def __init__(self, timeout: int = 10, geo_cache: GeoCache = None,
+                 geo_resolver: GeoBatchResolver = None, bandwidth_url: str = DEFAULT_BANDWIDTH_URL,
+                 config=None):
         self.timeout = timeout
+        # 带宽测试文件地址（测试时可指向 bandwidth_meter 的本地文件服务器）
+        self.bandwidth_url = bandwidth_url
         self.logger = logging.getLogger(__name__)
+        # 地理位置缓存（未传入时仅使用进程内缓存）
+        self.geo_cache = geo_cache or GeoCache(db_path=None)
+        # 批量验证结束后从本机批量查询出口IP的地理位置
+        self.geo_resolver = geo_resolver or GeoBatchResolver(self.geo_cache)
+        # 扫描主机的真实出口IP（用于识别透明代理）
+        self.real_ip = None
+        # 挑选深度检测对象时的初步评分（权重取自配置，与 ProxyValidator 同一口径）
+        self.scorer = ProxyScorer(weights=ScoringWeights.from_dict(getattr(config, 'scoring_weights', None)))
     
-    async def validate_proxy(self, proxy: str, test_url: str = "http://httpbin.org/ip") -> Dict:
+    async def validate_proxy(self, proxy: str, test_url: str = DEFAULT_JUDGE_URL,
+                             deep_checks: bool = True) -> Dict:
         """
         完整验证代理
         
         Args:
             proxy: 代理地址 (ip:port 或 user:pass@ip:port)
-            test_url: 测试URL
+            test_url: Judge 地址（一次请求得到出口IP和匿名级别）
+            deep_checks: 是否同时进行 DNS泄露和带宽检测（False 时只做连接测试）
             
         Returns:
             验证结果字典
@@ -38,29 +62,37 @@ class EnhancedValidator:
             'test_url': test_url,
             'error': None,
             'ip_info': {},
+            'anonymity_level': 'Unknown',
             'dns_leak': None,
-            'bandwidth_score': 0
+            'bandwidth_score': 0,
+            'bandwidth_kbps': None,
+            'ttfb': None,
+            'deep_checked': False
         }
         
         try:
             # 解析代理地址
             proxy_url = self._parse_proxy(proxy)
             
-            # 基础连接测试
-            start_time = time.time()
-            ip_info = await self._test_connection(proxy_url, test_url)
-            response_time = time.time() - start_time
-            
-            if ip_info:
-                result['is_valid'] = True
-                result['response_time'] = response_time
-                result['ip_info'] = ip_info
-                
-                # DNS泄露检测
-                result['dns_leak'] = await self._check_dns_leak(proxy_url)
+            # 所有检测复用同一个 keep-alive 会话（只做一次 TCP + SOCKS 握手）
+            async with self._open_session(proxy_url) as session:
+                # 基础连接测试
+                start_time = time.time()
+                judge_data = await self._test_connection(session, test_url)
+                response_time = time.time() - start_time
                 
-                # 带宽测试 (简化版)
-                result['bandwidth_score'] = await self._test_bandwidth(proxy_url)
+                if judge_data:
+                    judge = parse_judge_response(judge_data, self.real_ip)
+                    result['is_valid'] = True
+                    result['response_time'] = response_time
+                    result['ip_info'] = {'origin': judge['exit_ip']}
+                    result['anonymity_level'] = judge['anonymity']
+                    
+                    # 出口IP (地理位置在 validate_batch 中批量补全)
+                    result['exit_ip'] = judge['exit_ip']
+                    
+                    if deep_checks:
+                        await self._run_deep_checks(session, result)
                 
         except Exception as e:
             result['error'] = str(e)
@@ -68,6 +100,29 @@ class EnhancedValidator:
         
         return result
     
+    async def deep_check(self, result: Dict) -> Dict:
+        """对已通过连接测试的结果补做 DNS泄露和带宽检测"""
+        try:
+            async with self._open_session(self._parse_proxy(result['proxy'])) as session:
+                await self._run_deep_checks(session, result)
+        except Exception as e:
+            self.logger.debug(f"代理 {result['proxy']} 深度检测失败: {e}")
+        
+        return result
+    
+    async def _run_deep_checks(self, session: aiohttp.ClientSession, result: Dict):
+        """DNS泄露检测 + 带宽测试（最耗时的检测）"""
+        # DNS泄露检测 (直接使用连接测试得到的出口IP)
+        result['dns_leak'] = await self._check_dns_leak(session, result.get('exit_ip'))
+        
+        # 带宽测试 (流式测量, 保留真实 KB/s 和 TTFB)
+        bandwidth = await self._test_bandwidth(session)
+        if bandwidth:
+            result['bandwidth_kbps'] = bandwidth['bandwidth_kbps']
+            result['ttfb'] = bandwidth['ttfb']
+            result['bandwidth_score'] = bandwidth_score(bandwidth['bandwidth_kbps'])
+        result['deep_checked'] = True
+    
     def _parse_proxy(self, proxy: str) -> str:
         """
         解析代理地址为URL格式
@@ -84,119 +139,130 @@ class EnhancedValidator:
             # 普通代理: ip:port
             return f"socks5://{proxy}"
     
-    async def _test_connection(self, proxy_url: str, test_url: str) -> Optional[Dict]:
-        """测试代理连接并获取IP信息"""
+    def _open_session(self, proxy_url: str) -> aiohttp.ClientSession:
+        """创建经过代理的会话（连接器随会话关闭）"""
         connector = ProxyConnector.from_url(proxy_url)
-        
-        async with aiohttp.ClientSession(
+        return aiohttp.ClientSession(
             connector=connector,
             timeout=aiohttp.ClientTimeout(total=self.timeout)
-        ) as session:
-            async with session.get(test_url) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    return data
-                else:
-                    raise Exception(f"HTTP状态码: {response.status}")
+        )
+    
+    async def _test_connection(self, session: aiohttp.ClientSession, test_url: str) -> Optional[Dict]:
+        """测试代理连接并获取IP信息"""
+        async with session.get(test_url) as response:
+            if response.status == 200:
+                data = await response.json(content_type=None)
+                return data
+            else:
+                raise Exception(f"HTTP状态码: {response.status}")
         
         return None
     
-    async def _check_dns_leak(self, proxy_url: str) -> Optional[Dict]:
+    async def _attach_geo_info(self, results: list):
+        """按出口IP批量查询地理位置并写入验证结果"""
+        exit_ips = [r.get('exit_ip') for r in results if r.get('is_valid')]
+        if not exit_ips:
+            return
+        
+        try:
+            geo_map = await self.geo_resolver.resolve(exit_ips)
+        except Exception as e:
+            self.logger.warning(f"批量获取地理位置失败: {e}")
+            return
+        
+        for result in results:
+            geo = geo_map.get(result.get('exit_ip'))
+            if not geo:
+                continue
+            result['ip_info'].update(geo)
+            result.update({
+                'country': geo.get('country', 'Unknown'),
+                'country_code': resolve_country_code(geo.get('country_code'), geo.get('country')),
+                'city': geo.get('city', 'Unknown'),
+                'isp': geo.get('isp', 'Unknown'),
+                'is_mobile': geo.get('mobile', False),
+                'is_proxy': geo.get('proxy', False),
+            })
+    
+    async def _check_dns_leak(self, session: aiohttp.ClientSession, proxy_ip: str) -> Optional[Dict]:
         """
         DNS泄露检测
         
         通过比较真实IP和DNS解析IP来检测DNS泄露
+        
+        Args:
+            session: 经过代理的会话
+            proxy_ip: 连接测试得到的代理出口IP
         """
         try:
-            connector = ProxyConnector.from_url(proxy_url)
+            # 获取DNS解析IP (使用DNS检测服务)
+            try:
+                async with session.get("https://www.dnsleaktest.com/") as response:
+                    # 简化实现，实际应该解析响应内容
+                    dns_leak_detected = False
+            except:
+                dns_leak_detected = None
+            
+            return {
+                'proxy_ip': proxy_ip,
+                'leak_detected': dns_leak_detected
+            }
             
-            async with aiohttp.ClientSession(
-                connector=connector,
-                timeout=aiohttp.ClientTimeout(total=self.timeout)
-            ) as session:
-                # 获取代理IP
-                async with session.get("http://httpbin.org/ip") as response:
-                    data = await response.json()
-                    proxy_ip = data.get('origin', '').split(',')[0].strip()
-                
-                # 获取DNS解析IP (使用DNS检测服务)
-                try:
-                    async with session.get("https://www.dnsleaktest.com/") as response:
-                        # 简化实现，实际应该解析响应内容
-                        dns_leak_detected = False
-                except:
-                    dns_leak_detected = None
-                
-                return {
-                    'proxy_ip': proxy_ip,
-                    'leak_detected': dns_leak_detected
-                }
-                
         except Exception as e:
             self.logger.debug(f"DNS泄露检测失败: {e}")
             return None
     
-    async def _test_bandwidth(self, proxy_url: str) -> int:
+    async def _test_bandwidth(self, session: aiohttp.ClientSession) -> Optional[Dict]:
         """
-        简化的带宽测试
+        流式带宽测试
         
-        下载小文件测试速度并评分
+        分块下载测试文件，估值稳定或明显过慢时提前结束
         
         Returns:
-            带宽评分 (0-10)
+            measure_bandwidth 的结果 (含 bandwidth_kbps / ttfb)，失败返回 None
         """
         try:
-            connector = ProxyConnector.from_url(proxy_url)
-            
-            # 使用一个小文件测试 (约100KB)
-            test_file_url = "http://speedtest.ftp.otenet.gr/files/test100k.db"
-            
-            async with aiohttp.ClientSession(
-                connector=connector,
-                timeout=aiohttp.ClientTimeout(total=15)
-            ) as session:
-                start_time = time.time()
-                async with session.get(test_file_url) as response:
-                    content = await response.read()
-                    download_time = time.time() - start_time
-                    
-                    if download_time > 0:
-                        # 计算速度 (KB/s)
-                        speed = len(content) / 1024 / download_time
-                        
-                        # 评分: >1000KB/s=10分, >500=8分, >200=6分, >100=4分, >50=2分
-                        if speed > 1000:
-                            return 10
-                        elif speed > 500:
-                            return 8
-                        elif speed > 200:
-                            return 6
-                        elif speed > 100:
-                            return 4
-                        elif speed > 50:
-                            return 2
-                        else:
-                            return 1
-        except:
-            return 0
-        
-        return 0
+            return await measure_bandwidth(session, self.bandwidth_url, timeout=15)
+        except Exception as e:
+            self.logger.debug(f"带宽测试失败: {e}")
+            return None
     
-    async def validate_batch(self, proxies: list, test_url: str = "http://httpbin.org/ip",
-                            max_concurrency: int = 50) -> list:
+    async def validate_batch(self, proxies: list, test_url: str = DEFAULT_JUDGE_URL,
+                            max_concurrency: int = 50,
+                            on_result: Optional[Callable[[Dict], None]] = None,
+                            deep_top_k: Optional[int] = None,
+                            deep_min_score: Optional[float] = None) -> list:
         """
         批量验证代理
         
+        未指定 deep_top_k / deep_min_score 时每个可用代理都做完整检测；
+        指定后分阶段进行: 全部代理只做连接测试 -> 补全地理位置并初步评分 ->
+        仅对每个国家评分前 K 名或评分达标的代理做 DNS泄露和带宽检测
+        
         Args:
             proxies: 代理列表
-            test_url: 测试URL
+            test_url: Judge 地址
             max_concurrency: 最大并发数
+            on_result: 结果回调（如 DatabaseWriter.submit）。失败结果在验证结束时立即回调，
+                       成功结果在补全地理位置（及深度检测）后回调
+            deep_top_k: 每个国家做深度检测的代理数
+            deep_min_score: 初步评分不低于该值的代理都做深度检测
         """
+        if self.real_ip is None:
+            try:
+                self.real_ip = await detect_real_ip(test_url, self.timeout)
+            except Exception as e:
+                self.logger.warning(f"获取本机出口IP失败，无法识别透明代理: {e}")
+        
+        staged = deep_top_k is not None or deep_min_score is not None
         semaphore = asyncio.Semaphore(max_concurrency)
         
         async def validate_with_semaphore(proxy):
             async with semaphore:
-                return await self.validate_proxy(proxy, test_url)
+                result = await self.validate_proxy(proxy, test_url, deep_checks=not staged)
+            if on_result and not result.get('is_valid'):
+                on_result(result)
+            return result
         
         tasks = [validate_with_semaphore(proxy) for proxy in proxies]
         results = await asyncio.gather(*tasks, return_exceptions=True)
@@ -209,14 +275,55 @@ class EnhancedValidator:
             else:
                 self.logger.error(f"验证异常: {result}")
         
+        # 批量补全地理位置
+        await self._attach_geo_info(valid_results)
+        
+        if staged:
+            selected = self._select_for_deep_checks(valid_results, deep_top_k, deep_min_score)
+            
+            async def deep_check_with_semaphore(result):
+                async with semaphore:
+                    return await self.deep_check(result)
+            
+            await asyncio.gather(*[deep_check_with_semaphore(r) for r in selected])
+        
+        if on_result:
+            for result in valid_results:
+                if result.get('is_valid'):
+                    on_result(result)
+        
         return valid_results
+    
+    def _select_for_deep_checks(self, results: list, top_k: Optional[int] = None,
+                                min_score: Optional[float] = None) -> list:
+        """按初步评分挑选需要深度检测的代理（每国前 K 名 或 评分达标）"""
+        alive = [r for r in results if r.get('is_valid')]
+        scores = dict(zip(map(id, alive), self.scorer.score_batch(alive)))
+        
+        by_country = {}
+        for result in sorted(alive, key=lambda r: scores[id(r)], reverse=True):
+            by_country.setdefault(result.get('country_code') or 'UN', []).append(result)
+        
+        selected = []
+        for ranked in by_country.values():
+            for rank, result in enumerate(ranked):
+                if (top_k is not None and rank < top_k) or \
+                        (min_score is not None and scores[id(result)] >= min_score):
+                    selected.append(result)
+        
+        self.logger.info(
+            f"深度检测: {len(selected)}/{len(alive)} 个可用代理 "
+            f"(每国前 {top_k if top_k is not None else '-'} 名, 评分≥{min_score if min_score is not None else '-'})"
+        )
+        return selected
 
 
 class ProxyScorer:
-    """代理评分器 - 综合评分系统"""
+    """代理评分器 - 综合评分系统（基于 scoring.ScoringEngine）"""
     
-    def __init__(self, db=None):
+    def __init__(self, db=None, weights: Optional[ScoringWeights] = None):
         self.db = db
+        self.engine = ScoringEngine(weights)
         self.logger = logging.getLogger(__name__)
     
     def calculate_score(self, proxy_data: Dict, historical_stats: Optional[Dict] = None) -> float:
@@ -237,75 +344,17 @@ class ProxyScorer:
         Returns:
             综合评分 (0-100)
         """
-        score = 0
-        
-        # 1. 延迟评分 (30分)
-        response_time = proxy_data.get('response_time', 999)
-        if response_time:
-            if response_time < 1:
-                score += 30
-            elif response_time < 2:
-                score += 25
-            elif response_time < 3:
-                score += 20
-            elif response_time < 5:
-                score += 15
-            elif response_time < 8:
-                score += 10
-            else:
-                score += 5
-        
-        # 2. 稳定性评分 (20分) - 基于历史成功率
-        if historical_stats and 'success_rate' in historical_stats:
-            success_rate = historical_stats['success_rate']
-            score += success_rate * 20
-        elif proxy_data.get('is_valid'):
-            # 新代理，如果验证成功给予基础分
-            score += 10
-        
-        # 3. ISP类型评分 (15分)
-        ip_info = proxy_data.get('ip_info', {})
-        
-        # 移动网络加分
-        if proxy_data.get('is_mobile') or 'mobile' in str(ip_info.get('isp', '')).lower():
-            score += 15
-        elif not proxy_data.get('is_proxy', False):
-            # 非代理IP加分
-            score += 10
-        else:
-            score += 5
-        
-        # 4. 地理位置评分 (15分)
-        country = ip_info.get('country') or proxy_data.get('country', '')
-        target_countries = [
-            "United States", "Germany", "United Kingdom", "France", 
-            "Japan", "South Korea", "Taiwan", "Singapore", "Canada"
-        ]
-        if any(target in country for target in target_countries):
-            score += 15
-        elif country:
-            score += 8
-        
-        # 5. 历史表现评分 (20分)
-        if historical_stats:
-            # 检查次数越多，如果成功率高，评分越高
-            total_checks = historical_stats.get('total_checks', 0)
-            if total_checks >= 10:
-                score += 20
-            elif total_checks >= 5:
-                score += 15
-            elif total_checks >= 3:
-                score += 10
-            else:
-                score += 5
-        
-        # 带宽加分 (额外奖励)
-        bandwidth_score = proxy_data.get('bandwidth_score', 0)
-        score += bandwidth_score * 0.5  # 最多5分额外奖励
-        
-        # DNS泄露扣分
-        dns_leak = proxy_data.get('dns_leak')
-        if dns_leak and dns_leak.get('leak_detected'):
-            score -= 10
+        return self.engine.score_one(proxy_data, historical_stats)
+    
+    def score_batch(self, proxies: List[Dict], stats_map: Optional[Dict[str, Dict]] = None) -> List[float]:
+        """
+        批量计算综合评分（一次向量化计算）
         
-        return round(min(score, 100), 2)
+        Args:
+            proxies: 验证数据列表
+            stats_map: {代理地址: 历史统计}
+            
+        Returns:
+            评分列表（顺序与输入一致）
+        """
+        return self.engine.score_batch(proxies, stats_map)
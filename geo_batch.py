@@ -0,0 +1,231 @@
+"""
+批量地理位置查询模块
+收集探测成功的出口IP，从扫描主机直接调用 ip-api 的 /batch 接口（每批最多100个）
+"""
+
+import asyncio
+import logging
+from typing import Dict, Iterable, List, Optional
+
+import aiohttp
+from aiohttp import web
+
+from geo_cache import GeoCache, IP_API_FIELDS, parse_ip_api_response
+
+
+IP_API_BATCH_URL = "http://ip-api.com/batch"
+MAX_BATCH_SIZE = 100  # ip-api /batch 单次请求上限
+
+
+class GeoBatchResolver:
+    """批量地理位置解析器"""
+
+    def __init__(self, geo_cache: GeoCache = None, batch_url: str = IP_API_BATCH_URL,
+                 batch_size: int = MAX_BATCH_SIZE, timeout: int = 15, max_retries: int = 2):
+        """
+        Args:
+            geo_cache: 地理位置缓存，已缓存的IP不会再发起查询
+            batch_url: 批量查询接口地址（测试时可指向本地模拟服务器）
+            batch_size: 每批IP数量（不超过100）
+            timeout: 单次批量请求超时(秒)
+            max_retries: 被限流或请求失败时的重试次数
+        """
+        self.geo_cache = geo_cache or GeoCache(db_path=None)
+        self.batch_url = batch_url
+        self.batch_size = max(1, min(batch_size, MAX_BATCH_SIZE))
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.logger = logging.getLogger(__name__)
+
+        # 统计
+        self.batches_sent = 0   # 不含重试
+        self.retries = 0
+        self.ips_resolved = 0
+
+    async def resolve(self, ips: Iterable[str]) -> Dict[str, Dict]:
+        """
+        解析一组IP的地理位置
+
+        Returns:
+            {ip: 地理位置字典}，查询失败的IP不在结果中
+        """
+        ips = list(dict.fromkeys(ip for ip in ips if ip))
+        # 缓存读写是同步的 SQLite I/O（可能等待数据库写锁），放到线程中执行，不阻塞事件循环
+        results = await asyncio.to_thread(self.geo_cache.get_many, ips)
+        pending = [ip for ip in ips if ip not in results]
+
+        if not pending:
+            return results
+
+        self.logger.info(
+            f"批量查询地理位置: {len(pending)} 个IP "
+            f"({(len(pending) + self.batch_size - 1) // self.batch_size} 批, 缓存命中 {len(results)})"
+        )
+
+        async with aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=self.timeout)
+        ) as session:
+            for start in range(0, len(pending), self.batch_size):
+                chunk = pending[start:start + self.batch_size]
+                resolved = await self._resolve_chunk(session, chunk)
+                if resolved:
+                    await asyncio.to_thread(self.geo_cache.set_many, resolved)
+                    results.update(resolved)
+
+        return results
+
+    async def _resolve_chunk(self, session: aiohttp.ClientSession, ips: List[str]) -> Dict[str, Dict]:
+        """发送一批查询（带限流等待和重试，最后一次尝试失败后不再等待）"""
+        payload = [{'query': ip, 'fields': IP_API_FIELDS} for ip in ips]
+        self.geo_cache.lookups += len(ips)
+        self.batches_sent += 1
+
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+            if attempt:
+                self.retries += 1
+
+            # 响应在 async with 内读完即释放连接，所有等待都在其外进行
+            try:
+                async with session.post(self.batch_url, json=payload) as response:
+                    status = response.status
+                    wait = self._rate_limit_wait(response)
+                    data = await response.json(content_type=None) if status == 200 else None
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                self.logger.debug(f"批量地理位置查询出错 (第{attempt + 1}次): {e}")
+                if not last_attempt:
+                    await asyncio.sleep(1 + attempt)
+                continue
+
+            if status == 429:
+                if last_attempt:
+                    self.logger.warning(f"批量地理位置查询被限流，已重试 {self.max_retries} 次，放弃本批")
+                    break
+                self.logger.warning(f"批量地理位置查询被限流，等待 {wait or 60}s 后重试")
+                await asyncio.sleep(wait or 60)
+                continue
+
+            if status != 200:
+                self.logger.warning(f"批量地理位置查询失败: HTTP {status}")
+                return {}
+
+            resolved = {}
+            for ip, item in zip(ips, data):
+                geo = parse_ip_api_response(item)
+                if geo is not None:
+                    resolved[item.get('query', ip)] = geo
+            self.ips_resolved += len(resolved)
+
+            # 配额用尽时，下一批之前等待窗口重置
+            if wait:
+                self.logger.debug(f"批量查询配额用尽，等待 {wait}s")
+                await asyncio.sleep(wait)
+            return resolved
+
+        return {}
+
+    def _rate_limit_wait(self, response: aiohttp.ClientResponse) -> Optional[int]:
+        """
+        根据 ip-api 的限流响应头计算需要等待的秒数
+
+        X-Rl: 当前窗口剩余请求数, X-Ttl: 窗口重置剩余秒数
+        """
+        try:
+            remaining = int(response.headers.get('X-Rl', 1))
+            ttl = int(response.headers.get('X-Ttl', 0))
+        except ValueError:
+            return None
+
+        if response.status == 429 or remaining <= 0:
+            return ttl + 1
+        return None
+
+    def get_stats(self) -> Dict:
+        """获取批量查询统计"""
+        return {
+            'batches_sent': self.batches_sent,
+            'retries': self.retries,
+            'ips_resolved': self.ips_resolved,
+        }
+
+
+# ========== 本地模拟服务器（测试用） ==========
+
+def create_mock_batch_app(geo_table: Optional[Dict[str, Dict]] = None) -> web.Application:
+    """
+    创建模拟 ip-api /batch 接口的 aiohttp 应用
+
+    Args:
+        geo_table: {ip: ip-api 格式的响应字段}，未列出的IP返回默认的成功结果
+
+    应用的 'requests' 键记录收到的每批IP，便于断言批次数量
+    """
+    geo_table = geo_table or {}
+    app = web.Application()
+    app['requests'] = []
+
+    async def handle_batch(request: web.Request) -> web.Response:
+        items = await request.json()
+        if len(items) > MAX_BATCH_SIZE:
+            return web.json_response({'message': 'too many items'}, status=422)
+
+        ips = [item['query'] if isinstance(item, dict) else item for item in items]
+        request.app['requests'].append(ips)
+
+        response = []
+        for ip in ips:
+            entry = {
+                'status': 'success',
+                'country': 'Testland',
+                'countryCode': 'TL',
+                'city': 'Mock City',
+                'isp': 'Mock ISP',
+                'mobile': False,
+                'proxy': False,
+                'hosting': False,
+            }
+            entry.update(geo_table.get(ip, {}))
+            entry['query'] = ip
+            response.append(entry)
+
+        return web.json_response(response, headers={'X-Rl': '14', 'X-Ttl': '60'})
+
+    app.router.add_post('/batch', handle_batch)
+    return app
+
+
+async def start_mock_batch_server(geo_table: Optional[Dict[str, Dict]] = None,
+                                  host: str = '127.0.0.1', port: int = 0):
+    """
+    启动本地模拟服务器
+
+    Returns:
+        (runner, app, batch_url)，用完后调用 await runner.cleanup()
+    """
+    app = create_mock_batch_app(geo_table)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+
+    bound_port = runner.addresses[0][1]
+    return runner, app, f"http://{host}:{bound_port}/batch"
+
+
+async def example_usage():
+    """示例：对本地模拟服务器批量解析 250 个IP（3 批请求）"""
+    runner, app, batch_url = await start_mock_batch_server({'8.8.8.8': {'country': 'United States', 'countryCode': 'US'}})
+    try:
+        resolver = GeoBatchResolver(batch_url=batch_url)
+        ips = ['8.8.8.8'] + [f"10.0.{i // 256}.{i % 256}" for i in range(249)]
+        results = await resolver.resolve(ips)
+
+        print(f"解析IP数: {len(results)}")
+        print(f"批次数: {len(app['requests'])}")
+        print(f"8.8.8.8: {results['8.8.8.8']}")
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(example_usage())
@@ -0,0 +1,246 @@
+"""
+地理位置缓存模块
+按 IP 缓存地理位置信息（SQLite 持久化 + 进程内 LRU），避免每次运行重复查询
+"""
+
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+
+import aiohttp
+
+
+# ip-api 返回字段（一次请求拿到 validators / enhanced_validator / ip_reputation 所需的全部信息）
+IP_API_FIELDS = "status,message,country,countryCode,city,isp,mobile,proxy,hosting,query"
+IP_API_URL = "http://ip-api.com/json/{ip}?fields=" + IP_API_FIELDS
+
+# 批量读取时每条 IN (...) 查询的 IP 数（低于 SQLite 旧版本的 999 个参数上限）
+_QUERY_CHUNK = 500
+
+
+def parse_ip_api_response(data: Dict) -> Optional[Dict]:
+    """
+    将 ip-api 的响应转换为统一的地理位置字典
+
+    Returns:
+        地理位置字典，查询失败返回 None
+    """
+    if not data or data.get('status', 'success') != 'success':
+        return None
+
+    return {
+        'country': data.get('country', 'Unknown'),
+        'country_code': data.get('countryCode'),
+        'city': data.get('city', 'Unknown'),
+        'isp': data.get('isp', 'Unknown'),
+        'mobile': data.get('mobile', False),
+        'proxy': data.get('proxy', False),
+        'hosting': data.get('hosting', False),
+    }
+
+
+class GeoCache:
+    """
+    地理位置缓存（进程内 LRU + SQLite 持久化，带 TTL）
+
+    读写持久化缓存是同步的磁盘 I/O，且与扫描器的数据库写线程共用同一个数据库文件（写锁）。
+    在事件循环中应通过 asyncio.to_thread 调用 get / get_many / set_many，
+    本类自身的异步方法（lookup / fetch）已经如此处理
+    """
+
+    def __init__(self, db_path: Optional[str] = "proxies.db", ttl_hours: float = 24 * 7,
+                 memory_size: int = 10000, busy_timeout: float = 30):
+        """
+        Args:
+            db_path: SQLite 数据库路径，None 表示仅使用内存缓存
+            ttl_hours: 缓存有效期（小时）
+            memory_size: 进程内 LRU 最大条目数
+            busy_timeout: 等待其他连接释放写锁的最长时间（秒）
+        """
+        self.db_path = db_path
+        self.ttl_seconds = ttl_hours * 3600
+        self.memory_size = memory_size
+        self.busy_timeout = busy_timeout
+        self.logger = logging.getLogger(__name__)
+
+        self._memory: OrderedDict = OrderedDict()  # ip -> (geo, updated_at)
+        self._lock = threading.Lock()
+        self._conn = None
+
+        # 命中统计
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self.lookups = 0  # 实际发出的网络查询次数
+
+        if db_path:
+            self._init_database()
+
+    def _init_database(self):
+        """初始化缓存表"""
+        self._conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS geo_cache (
+                ip TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    def _is_fresh(self, updated_at: float) -> bool:
+        return time.time() - updated_at < self.ttl_seconds
+
+    def _remember(self, ip: str, geo: Dict, updated_at: float):
+        """写入进程内 LRU"""
+        self._memory[ip] = (geo, updated_at)
+        self._memory.move_to_end(ip)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def get(self, ip: str) -> Optional[Dict]:
+        """查询缓存，未命中或已过期返回 None"""
+        with self._lock:
+            entry = self._memory.get(ip)
+            if entry and self._is_fresh(entry[1]):
+                self._memory.move_to_end(ip)
+                self.memory_hits += 1
+                return dict(entry[0])
+
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT data, updated_at FROM geo_cache WHERE ip = ?", (ip,)
+                ).fetchone()
+                if row and self._is_fresh(row[1]):
+                    geo = json.loads(row[0])
+                    self._remember(ip, geo, row[1])
+                    self.db_hits += 1
+                    return dict(geo)
+
+            self.misses += 1
+            return None
+
+    def get_many(self, ips: Iterable[str]) -> Dict[str, Dict]:
+        """
+        批量查询缓存（进程内未命中的 IP 合并为少数几条数据库查询）
+
+        Returns:
+            {ip: 地理位置字典}，未命中或已过期的 IP 不在结果中
+        """
+        results = {}
+        with self._lock:
+            pending = []
+            db_hits = 0
+            for ip in dict.fromkeys(ips):
+                entry = self._memory.get(ip)
+                if entry and self._is_fresh(entry[1]):
+                    self._memory.move_to_end(ip)
+                    self.memory_hits += 1
+                    results[ip] = dict(entry[0])
+                else:
+                    pending.append(ip)
+
+            if self._conn is not None:
+                for start in range(0, len(pending), _QUERY_CHUNK):
+                    chunk = pending[start:start + _QUERY_CHUNK]
+                    rows = self._conn.execute(
+                        f"SELECT ip, data, updated_at FROM geo_cache WHERE ip IN ({', '.join('?' * len(chunk))})",
+                        chunk
+                    ).fetchall()
+                    for ip, data, updated_at in rows:
+                        if self._is_fresh(updated_at):
+                            geo = json.loads(data)
+                            self._remember(ip, geo, updated_at)
+                            db_hits += 1
+                            results[ip] = dict(geo)
+
+            self.db_hits += db_hits
+            self.misses += len(pending) - db_hits
+        return results
+
+    def set(self, ip: str, geo: Dict):
+        """写入缓存"""
+        self.set_many({ip: geo})
+
+    def set_many(self, items: Dict[str, Dict]):
+        """批量写入缓存（单个事务）"""
+        if not items:
+            return
+
+        now = time.time()
+        with self._lock:
+            for ip, geo in items.items():
+                self._remember(ip, geo, now)
+
+            if self._conn is not None:
+                self._conn.executemany("""
+                    INSERT INTO geo_cache (ip, data, updated_at) VALUES (?, ?, ?)
+                    ON CONFLICT(ip) DO UPDATE SET
+                        data = excluded.data,
+                        updated_at = excluded.updated_at
+                """, [(ip, json.dumps(geo, ensure_ascii=False), now) for ip, geo in items.items()])
+                self._conn.commit()
+
+    async def lookup(self, ip: str, session: aiohttp.ClientSession) -> Optional[Dict]:
+        """
+        先查缓存，未命中时通过给定会话查询 ip-api 并写回缓存
+
+        Args:
+            ip: 要查询的 IP
+            session: aiohttp 会话（可以是直连或经过代理）
+        """
+        geo = await asyncio.to_thread(self.get, ip)
+        if geo is not None:
+            return geo
+        return await self.fetch(ip, session)
+
+    async def fetch(self, ip: str, session: aiohttp.ClientSession) -> Optional[Dict]:
+        """跳过缓存直接查询 ip-api，成功后写回缓存"""
+        self.lookups += 1
+        async with session.get(IP_API_URL.format(ip=ip)) as response:
+            if response.status != 200:
+                return None
+            geo = parse_ip_api_response(await response.json(content_type=None))
+
+        if geo is not None:
+            await asyncio.to_thread(self.set, ip, geo)
+        return geo
+
+    def purge_expired(self) -> int:
+        """删除过期的持久化缓存条目"""
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            for ip in [ip for ip, (_, ts) in self._memory.items() if ts < cutoff]:
+                del self._memory[ip]
+
+            if self._conn is None:
+                return 0
+            cursor = self._conn.execute("DELETE FROM geo_cache WHERE updated_at < ?", (cutoff,))
+            self._conn.commit()
+            return cursor.rowcount
+
+    def get_stats(self) -> Dict:
+        """获取缓存命中统计"""
+        hits = self.memory_hits + self.db_hits
+        total = hits + self.misses
+        return {
+            'hits': hits,
+            'memory_hits': self.memory_hits,
+            'db_hits': self.db_hits,
+            'misses': self.misses,
+            'lookups': self.lookups,
+            'hit_rate': hits / total if total else 0,
+            'memory_entries': len(self._memory),
+        }
+
+    def close(self):
+        """关闭持久化连接"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,121 @@
+"""
+离线 GeoIP 预过滤模块
+探测前用本地 MaxMind 数据库（GeoLite2-Country / GeoLite2-City .mmdb）解析代理入口IP的国家，
+跳过不在白名单内的候选，避免把探测预算花在最终会被国家过滤丢弃的代理上
+"""
+
+import logging
+import random
+from typing import Dict, FrozenSet, Iterable, List, Optional
+
+try:
+    import maxminddb
+except ImportError:  # 可选依赖，未安装时预过滤不可用
+    maxminddb = None
+
+
+class GeoIPPreFilter:
+    """基于本地 GeoIP 数据库的国家预过滤器"""
+
+    def __init__(self, db_path: str, target_codes: FrozenSet[str], tolerance: float = 0.05):
+        """
+        Args:
+            db_path: MaxMind .mmdb 数据库路径（Country 或 City 库均可）
+            target_codes: 国家白名单（ISO 两字母代码集合）
+            tolerance: 入口IP不在白名单内的候选仍按此比例随机抽样探测（0~1）。
+                       入口IP和出口IP可能位于不同国家，保留少量样本以免漏掉这类代理
+        """
+        if maxminddb is None:
+            raise ImportError("maxminddb 未安装，无法使用 GeoIP 预过滤")
+
+        self.db_path = db_path
+        self.target_codes = target_codes
+        self.tolerance = max(0.0, min(float(tolerance), 1.0))
+        self.logger = logging.getLogger(__name__)
+
+        self._reader = maxminddb.open_database(db_path)
+        self._country_cache: Dict[str, Optional[str]] = {}
+
+        # 统计
+        self.kept = 0
+        self.skipped = 0
+        self.sampled = 0
+        self.unknown = 0
+
+    @classmethod
+    def from_config(cls, config) -> Optional['GeoIPPreFilter']:
+        """
+        根据配置创建预过滤器
+
+        Returns:
+            未配置数据库、未设置国家白名单或数据库不可用时返回 None
+        """
+        db_path = getattr(config, 'geoip_db_path', None)
+        target_codes = getattr(config, 'target_country_codes', None)
+        if not db_path or not target_codes:
+            return None
+
+        try:
+            return cls(db_path, target_codes, getattr(config, 'geoip_tolerance', 0.05))
+        except (ImportError, OSError, ValueError) as e:
+            logging.getLogger(__name__).warning(f"GeoIP 预过滤不可用，将探测全部候选: {e}")
+            return None
+
+    def lookup_country(self, ip: str) -> Optional[str]:
+        """查询IP所在国家的 ISO 代码，数据库中没有记录时返回 None"""
+        if ip in self._country_cache:
+            return self._country_cache[ip]
+
+        try:
+            record = self._reader.get(ip)
+        except ValueError:  # 非法IP
+            record = None
+
+        code = None
+        if record:
+            country = record.get('country') or record.get('registered_country') or {}
+            code = country.get('iso_code')
+
+        self._country_cache[ip] = code
+        return code
+
+    def should_probe(self, proxy: str) -> bool:
+        """判断候选代理是否需要探测"""
+        ip = proxy.rsplit(':', 1)[0]
+        code = self.lookup_country(ip)
+
+        if code is None:
+            # 数据库无记录（私有地址、新分配网段等），无法判断时保守地探测
+            self.unknown += 1
+            return True
+
+        if code in self.target_codes:
+            self.kept += 1
+            return True
+
+        if self.tolerance and random.random() < self.tolerance:
+            self.sampled += 1
+            return True
+
+        self.skipped += 1
+        return False
+
+    def filter(self, proxies: Iterable[str]) -> List[str]:
+        """过滤候选列表，返回需要探测的代理"""
+        return [proxy for proxy in proxies if self.should_probe(proxy)]
+
+    def get_stats(self) -> Dict:
+        """获取预过滤统计"""
+        total = self.kept + self.skipped + self.sampled + self.unknown
+        return {
+            'total': total,
+            'kept': self.kept,
+            'sampled': self.sampled,
+            'unknown': self.unknown,
+            'skipped': self.skipped,
+            'skip_rate': self.skipped / total if total else 0,
+        }
+
+    def close(self):
+        """关闭数据库"""
+        self._reader.close()
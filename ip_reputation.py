@@ -9,15 +9,18 @@ import logging
 from typing import Dict, Optional
 from datetime import datetime, timedelta
 from timezone_utils import now_utc
+from geo_cache import GeoCache
 
 
 class IPReputationChecker:
     """IP信誉检测器"""
     
-    def __init__(self):
+    def __init__(self, geo_cache: GeoCache = None):
         self.logger = logging.getLogger(__name__)
         self.cache = {}  # IP信誉缓存
         self.cache_ttl = timedelta(hours=24)  # 缓存24小时
+        # 地理位置缓存（与验证器共享，避免重复查询 ip-api）
+        self.geo_cache = geo_cache or GeoCache(db_path=None)
     
     async def check_reputation(self, proxy_address: str, session: aiohttp.ClientSession) -> Dict:
         """
@@ -104,18 +107,16 @@ class IPReputationChecker:
     async def _check_ipqualityscore(self, ip: str, reputation: Dict):
         """
         通过IP-API.com检查IP类型
-        (免费版，无需API key)
+        (免费版，无需API key；优先读地理位置缓存)
         """
         try:
-            async with aiohttp.ClientSession() as session:
-                url = f"http://ip-api.com/json/{ip}?fields=proxy,hosting,mobile"
-                
-                async with session.get(url, timeout=aiohttp.ClientTimeout(total=5)) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        reputation['is_proxy'] = data.get('proxy', False)
-                        reputation['is_datacenter'] = data.get('hosting', False)
-                        reputation['is_mobile'] = data.get('mobile', False)
+            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=5)) as session:
+                data = await self.geo_cache.lookup(ip, session)
+            
+            if data:
+                reputation['is_proxy'] = data.get('proxy', False)
+                reputation['is_datacenter'] = data.get('hosting', False)
+                reputation['is_mobile'] = data.get('mobile', False)
         except Exception as e:
             self.logger.debug(f"IP类型检测失败: {e}")
     
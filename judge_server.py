@@ -0,0 +1,125 @@
+"""
+代理判定（Judge）服务器模块
+一次请求回显客户端IP和收到的请求头，验证器据此同时得出可用性、出口IP和匿名级别
+
+响应格式与 httpbin.org/get 兼容（同时提供 ip 和 origin 字段），可直接自建部署:
+    python judge_server.py --host 0.0.0.0 --port 8899
+注意：需直接对外暴露，放在反向代理之后会引入额外的转发头
+"""
+
+import argparse
+import json
+import logging
+from typing import Dict, Optional
+
+import aiohttp
+from aiohttp import web
+
+
+# 会暴露代理存在或真实IP的请求头（小写）
+PROXY_HEADERS = (
+    'x-forwarded-for',
+    'x-real-ip',
+    'via',
+    'forwarded',
+    'forwarded-for',
+    'x-forwarded',
+    'client-ip',
+    'x-client-ip',
+    'x-proxy-id',
+    'proxy-connection',
+)
+
+
+def create_judge_app() -> web.Application:
+    """创建 Judge 应用（任意路径的 GET/HEAD 都回显客户端IP和请求头）"""
+    app = web.Application()
+
+    async def handle_judge(request: web.Request) -> web.Response:
+        client_ip = request.remote or ''
+        return web.json_response(
+            {
+                'ip': client_ip,
+                'origin': client_ip,
+                'headers': dict(request.headers),
+            },
+            dumps=_compact_dumps,
+        )
+
+    app.router.add_route('GET', '/{tail:.*}', handle_judge)
+    return app
+
+
+def _compact_dumps(data: Dict) -> str:
+    return json.dumps(data, separators=(',', ':'))
+
+
+def determine_anonymity(headers: Dict[str, str], real_ip: Optional[str] = None) -> str:
+    """
+    根据 Judge 收到的请求头判断匿名级别
+
+    - Transparent: 转发头中包含扫描主机的真实IP
+    - Anonymous: 存在 X-Forwarded-For / Via 等代理头，但未泄露真实IP
+    - Elite: 没有任何代理头
+
+    Args:
+        headers: Judge 回显的请求头
+        real_ip: 扫描主机的真实出口IP（未知时无法识别 Transparent）
+    """
+    leaked = [
+        str(value) for name, value in (headers or {}).items()
+        if name.lower() in PROXY_HEADERS
+    ]
+
+    if not leaked:
+        return 'Elite'
+    if real_ip and any(real_ip in value for value in leaked):
+        return 'Transparent'
+    return 'Anonymous'
+
+
+def parse_judge_response(data: Dict, real_ip: Optional[str] = None) -> Dict:
+    """
+    解析 Judge 响应（本模块的服务器或 httpbin.org/get）
+
+    Returns:
+        {'exit_ip': 出口IP, 'anonymity': 匿名级别, 'headers': 请求头}
+    """
+    data = data if isinstance(data, dict) else {}
+    exit_ip = str(data.get('ip') or data.get('origin') or '').split(',')[0].strip()
+    headers = data.get('headers') or {}
+
+    return {
+        'exit_ip': exit_ip,
+        'anonymity': determine_anonymity(headers, real_ip) if 'headers' in data else 'Unknown',
+        'headers': headers,
+    }
+
+
+async def detect_real_ip(judge_url: str, timeout: float = 10) -> Optional[str]:
+    """不经代理请求一次 Judge，返回扫描主机的真实出口IP（用于识别透明代理）"""
+    async with aiohttp.ClientSession(
+        timeout=aiohttp.ClientTimeout(total=timeout)
+    ) as session:
+        async with session.get(judge_url) as response:
+            data = await response.json(content_type=None)
+    return parse_judge_response(data)['exit_ip'] or None
+
+
+def run_judge_server(host: str = '0.0.0.0', port: int = 8899):
+    """启动 Judge 服务器"""
+    logging.getLogger(__name__).info(f"Judge 服务器启动于 http://{host}:{port}")
+    web.run_app(create_judge_app(), host=host, port=port, access_log=None)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='代理 Judge 服务器')
+    parser.add_argument('--host', type=str, default='0.0.0.0', help='监听地址')
+    parser.add_argument('--port', type=int, default=8899, help='监听端口')
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    run_judge_server(args.host, args.port)
@@ -0,0 +1,155 @@
+"""
+延迟分布草图模块
+固定大小的对数分桶直方图（64 桶 × uint16，128 字节），按小端序列化为 BLOB 存入数据库，
+每次验证原地合并，无需扫描历史即可得到 p50/p90/p99（相对误差约 ±10%）
+"""
+
+import math
+import sys
+from array import array
+from bisect import bisect_right
+from functools import lru_cache
+from itertools import accumulate
+from typing import Dict, Iterable, Optional, Sequence
+
+
+SKETCH_BUCKETS = 64
+SKETCH_MIN = 0.01      # 最小可分辨延迟(秒)，更小的值计入第一个桶
+SKETCH_GAMMA = 1.2     # 相邻桶边界的比值，上限约 0.01 × 1.2^64 ≈ 1170 秒
+_COUNT_MAX = 0xFFFF
+_LOG_GAMMA = math.log(SKETCH_GAMMA)
+
+
+class LatencySketch:
+    """对数分桶延迟直方图"""
+
+    __slots__ = ('counts',)
+
+    def __init__(self, counts: Optional[array] = None):
+        self.counts = counts if counts is not None else array('H', bytes(2 * SKETCH_BUCKETS))
+
+    @classmethod
+    def from_bytes(cls, data: Optional[bytes]) -> 'LatencySketch':
+        """从 BLOB 恢复（空值或长度不符时返回空草图）"""
+        if not data or len(data) != 2 * SKETCH_BUCKETS:
+            return cls()
+        counts = array('H')
+        counts.frombytes(data)
+        if sys.byteorder == 'big':
+            counts.byteswap()
+        return cls(counts)
+
+    @classmethod
+    def from_values(cls, values: Iterable[float]) -> 'LatencySketch':
+        """由一组延迟值构建"""
+        sketch = cls()
+        for value in values:
+            sketch.add(value)
+        return sketch
+
+    def to_bytes(self) -> bytes:
+        """序列化为 BLOB（计数按小端存储，数据库文件跨平台可用）"""
+        counts = self.counts
+        if sys.byteorder == 'big':
+            counts = array('H', counts)
+            counts.byteswap()
+        return counts.tobytes()
+
+    @staticmethod
+    def bucket_index(value: float) -> int:
+        """延迟值所在的桶"""
+        if value <= SKETCH_MIN:
+            return 0
+        return min(int(math.log(value / SKETCH_MIN) / _LOG_GAMMA), SKETCH_BUCKETS - 1)
+
+    def add(self, value: float):
+        """记录一次延迟（计数将溢出时所有桶减半，同时让旧数据逐渐淡出）"""
+        index = self.bucket_index(value)
+        if self.counts[index] >= _COUNT_MAX:
+            self._halve()
+        self.counts[index] += 1
+
+    def _halve(self):
+        for index, count in enumerate(self.counts):
+            self.counts[index] = (count + 1) // 2 if count else 0
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        估算分位数
+
+        Args:
+            q: 0~1 之间的分位点
+
+        Returns:
+            所在桶的几何中点(秒)，草图为空时返回 None
+        """
+        return _quantile(list(accumulate(self.counts)), q)
+
+    def percentiles(self) -> Dict[str, Optional[float]]:
+        """常用分位数 p50/p90/p99 及样本数"""
+        return {
+            'p50': _round(self.quantile(0.5)),
+            'p90': _round(self.quantile(0.9)),
+            'p99': _round(self.quantile(0.99)),
+            'samples': self.count,
+        }
+
+
+def _quantile(cumulative: Sequence[int], q: float) -> Optional[float]:
+    """由各桶的累计计数求分位数：累计计数首次超过排名的桶"""
+    total = cumulative[-1]
+    if not total:
+        return None
+    index = min(bisect_right(cumulative, q * (total - 1)), SKETCH_BUCKETS - 1)
+    return SKETCH_MIN * SKETCH_GAMMA ** (index + 0.5)
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 4) if value is not None else None
+
+
+def sketch_add(data: Optional[bytes], value: Optional[float]) -> Optional[bytes]:
+    """
+    向 BLOB 草图追加一个延迟值（注册为 SQLite 函数 sketch_add）
+
+    value 为 NULL 时原样返回
+    """
+    if value is None:
+        return data
+    sketch = LatencySketch.from_bytes(data)
+    sketch.add(value)
+    return sketch.to_bytes()
+
+
+def sketch_quantile(data: Optional[bytes], q: float) -> Optional[float]:
+    """
+    BLOB 草图的分位数（注册为 SQLite 函数 sketch_quantile），草图为空时返回 NULL
+
+    同一草图通常连续查询多个分位点，解码后的累计计数按 BLOB 缓存
+    """
+    return _round(_quantile(_cumulative_counts(data), q))
+
+
+@lru_cache(maxsize=64)
+def _cumulative_counts(data: Optional[bytes]) -> tuple:
+    return tuple(accumulate(LatencySketch.from_bytes(data).counts))
+
+
+def sketch_percentiles(data: Optional[bytes]) -> Dict[str, Optional[float]]:
+    """解析 BLOB 草图的 p50/p90/p99"""
+    return LatencySketch.from_bytes(data).percentiles()
+
+
+if __name__ == "__main__":
+    import random
+
+    values = [random.lognormvariate(0, 0.8) for _ in range(10000)]
+    sketch = LatencySketch.from_values(values)
+    exact = sorted(values)
+    print(f"草图大小: {len(sketch.to_bytes())} 字节")
+    for q in (0.5, 0.9, 0.99):
+        print(f"p{int(q * 100)}: 估算 {sketch.quantile(q):.3f}s, 精确 {exact[int(q * (len(exact) - 1))]:.3f}s")
@@ -9,19 +9,40 @@ import yaml
 import logging
 import os
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Optional
 from datetime import datetime
 from timezone_utils import now_utc, format_china_time, get_display_time
+from country_codes import UNKNOWN_CODE, country_name, resolve_country_code
+from scoring import ScoringEngine, ScoringWeights
+
+# 订阅评分门槛（统一评分引擎的 0-100 分制）
+# 标准版 40 分对应旧验证器 0-17 分制的 10 分：对无历史记录、非目标国家的节点，
+# 淘汰响应超过 5 秒、或被标记为代理且响应超过 3 秒的节点
+MIN_SCORE = 40.0
+PREMIUM_SCORE = 70.0
 
 class SubscriptionGenerator:
     """订阅链接生成器"""
     
-    def __init__(self, json_path: str = "subscribe/proxies.json", output_dir: str = "subscribe"):
+    def __init__(self, json_path: str = "subscribe/proxies.json", output_dir: str = "subscribe",
+                 config=None, min_score: float = MIN_SCORE, premium_score: float = PREMIUM_SCORE):
+        """
+        Args:
+            json_path: 代理 JSON 文件路径
+            output_dir: 订阅文件输出目录
+            config: 扫描配置（读取 scoring_weights，为没有评分的代理补算评分）
+            min_score: 标准版/快速版/按国家订阅的最低评分
+            premium_score: 高质量版的最低评分
+        """
         self.json_path = json_path
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(exist_ok=True)
         self.logger = logging.getLogger(__name__)
+        self.min_score = min_score
+        self.premium_score = premium_score
+        self.scoring_engine = ScoringEngine(ScoringWeights.from_dict(getattr(config, 'scoring_weights', None)))
         self.proxies = self._load_proxies()
+        self._fallback_scores = self._score_unscored()
     
     def _load_proxies(self) -> List[Dict]:
         """从 JSON 文件加载代理"""
@@ -45,18 +66,29 @@ class SubscriptionGenerator:
             self.logger.error(f"加载代理文件失败: {e}")
             return []
     
+    def _score_unscored(self) -> Dict[int, float]:
+        """对没有评分的代理用统一评分引擎批量补算评分"""
+        unscored = [
+            p for p in self.proxies
+            if 'score' not in p and not isinstance(p.get('rating'), dict)
+        ]
+        scores = self.scoring_engine.score_batch(unscored)
+        return {id(p): score for p, score in zip(unscored, scores)}
+    
     def _get_score(self, proxy: Dict) -> float:
         """获取代理评分，兼容新旧格式"""
         # 优先使用新的rating系统
         if 'rating' in proxy and isinstance(proxy['rating'], dict):
             return proxy['rating'].get('overall_score', 0)
-        # 向后兼容旧的score字段
-        return proxy.get('score', 0)
+        # 向后兼容旧的score字段，都没有时使用统一评分引擎的结果
+        if 'score' in proxy:
+            return proxy['score']
+        return self._fallback_scores.get(id(proxy), 0)
     
-    def generate_all_formats(self, min_score: float = 10.0):
-        """生成所有格式的订阅文件"""
-        # 过滤评分 (假设满分100，这里默认只取10分以上的，或者根据实际评分逻辑调整)
-        # 注意：新的评分系统可能是 0-100 分制
+    def generate_all_formats(self, min_score: Optional[float] = None):
+        """生成所有格式的订阅文件（min_score 默认为 self.min_score，0-100 分制）"""
+        if min_score is None:
+            min_score = self.min_score
         valid_proxies = [p for p in self.proxies if self._get_score(p) >= min_score]
         
         # 按分数排序
@@ -85,28 +117,28 @@ class SubscriptionGenerator:
     
     def generate_socks5_subscriptions(self):
         """生成多层级 SOCKS5 订阅文件"""
-        # 1. 标准版（所有有效代理，评分 >= 10）
-        all_valid = [p for p in self.proxies if self._get_score(p) >= 10.0]
+        # 1. 标准版（所有有效代理，评分 >= min_score）
+        all_valid = [p for p in self.proxies if self._get_score(p) >= self.min_score]
         all_valid.sort(key=lambda x: self._get_score(x), reverse=True)
         
-        # 2. 高质量版（评分 >= 70）
-        premium = [p for p in self.proxies if self._get_score(p) >= 70.0]
+        # 2. 高质量版（评分 >= premium_score）
+        premium = [p for p in self.proxies if self._get_score(p) >= self.premium_score]
         premium.sort(key=lambda x: self._get_score(x), reverse=True)
         
         # 3. 快速版（响应时间 < 2s）
         fast = [p for p in self.proxies 
-                if self._get_score(p) >= 10.0 
+                if self._get_score(p) >= self.min_score 
                 and p.get('response_time', 999) < 2.0]
         fast.sort(key=lambda x: x.get('response_time', 999))
         
         # 生成文件
         if all_valid:
             self._save_socks5_list(all_valid, self.output_dir / 'socks5-all.txt', 
-                                   '所有有效 SOCKS5 代理（评分 >= 10）')
+                                   f'所有有效 SOCKS5 代理（评分 >= {self.min_score:g}）')
         
         if premium:
             self._save_socks5_list(premium, self.output_dir / 'socks5-premium.txt',
-                                   '高质量 SOCKS5 代理（评分 >= 70）')
+                                   f'高质量 SOCKS5 代理（评分 >= {self.premium_score:g}）')
         
         if fast:
             self._save_socks5_list(fast, self.output_dir / 'socks5-fast.txt',
@@ -135,15 +167,15 @@ class SubscriptionGenerator:
         # 按国家分组
         by_country = {}
         for p in self.proxies:
-            if self._get_score(p) < 10.0:
+            if self._get_score(p) < self.min_score:
                 continue
             
-            country_code = p.get('country_code', 'UN')
-            country_name = p.get('country', 'Unknown')
+            # 统一为 ISO 代码，避免同一国家因写法不同被拆成多个分组
+            country_code = resolve_country_code(p.get('country_code'), p.get('country'))
             
             if country_code not in by_country:
                 by_country[country_code] = {
-                    'name': country_name,
+                    'name': country_name(country_code) if country_code != UNKNOWN_CODE else p.get('country', 'Unknown'),
                     'proxies': []
                 }
             by_country[country_code]['proxies'].append(p)
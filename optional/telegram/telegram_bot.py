@@ -16,7 +16,7 @@ except ImportError:
     TELEBOT_AVAILABLE = False
     logging.warning("pyTelegramBotAPI 未安装，Telegram功能不可用")
 
-from proxy_database import ProxyDatabase
+from async_database import AsyncProxyDatabase
 
 
 class TelegramBot:
@@ -34,7 +34,8 @@ class TelegramBot:
             raise ImportError("请安装 pyTelegramBotAPI: pip install pyTelegramBotAPI")
         
         self.bot = AsyncTeleBot(token)
-        self.db = ProxyDatabase(db_path)
+        # 查询在数据库读写线程中执行，处理器等待时不阻塞其他更新
+        self.db = AsyncProxyDatabase(db_path)
         self.logger = logging.getLogger(__name__)
         
         self._register_handlers()
@@ -64,7 +65,7 @@ class TelegramBot:
         async def send_stats(message):
             """发送统计信息"""
             try:
-                stats = self.db.get_database_stats()
+                stats = await self.db.get_database_stats()
                 
                 stats_text = f"""
 📊 *代理池统计*
@@ -89,7 +90,7 @@ class TelegramBot:
         async def send_best_proxies(message):
             """发送最佳代理列表"""
             try:
-                proxies = self.db.get_best_proxies(limit=10)
+                proxies = await self.db.get_best_proxies(limit=10)
                 
                 if not proxies:
                     await self.bot.reply_to(message, "❌ 暂无可用代理")
@@ -117,7 +118,7 @@ class TelegramBot:
         async def send_sources(message):
             """发送代理源状态"""
             try:
-                sources = self.db.get_source_health()
+                sources = await self.db.get_source_health()
                 
                 if not sources:
                     await self.bot.reply_to(message, "❌ 暂无代理源数据")
@@ -149,7 +150,7 @@ class TelegramBot:
             """数据库健康检查"""
             try:
                 # 执行清理
-                deleted_validations, deleted_proxies = self.db.cleanup_old_records(days=30)
+                deleted_validations, deleted_proxies = await self.db.cleanup_old_records(days=30)
                 
                 health_text = f"""
 🏥 *数据库健康检查*
@@ -184,7 +185,7 @@ class TelegramBot:
             # 检查是否为IP:端口格式
             if ':' in text and len(text.split(':')) == 2:
                 try:
-                    stats = self.db.get_proxy_stats(text)
+                    stats = await self.db.get_proxy_stats(text)
                     
                     if not stats:
                         await self.bot.reply_to(message, f"❌ 代理 `{text}` 不在数据库中", parse_mode='Markdown')
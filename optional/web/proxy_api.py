@@ -14,13 +14,15 @@ from flask_cors import CORS
 from proxy_database import ProxyDatabase
 from config_manager import ConfigManager
 from timezone_utils import now_utc
+from country_codes import normalize_country
 
 app = Flask(__name__)
 CORS(app)
 
 # 配置
 config = ConfigManager()
-db = ProxyDatabase(config.database_path)
+# 只读快照：扫描器每次运行结束时发布，读取不受扫描中的写入和清理影响
+db = ProxyDatabase.open_snapshot(config.database_path)
 logger = logging.getLogger(__name__)
 
 
@@ -73,9 +75,10 @@ def get_random_proxy():
         # 获取代理列表
         proxies = db.get_best_proxies(limit=100, min_checks=2, min_success_rate=0.5)
         
-        # 过滤
+        # 过滤 (国家参数可以是代码或名称)
         if country:
-            proxies = [p for p in proxies if p.get('country_code') == country.upper()]
+            country_code = normalize_country(country)
+            proxies = [p for p in proxies if p.get('country_code') == country_code]
         
         if min_score > 0:
             proxies = [p for p in proxies if p.get('avg_score', 0) >= min_score]
@@ -93,7 +96,7 @@ def get_random_proxy():
             'city': proxy.get('city'),
             'score': round(proxy.get('avg_score', 0), 2),
             'success_rate': round(proxy.get('success_rate', 0), 3),
-            'response_time': round(proxy.get('avg_response_time', 0), 3),
+            'response_time': round(proxy.get('ewma_latency') or proxy.get('avg_response_time') or 0, 3),
             'checks': proxy.get('total_checks', 0),
             'format': f"socks5://{proxy['proxy_address']}"
         })
@@ -112,6 +115,7 @@ def get_best_proxies():
         limit (int): 返回数量 (默认10, 最大100)
         country (str): 国家代码过滤 (可选)
         min_score (float): 最低评分 (可选)
+        sort (str): 排序方式 score|p50|p90|p99 (默认score，分位数按延迟从低到高)
         format (str): 返回格式 simple|detailed (默认simple)
     
     Returns:
@@ -130,14 +134,17 @@ def get_best_proxies():
         limit = min(request.args.get('limit', 10, type=int), 100)
         country = request.args.get('country')
         min_score = request.args.get('min_score', 0, type=float)
+        sort_by = request.args.get('sort', 'score')
         format_type = request.args.get('format', 'simple')
         
-        # 获取代理
-        proxies = db.get_best_proxies(limit=limit * 2, min_checks=2, min_success_rate=0.5)
+        # 获取代理 (按尾延迟排序时由数据库按分位数索引排序，没有延迟样本的代理不参与)
+        order_by = sort_by if sort_by in ('p50', 'p90', 'p99') else 'score'
+        proxies = db.get_best_proxies(limit=limit * 2, min_checks=2, min_success_rate=0.5, order_by=order_by)
         
-        # 过滤
+        # 过滤 (国家参数可以是代码或名称)
         if country:
-            proxies = [p for p in proxies if p.get('country_code') == country.upper()]
+            country_code = normalize_country(country)
+            proxies = [p for p in proxies if p.get('country_code') == country_code]
         
         if min_score > 0:
             proxies = [p for p in proxies if p.get('avg_score', 0) >= min_score]
@@ -163,7 +170,10 @@ def get_best_proxies():
                     'country_code': p.get('country_code'),
                     'score': round(p.get('avg_score', 0), 2),
                     'success_rate': round(p.get('success_rate', 0), 3),
-                    'response_time': round(p.get('avg_response_time', 0), 3),
+                    'response_time': round(p.get('ewma_latency') or p.get('avg_response_time') or 0, 3),
+                    'latency_p50': p.get('p50'),
+                    'latency_p90': p.get('p90'),
+                    'latency_p99': p.get('p99'),
                 } for p in proxies]
             })
         
@@ -187,17 +197,18 @@ def get_proxies_by_country(country_code):
         limit = min(request.args.get('limit', 10, type=int), 100)
         
         # 获取所有代理并过滤
+        country_code = normalize_country(country_code)
         proxies = db.get_best_proxies(limit=1000, min_checks=2)
         country_proxies = [
             p for p in proxies 
-            if p.get('country_code') == country_code.upper()
+            if p.get('country_code') == country_code
         ][:limit]
         
         if not country_proxies:
             return jsonify({'error': f'No proxies for country {country_code}'}), 404
         
         return jsonify({
-            'country': country_code.upper(),
+            'country': country_code,
             'count': len(country_proxies),
             'proxies': [p['proxy_address'] for p in country_proxies]
         })
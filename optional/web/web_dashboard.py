@@ -21,7 +21,8 @@ CORS(app)  # 启用CORS
 
 # 全局配置和数据库
 config = ConfigManager()
-db = ProxyDatabase(config.database_path)
+# 查询读取扫描器发布的只读快照，清理等写操作直接打开数据库
+db = ProxyDatabase.open_snapshot(config.database_path)
 logger = logging.getLogger(__name__)
 
 
@@ -149,7 +150,11 @@ def trigger_cleanup():
     """触发数据库清理"""
     try:
         days = request.json.get('days', 30) if request.json else 30
-        deleted_validations, deleted_proxies = db.cleanup_old_records(days=days)
+        live_db = ProxyDatabase(config.database_path)
+        try:
+            deleted_validations, deleted_proxies = live_db.cleanup_old_records(days=days)
+        finally:
+            live_db.close()
         
         return jsonify({
             'success': True,
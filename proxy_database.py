@@ -3,37 +3,414 @@
 提供代理历史记录存储、统计分析和智能查询功能
 """
 
+import os
 import sqlite3
 import json
+import stat
+import tempfile
+import threading
+import time
+from array import array
+from collections import Counter
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional, Tuple, Set
+from typing import Iterable, List, Dict, Optional, Tuple, Set
+from urllib.request import pathname2url
 import logging
 from contextlib import contextmanager
 from timezone_utils import now_utc, format_china_time
+from latency_sketch import LatencySketch, sketch_add, sketch_percentiles, sketch_quantile
+from blacklist_index import BlacklistIndex, pack_address
+
+
+# 代理地址以打包整数 addr_key = (IPv4 << 16) | 端口 存储，唯一索引、JOIN 和网段范围查询都基于该整数；
+# 文本地址/IP/端口为生成列：proxies 的文本地址几乎每次查询都会读取，存储一份 (STORED，不建索引)，
+# 其余只在读取时计算 (VIRTUAL)
+_IP_SQL = (
+    "printf('%d.%d.%d.%d', addr_key >> 40, (addr_key >> 32) & 255, (addr_key >> 24) & 255, "
+    "(addr_key >> 16) & 255)"
+)
+_ADDRESS_SQL = (
+    "printf('%d.%d.%d.%d:%d', addr_key >> 40, (addr_key >> 32) & 255, (addr_key >> 24) & 255, "
+    "(addr_key >> 16) & 255, addr_key & 65535)"
+)
+
+_PROXIES_TABLE = f"""
+    CREATE TABLE IF NOT EXISTS {{table}} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        addr_key INTEGER NOT NULL,
+        proxy_address TEXT GENERATED ALWAYS AS ({_ADDRESS_SQL}) STORED,
+        ip TEXT GENERATED ALWAYS AS ({_IP_SQL}) VIRTUAL,
+        port INTEGER GENERATED ALWAYS AS (addr_key & 65535) VIRTUAL,
+        country TEXT,
+        country_code TEXT,
+        city TEXT,
+        isp TEXT,
+        is_mobile BOOLEAN DEFAULT 0,
+        is_proxy BOOLEAN DEFAULT 0,
+        first_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        last_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        ewma_success REAL,
+        ewma_success_at REAL,
+        ewma_latency REAL,
+        ewma_latency_at REAL,
+        latency_sketch BLOB,
+        UNIQUE(addr_key)
+    )
+"""
+
+_BLACKLIST_TABLE = f"""
+    CREATE TABLE IF NOT EXISTS {{table}} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        addr_key INTEGER UNIQUE NOT NULL,
+        proxy_address TEXT GENERATED ALWAYS AS ({_ADDRESS_SQL}) VIRTUAL,
+        fail_count INTEGER DEFAULT 1,
+        first_failed TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        last_failed TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        reason TEXT,
+        auto_added BOOLEAN DEFAULT 1
+    )
+"""
+
+# 生成列需要 SQLite 3.31 及以上（Python 内置的 sqlite3 模块链接的版本，见 sqlite3.sqlite_version）
+_MIN_SQLITE_VERSION = (3, 31, 0)
+
+# 旧版本（文本地址为键）迁移时需要复制的列
+_PROXIES_COPY_COLUMNS = (
+    'id', 'country', 'country_code', 'city', 'isp', 'is_mobile', 'is_proxy', 'first_seen', 'last_seen',
+    'ewma_success', 'ewma_success_at', 'ewma_latency', 'ewma_latency_at', 'latency_sketch',
+)
+_BLACKLIST_COPY_COLUMNS = ('id', 'fail_count', 'first_failed', 'last_failed', 'reason', 'auto_added')
+
+# 已被复合/覆盖索引取代的旧索引
+_OBSOLETE_INDEXES = ('idx_validation_proxy_id', 'idx_validation_timestamp', 'idx_daily_last_check')
+
+# proxy_stats 中由延迟草图得到的分位数列: 列名 -> 分位点（有索引，按尾延迟排序时直接走索引）
+_STATS_PERCENTILES = {'latency_p50': 0.5, 'latency_p90': 0.9, 'latency_p99': 0.99}
+_STATS_PERCENTILES_VALUES = "SELECT {} FROM proxies WHERE id = proxy_stats.proxy_id".format(
+    ", ".join(f"sketch_quantile(latency_sketch, {q})" for q in _STATS_PERCENTILES.values())
+)
+_STATS_PERCENTILES_SET = f"({', '.join(_STATS_PERCENTILES)}) = ({_STATS_PERCENTILES_VALUES})"
+
+# get_best_proxies 的排序方式；按分位数排序时只包含有延迟样本的代理
+_BEST_PROXIES_ORDER = {
+    'score': "s.avg_score DESC, COALESCE(p.ewma_latency, s.avg_response_time) ASC",
+    'p50': "s.latency_p50 ASC, s.avg_score DESC",
+    'p90': "s.latency_p90 ASC, s.avg_score DESC",
+    'p99': "s.latency_p99 ASC, s.avg_score DESC",
+}
+
+# 代理统计查询的公共 SELECT 部分（单个查询和批量查询共用，统计值取自聚合表 proxy_stats）
+_PROXY_STATS_SELECT = """
+    SELECT 
+        p.*,
+        COALESCE(s.total_checks, 0) as total_checks,
+        COALESCE(s.success_count, 0) as success_count,
+        s.avg_response_time,
+        s.last_check,
+        s.avg_score
+"""
+
+# 原始验证记录与每日汇总统一成相同的列（每条原始记录视为 checks=1 的汇总），
+# 统计查询通过视图 validation_combined 同时读取两者
+_HISTORY_ROWS = """
+    SELECT
+        id AS row_id,
+        proxy_id,
+        timestamp AS checked_at,
+        1 AS checks,
+        CASE WHEN is_valid THEN 1 ELSE 0 END AS successes,
+        COALESCE(CASE WHEN is_valid THEN response_time END, 0) AS latency_sum,
+        CASE WHEN is_valid AND response_time IS NOT NULL THEN 1 ELSE 0 END AS latency_count,
+        COALESCE(score, 0) AS score_sum,
+        CASE WHEN score IS NOT NULL THEN 1 ELSE 0 END AS score_count
+    FROM validation_history
+"""
+
+_DAILY_ROWS = """
+    SELECT
+        rowid AS row_id,
+        proxy_id,
+        last_check AS checked_at,
+        checks,
+        successes,
+        latency_sum,
+        latency_count,
+        score_sum,
+        score_count
+    FROM validation_daily
+"""
+
+# 可按时间清理的统计来源: 表名 -> (统一列查询, 时间列)
+_STATS_SOURCES = {
+    'validation_history': (_HISTORY_ROWS, 'timestamp'),
+    'validation_daily': (_DAILY_ROWS, 'last_check'),
+}
+
+# 由验证历史（每日汇总 + 原始记录）重新计算 proxy_stats
+_PROXY_STATS_REBUILD = """
+    INSERT INTO proxy_stats (
+        proxy_id, total_checks, success_count, latency_sum, latency_count,
+        score_sum, score_count, avg_response_time, avg_score, last_check, is_blacklisted
+    )
+    SELECT
+        v.proxy_id,
+        SUM(v.checks),
+        SUM(v.successes),
+        SUM(v.latency_sum),
+        SUM(v.latency_count),
+        SUM(v.score_sum),
+        SUM(v.score_count),
+        SUM(v.latency_sum) / NULLIF(SUM(v.latency_count), 0),
+        SUM(v.score_sum) / NULLIF(SUM(v.score_count), 0),
+        MAX(v.checked_at),
+        EXISTS (
+            SELECT 1 FROM proxies p
+            INNER JOIN proxy_blacklist bl ON bl.addr_key = p.addr_key
+            WHERE p.id = v.proxy_id
+        )
+    FROM validation_combined v
+    GROUP BY v.proxy_id
+"""
+
+
+def failure_code(error: Optional[str]) -> str:
+    """
+    将失败原因归类为简短的失败代码（注册为 SQLite 函数 failure_code）
+    
+    如 'HTTP 403' -> 'http_403'，超时 -> 'timeout'，连接被拒绝 -> 'refused'
+    """
+    if not error:
+        return 'unknown'
+    
+    text = str(error).lower()
+    if text.startswith('http ') and text[5:].strip().isdigit():
+        return f"http_{text[5:].strip()}"
+    for code, keywords in (
+        ('timeout', ('timeout', 'timed out')),
+        ('refused', ('refused',)),
+        ('reset', ('reset', 'disconnected', 'broken pipe')),
+        ('dns', ('name resolution', 'getaddrinfo', 'dns', 'nodename')),
+        ('ssl', ('ssl', 'certificate')),
+        ('proxy', ('socks', 'proxy')),
+    ):
+        if any(keyword in text for keyword in keywords):
+            return code
+    return 'other'
+
+
+class _FailureCounts:
+    """SQLite 聚合函数 failure_counts：统计各失败代码的次数，返回 JSON（无失败时为 NULL）"""
+    
+    def __init__(self):
+        self.counts = Counter()
+    
+    def step(self, code: Optional[str]):
+        if code is not None:
+            self.counts[code] += 1
+    
+    def finalize(self) -> Optional[str]:
+        return json.dumps(dict(sorted(self.counts.items()))) if self.counts else None
+
+
+def merge_counts(left: Optional[str], right: Optional[str]) -> Optional[str]:
+    """合并两个失败代码计数 JSON（注册为 SQLite 函数 merge_counts）"""
+    if not left or not right:
+        return left or right
+    counts = Counter(json.loads(left))
+    counts.update(json.loads(right))
+    return json.dumps(dict(sorted(counts.items())))
+
+# 每个长连接建立时设置的性能参数
+# WAL 让 API/面板/机器人的读取不被扫描器的写入阻塞；synchronous=NORMAL 在 WAL 下只在检查点时 fsync
+_CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-65536",        # 64MB 页缓存
+    "PRAGMA mmap_size=268435456",      # 256MB 内存映射
+    "PRAGMA temp_store=MEMORY",
+)
+
+# 只读快照连接的参数：快照是普通回滚日志模式的静态文件，无需 WAL 和同步设置
+# （只读由 mode=ro 保证；query_only 会连批量查询用的临时表也一并禁止）
+_SNAPSHOT_PRAGMAS = (
+    "PRAGMA cache_size=-65536",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA temp_store=MEMORY",
+)
 
 
 class ProxyDatabase:
     """代理数据库管理器"""
     
-    def __init__(self, db_path: str = "proxies.db"):
+    def __init__(self, db_path: str = "proxies.db", ewma_half_life_hours: float = 24,
+                 busy_timeout: float = 30, read_only: bool = False, fallback_path: Optional[str] = None,
+                 ewma_min_interval_hours: float = 6):
+        """
+        Args:
+            db_path: 数据库路径
+            ewma_half_life_hours: 成功率/延迟指数加权平均的半衰期（小时），
+                                  越早的验证结果权重越低
+            ewma_min_interval_hours: 每次观测的最小权重按相隔这么久计算（默认为扫描间隔），
+                                     同一批次或间隔极短的多次验证不会因间隔为 0 而被忽略
+            busy_timeout: 等待其他连接释放写锁的最长时间（秒）
+            read_only: 只读打开 publish_snapshot() 发布的快照文件（不建表、不迁移），
+                       快照被替换后各线程的连接自动重新打开
+            fallback_path: 只读模式下快照文件尚不存在时改为读取的数据库（必须已存在），
+                           快照发布后各线程的连接自动切换到快照
+        """
+        if sqlite3.sqlite_version_info < _MIN_SQLITE_VERSION:
+            raise RuntimeError(
+                f"SQLite 版本过低: {sqlite3.sqlite_version}，"
+                f"需要 {'.'.join(map(str, _MIN_SQLITE_VERSION))} 及以上（代理地址使用了生成列）"
+            )
+        
         self.db_path = db_path
+        self.read_only = read_only
+        self.fallback_path = fallback_path
+        self._reading_fallback = False
+        self.ewma_half_life = ewma_half_life_hours * 3600
+        self.ewma_min_alpha = (
+            1 - 0.5 ** (ewma_min_interval_hours * 3600 / self.ewma_half_life) if self.ewma_half_life > 0 else 1.0
+        )
+        self.busy_timeout = busy_timeout
         self.logger = logging.getLogger(__name__)
-        self._init_database()
+
+        # 每个线程一个长连接，避免每次调用都重新打开数据库
+        self._local = threading.local()
+        self._connections: Dict[threading.Thread, sqlite3.Connection] = {}
+        self._connections_lock = threading.Lock()
+
+        # 黑名单紧凑索引（持久化在数据库旁，按黑名单表指纹判断是否过期）
+        self.blacklist_index_path = f"{db_path}.blacklist"
+        self._blacklist_index: Optional[BlacklistIndex] = None
+
+        # 扫描结束时发布的只读快照（API/面板读取）
+        self.snapshot_path = f"{db_path}.snapshot"
+
+        if not read_only:
+            self._init_database()
+
+    @classmethod
+    def open_snapshot(cls, db_path: str = "proxies.db", **kwargs) -> 'ProxyDatabase':
+        """
+        以只读方式打开 db_path 的快照（供 API/面板等只读服务使用）
+
+        读取不与扫描器的写入和清理时的 VACUUM 争用锁，看到的总是某次扫描结束时的完整数据。
+        尚未发布过快照时暂时直接读取数据库，每次取连接时重新检查，快照一出现即切换；
+        快照和数据库都不存在时查询报错
+        """
+        return cls(f"{db_path}.snapshot", read_only=True, fallback_path=db_path, **kwargs)
     
+    def _connect(self) -> sqlite3.Connection:
+        """获取当前线程的长连接（首次调用时创建）"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            # 快照被原子替换后旧连接仍读取旧文件，在事务之外切换到新快照
+            if not self.read_only or self._local.depth or self._local.file_id == self._file_id():
+                return conn
+            self._discard_connection(conn)
+
+        # check_same_thread=False 仅用于 close() 从其他线程关闭，连接本身只在所属线程使用
+        if self.read_only:
+            file_id = self._file_id()
+            if file_id is None and self.fallback_path:
+                conn = self._connect_fallback()
+            else:
+                conn = sqlite3.connect(f"file:{pathname2url(os.path.abspath(self.db_path))}?mode=ro", uri=True,
+                                       timeout=self.busy_timeout, check_same_thread=False)
+                for pragma in _SNAPSHOT_PRAGMAS:
+                    conn.execute(pragma)
+                if self._reading_fallback:
+                    self._reading_fallback = False
+                    self.logger.info(f"快照 {self.db_path} 已发布，改为读取快照")
+            # 读取数据库本身时记为 None，快照出现后文件标识变化，下次取连接即切换
+            self._local.file_id = file_id
+        else:
+            conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout, check_same_thread=False)
+            # 增量压缩模式只能在新建数据库、切换 WAL 之前设置（对已有数据库设置会等待写锁），
+            # 旧数据库在首次清理时转换
+            if conn.execute("PRAGMA page_count").fetchone()[0] == 0:
+                conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            for pragma in _CONNECTION_PRAGMAS:
+                conn.execute(pragma)
+        conn.row_factory = sqlite3.Row
+        conn.create_function('ewma', 4, self._ewma, deterministic=True)
+        conn.create_function('sketch_add', 2, sketch_add, deterministic=True)
+        conn.create_function('sketch_quantile', 2, sketch_quantile, deterministic=True)
+        conn.create_function('failure_code', 1, failure_code, deterministic=True)
+        conn.create_function('merge_counts', 2, merge_counts, deterministic=True)
+        conn.create_function('pack_address', 1, pack_address, deterministic=True)
+        conn.create_aggregate('failure_counts', 1, _FailureCounts)
+
+        self._local.conn = conn
+        self._local.depth = 0
+        with self._connections_lock:
+            # 顺带关闭已退出线程遗留的连接（Flask 等按请求创建线程的服务会不断产生新线程）
+            for thread in [t for t in self._connections if not t.is_alive()]:
+                self._close_quietly(self._connections.pop(thread))
+            self._connections[threading.current_thread()] = conn
+        return conn
+
+    def _connect_fallback(self) -> sqlite3.Connection:
+        """快照尚不存在时打开 fallback_path（mode=rw：数据库不存在时报错，不会创建空库）"""
+        if not self._reading_fallback:
+            self._reading_fallback = True
+            self.logger.warning(f"快照 {self.db_path} 不存在，暂时直接读取数据库 {self.fallback_path}")
+        conn = sqlite3.connect(f"file:{pathname2url(os.path.abspath(self.fallback_path))}?mode=rw", uri=True,
+                               timeout=self.busy_timeout, check_same_thread=False)
+        for pragma in _CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
     @contextmanager
     def _get_connection(self):
-        """获取数据库连接的上下文管理器"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+        """
+        获取数据库连接的上下文管理器
+
+        复用当前线程的长连接；嵌套使用时由最外层负责提交或回滚
+        """
+        conn = self._connect()
+        self._local.depth += 1
         try:
             yield conn
-            conn.commit()
+            if self._local.depth == 1:
+                conn.commit()
         except Exception as e:
-            conn.rollback()
-            self.logger.error(f"数据库操作失败: {e}")
+            if self._local.depth == 1:
+                conn.rollback()
+                self.logger.error(f"数据库操作失败: {e}")
             raise
         finally:
+            self._local.depth -= 1
+
+    def _file_id(self) -> Optional[Tuple[int, int]]:
+        """数据库文件的 (inode, 修改时间)，用于发现快照已被替换"""
+        try:
+            info = os.stat(self.db_path)
+        except OSError:
+            return None
+        return info.st_ino, info.st_mtime_ns
+
+    def _discard_connection(self, conn: sqlite3.Connection):
+        """关闭当前线程的长连接"""
+        with self._connections_lock:
+            self._connections.pop(threading.current_thread(), None)
+        self._close_quietly(conn)
+        self._local.conn = None
+
+    def close(self):
+        """关闭所有线程的长连接（之后再调用会重新建立连接）"""
+        with self._connections_lock:
+            connections, self._connections = self._connections, {}
+        for conn in connections.values():
+            self._close_quietly(conn)
+        self._local = threading.local()
+
+    def _close_quietly(self, conn: sqlite3.Connection):
+        try:
             conn.close()
+        except sqlite3.Error as e:
+            self.logger.warning(f"关闭数据库连接失败: {e}")
     
     def _init_database(self):
         """初始化数据库表结构"""
@@ -41,23 +418,23 @@ class ProxyDatabase:
             cursor = conn.cursor()
             
             # 代理记录表
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS proxies (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    proxy_address TEXT NOT NULL,
-                    ip TEXT NOT NULL,
-                    port INTEGER NOT NULL,
-                    country TEXT,
-                    country_code TEXT,
-                    city TEXT,
-                    isp TEXT,
-                    is_mobile BOOLEAN DEFAULT 0,
-                    is_proxy BOOLEAN DEFAULT 0,
-                    first_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    last_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(proxy_address)
-                )
-            """)
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'proxies'")
+            proxies_table_exists = cursor.fetchone() is not None
+            cursor.execute(_PROXIES_TABLE.format(table='proxies'))
+            
+            # 时间衰减的成功率/延迟 (每次验证原地更新)，旧数据库用历史记录初始化
+            added = self._add_missing_columns(cursor, 'proxies', {
+                'ewma_success': 'REAL',
+                'ewma_success_at': 'REAL',
+                'ewma_latency': 'REAL',
+                'ewma_latency_at': 'REAL',
+            })
+            if 'ewma_success' in added:
+                self._backfill_ewma(cursor)
+            
+            # 延迟分布草图 (见 latency_sketch.py)
+            if self._add_missing_columns(cursor, 'proxies', {'latency_sketch': 'BLOB'}):
+                self._backfill_latency_sketches(cursor)
             
             # 验证历史表
             cursor.execute("""
@@ -70,10 +447,18 @@ class ProxyDatabase:
                     test_url TEXT,
                     error_message TEXT,
                     score REAL DEFAULT 0,
+                    bandwidth_kbps REAL,
+                    ttfb REAL,
                     FOREIGN KEY (proxy_id) REFERENCES proxies(id)
                 )
             """)
             
+            # 旧数据库补充新增的列
+            self._add_missing_columns(cursor, 'validation_history', {
+                'bandwidth_kbps': 'REAL',
+                'ttfb': 'REAL',
+            })
+            
             # 代理源表
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS proxy_sources (
@@ -89,27 +474,253 @@ class ProxyDatabase:
             """)
             
             # 代理黑名单表
+            cursor.execute(_BLACKLIST_TABLE.format(table='proxy_blacklist'))
+            
+            # 验证历史每日汇总表：超过保留期的原始记录按 (代理, 日期) 折叠至此
             cursor.execute("""
-                CREATE TABLE IF NOT EXISTS proxy_blacklist (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    proxy_address TEXT UNIQUE NOT NULL,
-                    fail_count INTEGER DEFAULT 1,
-                    first_failed TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    last_failed TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    reason TEXT,
-                    auto_added BOOLEAN DEFAULT 1
+                CREATE TABLE IF NOT EXISTS validation_daily (
+                    proxy_id INTEGER NOT NULL,
+                    day TEXT NOT NULL,
+                    checks INTEGER NOT NULL DEFAULT 0,
+                    successes INTEGER NOT NULL DEFAULT 0,
+                    latency_sum REAL NOT NULL DEFAULT 0,
+                    latency_count INTEGER NOT NULL DEFAULT 0,
+                    latency_min REAL,
+                    latency_max REAL,
+                    score_sum REAL NOT NULL DEFAULT 0,
+                    score_count INTEGER NOT NULL DEFAULT 0,
+                    last_check TIMESTAMP,
+                    failure_codes TEXT,
+                    PRIMARY KEY (proxy_id, day),
+                    FOREIGN KEY (proxy_id) REFERENCES proxies(id)
                 )
             """)
+            cursor.execute(f"""
+                CREATE VIEW IF NOT EXISTS validation_combined AS
+                {_DAILY_ROWS}
+                UNION ALL
+                {_HISTORY_ROWS}
+            """)
             
-            # 创建索引优化查询
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_proxy_address ON proxies(proxy_address)")
+            # 代理统计聚合表：随每条验证记录在同一事务中增量更新，
+            # 查询最佳代理时按评分索引扫描，不再对整个验证历史做 GROUP BY
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'proxy_stats'")
+            stats_table_exists = cursor.fetchone() is not None
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS proxy_stats (
+                    proxy_id INTEGER PRIMARY KEY,
+                    total_checks INTEGER NOT NULL DEFAULT 0,
+                    success_count INTEGER NOT NULL DEFAULT 0,
+                    latency_sum REAL NOT NULL DEFAULT 0,
+                    latency_count INTEGER NOT NULL DEFAULT 0,
+                    score_sum REAL NOT NULL DEFAULT 0,
+                    score_count INTEGER NOT NULL DEFAULT 0,
+                    avg_response_time REAL,
+                    avg_score REAL,
+                    last_check TIMESTAMP,
+                    is_blacklisted BOOLEAN NOT NULL DEFAULT 0,
+                    latency_p50 REAL,
+                    latency_p90 REAL,
+                    latency_p99 REAL,
+                    FOREIGN KEY (proxy_id) REFERENCES proxies(id)
+                )
+            """)
+            percentiles_added = self._add_missing_columns(
+                cursor, 'proxy_stats', {column: 'REAL' for column in _STATS_PERCENTILES}
+            )
+            
+            # 旧版本以文本地址为键，重建为整数键（需在重建统计之前，统计中的黑名单标记按整数键关联）
+            if proxies_table_exists and 'addr_key' not in self._table_columns(cursor, 'proxies'):
+                self._migrate_address_keys(cursor)
+            
+            if not stats_table_exists:
+                self._rebuild_proxy_stats(cursor)
+            elif percentiles_added:
+                self._refresh_stats_percentiles(cursor)
+            
+            # 创建索引优化查询（地址的唯一约束已自带索引；热点查询的执行计划由 query_plan_check.py 检查）
+            for index in _OBSOLETE_INDEXES:
+                cursor.execute(f"DROP INDEX IF EXISTS {index}")
             cursor.execute("CREATE INDEX IF NOT EXISTS idx_last_seen ON proxies(last_seen)")
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_validation_proxy_id ON validation_history(proxy_id)")
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_validation_timestamp ON validation_history(timestamp)")
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_blacklist_address ON proxy_blacklist(proxy_address)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_proxies_country ON proxies(country)")
+            # 单个代理的历史按时间范围查找；也用于清理时判断代理是否还有记录
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_validation_proxy_time ON validation_history(proxy_id, timestamp)"
+            )
+            # 时间窗口统计（24小时成功率/延迟、自动黑名单）只读索引，不回表
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_validation_window
+                ON validation_history(timestamp, proxy_id, is_valid, response_time, score)
+            """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_daily_window
+                ON validation_daily(last_check, proxy_id, checks, successes, latency_sum, latency_count,
+                                    score_sum, score_count)
+            """)
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_proxy_stats_score ON proxy_stats(is_blacklisted, avg_score DESC)"
+            )
+            for column in _STATS_PERCENTILES:
+                cursor.execute(f"""
+                    CREATE INDEX IF NOT EXISTS idx_proxy_stats_{column[len('latency_'):]}
+                    ON proxy_stats(is_blacklisted, {column})
+                """)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_blacklist_last_failed ON proxy_blacklist(last_failed)")
             
             self.logger.info("数据库初始化完成")
     
+    def _table_columns(self, cursor: sqlite3.Cursor, table: str) -> Set[str]:
+        """表的全部列名（含生成列）"""
+        cursor.execute(f"PRAGMA table_xinfo({table})")
+        return {row['name'] for row in cursor.fetchall()}
+    
+    def _add_missing_columns(self, cursor: sqlite3.Cursor, table: str, columns: Dict[str, str]) -> List[str]:
+        """为已存在的表补充缺少的列（兼容旧版本数据库），返回新增的列名"""
+        existing = self._table_columns(cursor, table)
+        added = []
+        for name, column_type in columns.items():
+            if name not in existing:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {column_type}")
+                added.append(name)
+        return added
+    
+    def _backfill_ewma(self, cursor: sqlite3.Cursor):
+        """用已有的验证历史初始化加权成功率/延迟"""
+        now = time.time()
+        cursor.execute("""
+            UPDATE proxies SET
+                ewma_success = (
+                    SELECT AVG(CASE WHEN vh.is_valid THEN 1.0 ELSE 0.0 END)
+                    FROM validation_history vh WHERE vh.proxy_id = proxies.id
+                ),
+                ewma_latency = (
+                    SELECT AVG(vh.response_time)
+                    FROM validation_history vh
+                    WHERE vh.proxy_id = proxies.id AND vh.is_valid = 1
+                )
+        """)
+        cursor.execute("UPDATE proxies SET ewma_success_at = ? WHERE ewma_success IS NOT NULL", (now,))
+        cursor.execute("UPDATE proxies SET ewma_latency_at = ? WHERE ewma_latency IS NOT NULL", (now,))
+        self.logger.info("已根据验证历史初始化加权成功率/延迟")
+    
+    def _backfill_latency_sketches(self, cursor: sqlite3.Cursor):
+        """用已有的成功验证记录构建延迟草图"""
+        cursor.execute("""
+            SELECT proxy_id, response_time FROM validation_history
+            WHERE is_valid = 1 AND response_time IS NOT NULL
+            ORDER BY proxy_id
+        """)
+        sketches = {}
+        for row in cursor.fetchall():
+            sketches.setdefault(row['proxy_id'], LatencySketch()).add(row['response_time'])
+        
+        cursor.executemany(
+            "UPDATE proxies SET latency_sketch = ? WHERE id = ?",
+            [(sketch.to_bytes(), proxy_id) for proxy_id, sketch in sketches.items()]
+        )
+        self.logger.info(f"已根据验证历史构建 {len(sketches)} 个代理的延迟草图")
+    
+    def _migrate_address_keys(self, cursor: sqlite3.Cursor):
+        """
+        将旧版本以文本地址为键的 proxies / proxy_blacklist 重建为整数键
+
+        无法打包的地址（非 IPv4）不能放入新表，连同其验证记录、每日汇总和统计
+        原样移入 <表名>_unmigrated 旁表保留，不直接删除
+        """
+        kept = self._rebuild_with_address_key(cursor, 'proxies', _PROXIES_TABLE, _PROXIES_COPY_COLUMNS)
+        kept_blacklist = self._rebuild_with_address_key(
+            cursor, 'proxy_blacklist', _BLACKLIST_TABLE, _BLACKLIST_COPY_COLUMNS
+        )
+        
+        if kept:
+            for table in ('validation_history', 'validation_daily', 'proxy_stats'):
+                self._move_unmigrated_rows(
+                    cursor, table, "proxy_id IN (SELECT id FROM proxies_unmigrated)"
+                )
+        
+        self.logger.info("代理地址已迁移为整数键")
+        if kept or kept_blacklist:
+            self.logger.warning(
+                f"{kept} 个代理和 {kept_blacklist} 条黑名单记录不是规范的 IPv4 地址，无法迁移，"
+                f"已连同其验证记录移入 *_unmigrated 表保留"
+            )
+    
+    def _move_unmigrated_rows(self, cursor: sqlite3.Cursor, table: str, condition: str) -> int:
+        """将 table 中满足条件的行原样移入旁表 <table>_unmigrated，返回移动的行数"""
+        side_table = f"{table}_unmigrated"
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {side_table} AS SELECT * FROM {table} WHERE 0")
+        cursor.execute(f"INSERT INTO {side_table} SELECT * FROM {table} WHERE {condition}")
+        moved = cursor.rowcount
+        cursor.execute(f"DELETE FROM {table} WHERE {condition}")
+        return moved
+    
+    def _rebuild_with_address_key(self, cursor: sqlite3.Cursor, table: str, create_sql: str,
+                                  columns: Tuple[str, ...]) -> int:
+        """
+        按新表结构重建表并复制数据（地址打包为 addr_key）
+
+        Returns:
+            无法打包、移入 <table>_unmigrated 旁表的行数
+        """
+        new_table = f"{table}_new"
+        column_list = ', '.join(columns)
+        
+        unmigrated = self._move_unmigrated_rows(cursor, table, "pack_address(proxy_address) IS NULL")
+        
+        cursor.execute(f"DROP TABLE IF EXISTS {new_table}")
+        cursor.execute(create_sql.format(table=new_table))
+        cursor.execute(f"""
+            INSERT INTO {new_table} (addr_key, {column_list})
+            SELECT pack_address(proxy_address), {column_list} FROM {table}
+        """)
+        
+        # 保留自增序列，已删除记录的 id 不会被复用
+        cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (table,))
+        row = cursor.fetchone()
+        
+        cursor.execute(f"DROP TABLE {table}")
+        cursor.execute(f"ALTER TABLE {new_table} RENAME TO {table}")
+        if row:
+            cursor.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?", (row['seq'], table))
+        return unmigrated
+    
+    def _rebuild_proxy_stats(self, cursor: sqlite3.Cursor):
+        """由验证历史重新计算全部代理统计"""
+        cursor.execute("DELETE FROM proxy_stats")
+        cursor.execute(_PROXY_STATS_REBUILD)
+        self.logger.info(f"已根据验证历史重建 {cursor.rowcount} 个代理的统计")
+        self._refresh_stats_percentiles(cursor)
+    
+    def _refresh_stats_percentiles(self, cursor: sqlite3.Cursor):
+        """由各代理的延迟草图重新计算聚合表中的分位数列"""
+        cursor.execute(f"UPDATE proxy_stats SET {_STATS_PERCENTILES_SET}")
+    
+    def _set_stats_blacklisted(self, cursor: sqlite3.Cursor, addr_key: int, blacklisted: bool):
+        """同步聚合表中的黑名单标记"""
+        cursor.execute("""
+            UPDATE proxy_stats SET is_blacklisted = ?
+            WHERE proxy_id = (SELECT id FROM proxies WHERE addr_key = ?)
+        """, (blacklisted, addr_key))
+    
+    def _ewma(self, old: Optional[float], updated_at: Optional[float],
+              value: Optional[float], now: float) -> Optional[float]:
+        """
+        时间衰减的指数加权平均（注册为 SQLite 函数 ewma）
+        
+        距上次更新经过一个半衰期，旧值的权重减半；首次观测直接取当前值。
+        新观测的权重不低于 ewma_min_alpha：同一批次中同一代理的多次验证共用一个 now，
+        间隔为 0 时不会被丢弃
+        """
+        if value is None:
+            return old
+        if old is None or updated_at is None:
+            return value
+        
+        elapsed = max(0.0, now - updated_at)
+        alpha = 1 - 0.5 ** (elapsed / self.ewma_half_life) if self.ewma_half_life > 0 else 1.0
+        alpha = max(alpha, self.ewma_min_alpha)
+        return old + alpha * (value - old)
+    
     # ========== 黑名单管理 ==========
     
     def add_to_blacklist(self, proxy_address: str, reason: str = "连续失败", auto_added: bool = True):
@@ -121,26 +732,35 @@ class ProxyDatabase:
             reason: 加入黑名单的原因
             auto_added: 是否自动添加
         """
+        addr_key = pack_address(proxy_address)
+        if addr_key is None:
+            self.logger.warning(f"无效的代理地址，未加入黑名单: {proxy_address}")
+            return
+        
         with self._get_connection() as conn:
             cursor = conn.cursor()
             
             cursor.execute("""
-                INSERT INTO proxy_blacklist (proxy_address, reason, auto_added)
+                INSERT INTO proxy_blacklist (addr_key, reason, auto_added)
                 VALUES (?, ?, ?)
-                ON CONFLICT(proxy_address) DO UPDATE SET
+                ON CONFLICT(addr_key) DO UPDATE SET
                     fail_count = fail_count + 1,
                     last_failed = CURRENT_TIMESTAMP,
                     reason = ?
-            """, (proxy_address, reason, auto_added, reason))
+            """, (addr_key, reason, auto_added, reason))
+            self._set_stats_blacklisted(cursor, addr_key, True)
             
             # 改为debug级别，避免日志刷屏
             self.logger.debug(f"代理 {proxy_address} 已加入黑名单: {reason}")
     
     def is_blacklisted(self, proxy_address: str) -> bool:
         """检查代理是否在黑名单中"""
+        addr_key = pack_address(proxy_address)
+        if addr_key is None:
+            return False
         with self._get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT id FROM proxy_blacklist WHERE proxy_address = ?", (proxy_address,))
+            cursor.execute("SELECT id FROM proxy_blacklist WHERE addr_key = ?", (addr_key,))
             return cursor.fetchone() is not None
     
     def get_blacklisted_proxies(self) -> Set[str]:
@@ -150,50 +770,97 @@ class ProxyDatabase:
             cursor.execute("SELECT proxy_address FROM proxy_blacklist")
             return {row['proxy_address'] for row in cursor.fetchall()}
     
+    def get_blacklist_index(self) -> BlacklistIndex:
+        """
+        获取黑名单紧凑索引（用于大批量候选代理的过滤）
+
+        依次使用内存中的索引、数据库旁的索引文件，二者都与黑名单表不一致时重新构建并保存。
+        黑名单表的 id 自增且不复用，(记录数, 最大 id) 即可判断内容是否变化
+        """
+        with self._get_connection() as conn:
+            row = conn.execute("SELECT COUNT(*), COALESCE(MAX(id), 0) FROM proxy_blacklist").fetchone()
+            fingerprint = (row[0], row[1])
+
+            index = self._blacklist_index
+            if index is None or index.fingerprint != fingerprint:
+                index = BlacklistIndex.load(self.blacklist_index_path)
+            if index is None or index.fingerprint != fingerprint:
+                # 黑名单表本身以打包整数为键，按唯一索引顺序读出即是有序数组
+                keys = array('Q', (row[0] for row in conn.execute(
+                    "SELECT addr_key FROM proxy_blacklist ORDER BY addr_key"
+                )))
+                index = BlacklistIndex(keys, fingerprint=fingerprint)
+                if self.db_path != ':memory:' and not self.read_only:
+                    index.save(self.blacklist_index_path)
+                self.logger.debug(f"黑名单索引已重建: {len(index)} 条, {index.nbytes} 字节")
+
+        self._blacklist_index = index
+        return index
+    
     def remove_from_blacklist(self, proxy_address: str):
         """从黑名单中移除代理"""
+        addr_key = pack_address(proxy_address)
+        if addr_key is None:
+            return
         with self._get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("DELETE FROM proxy_blacklist WHERE proxy_address = ?", (proxy_address,))
+            cursor.execute("DELETE FROM proxy_blacklist WHERE addr_key = ?", (addr_key,))
             if cursor.rowcount > 0:
+                self._set_stats_blacklisted(cursor, addr_key, False)
                 self.logger.info(f"代理 {proxy_address} 已从黑名单移除")
     
     def auto_blacklist_failing_proxies(self, fail_threshold: int = 5, days: int = 7):
         """
         自动将持续失败的代理加入黑名单
         
+        一条 INSERT ... SELECT 在一个事务中完成：只加入新出现的持续失败代理，
+        已在黑名单中的条目（包括手动添加的）保持不变
+        
         Args:
             fail_threshold: 失败次数阈值
             days: 检查最近几天的记录
+            
+        Returns:
+            新加入黑名单的代理数
         """
         with self._get_connection() as conn:
             cursor = conn.cursor()
             
             cutoff_date = now_utc() - timedelta(days=days)
             
-            # 找出连续失败的代理
+            # 黑名单 id 自增，本次新加入的条目 id 都大于当前最大值
+            cursor.execute("SELECT COALESCE(MAX(id), 0) AS max_id FROM proxy_blacklist")
+            max_id = cursor.fetchone()['max_id']
+            
+            # 找出连续失败的代理并写入黑名单
             cursor.execute("""
-                SELECT 
-                    p.proxy_address,
-                    COUNT(*) as total_checks,
-                    SUM(CASE WHEN vh.is_valid = 0 THEN 1 ELSE 0 END) as fail_count
-                FROM proxies p
-                INNER JOIN validation_history vh ON p.id = vh.proxy_id
-                WHERE vh.timestamp >= ?
-                GROUP BY p.proxy_address
-                HAVING fail_count >= ? AND fail_count = total_checks
-            """, (cutoff_date, fail_threshold))
-            
-            blacklisted_count = 0
-            for row in cursor.fetchall():
-                proxy_address = row['proxy_address']
-                if not self.is_blacklisted(proxy_address):
-                    self.add_to_blacklist(
-                        proxy_address,
-                        f"最近{days}天连续失败{row['fail_count']}次",
-                        auto_added=True
-                    )
-                    blacklisted_count += 1
+                INSERT INTO proxy_blacklist (addr_key, fail_count, reason, auto_added)
+                SELECT p.addr_key, f.fail_count, '最近' || ? || '天连续失败' || f.fail_count || '次', 1
+                FROM (
+                    SELECT proxy_id, SUM(checks - successes) as fail_count
+                    FROM validation_combined
+                    WHERE checked_at >= ?
+                    GROUP BY proxy_id
+                    HAVING fail_count >= ? AND fail_count = SUM(checks)
+                ) f
+                INNER JOIN proxies p ON p.id = f.proxy_id
+                WHERE true  -- 使 ON CONFLICT 不被解析为 JOIN 条件
+                ON CONFLICT(addr_key) DO NOTHING
+            """, (days, cutoff_date, fail_threshold))
+            
+            # 本语句实际插入的行数，不受其他连接并发写入黑名单的影响
+            cursor.execute("SELECT changes() AS count")
+            blacklisted_count = cursor.fetchone()['count']
+            
+            # 同步统计聚合表中新加入条目的黑名单标记（按 id 范围读取，不扫描整个黑名单）
+            cursor.execute("""
+                UPDATE proxy_stats SET is_blacklisted = 1
+                WHERE is_blacklisted = 0 AND proxy_id IN (
+                    SELECT p.id FROM proxy_blacklist bl
+                    INNER JOIN proxies p ON p.addr_key = bl.addr_key
+                    WHERE bl.id > ?
+                )
+            """, (max_id,))
             
             if blacklisted_count > 0:
                 self.logger.info(f"自动将 {blacklisted_count} 个持续失败的代理加入黑名单")
@@ -242,135 +909,352 @@ class ProxyDatabase:
             代理ID
         """
         with self._get_connection() as conn:
-            cursor = conn.cursor()
-            
-            proxy_address = proxy_data.get('proxy')
-            if not proxy_address or ':' not in proxy_address:
-                raise ValueError(f"无效的代理地址: {proxy_address}")
-            
-            ip, port = proxy_address.split(':')
-            
-            # 检查代理是否已存在
-            cursor.execute("SELECT id FROM proxies WHERE proxy_address = ?", (proxy_address,))
-            row = cursor.fetchone()
+            return self._upsert_proxy(conn.cursor(), proxy_data)
+    
+    def _upsert_proxy(self, cursor: sqlite3.Cursor, proxy_data: Dict) -> int:
+        """在给定游标的事务中保存或更新代理信息，返回代理ID"""
+        proxy_address = proxy_data.get('proxy')
+        self._proxy_row(proxy_data)  # 地址无效时抛出 ValueError
+        return self._upsert_proxies(cursor, [proxy_data])[proxy_address]
+    
+    def save_proxies_batch(self, proxies: Iterable[Dict]) -> Dict[str, int]:
+        """
+        在一个事务中批量保存或更新代理信息
+        
+        Args:
+            proxies: 代理信息字典（格式同 save_proxy），地址无效的条目跳过
             
-            if row:
-                # 更新现有代理
-                proxy_id = row['id']
-                cursor.execute("""
-                    UPDATE proxies 
-                    SET last_seen = CURRENT_TIMESTAMP,
-                        country = COALESCE(?, country),
-                        country_code = COALESCE(?, country_code),
-                        city = COALESCE(?, city),
-                        isp = COALESCE(?, isp),
-                        is_mobile = COALESCE(?, is_mobile),
-                        is_proxy = COALESCE(?, is_proxy)
-                    WHERE id = ?
-                """, (
-                    proxy_data.get('country'),
-                    proxy_data.get('country_code'),
-                    proxy_data.get('city'),
-                    proxy_data.get('isp'),
-                    proxy_data.get('is_mobile'),
-                    proxy_data.get('is_proxy'),
-                    proxy_id
-                ))
-            else:
-                # 插入新代理
-                cursor.execute("""
-                    INSERT INTO proxies (
-                        proxy_address, ip, port, country, country_code, 
-                        city, isp, is_mobile, is_proxy
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    proxy_address,
-                    ip,
-                    int(port),
-                    proxy_data.get('country'),
-                    proxy_data.get('country_code'),
-                    proxy_data.get('city'),
-                    proxy_data.get('isp'),
-                    proxy_data.get('is_mobile', False),
-                    proxy_data.get('is_proxy', False)
-                ))
-                proxy_id = cursor.lastrowid
-            
-            return proxy_id
+        Returns:
+            {代理地址: 代理ID}
+        """
+        with self._get_connection() as conn:
+            return self._upsert_proxies(conn.cursor(), proxies)
+    
+    def _upsert_proxies(self, cursor: sqlite3.Cursor, proxies: Iterable[Dict]) -> Dict[str, int]:
+        """
+        在给定游标的事务中批量 upsert 代理，返回 {代理地址: 代理ID}
+        
+        新代理缺少的地理信息填入占位值；已有代理只更新非空字段，
+        因此失败结果（只有地址）不会把已知的国家/城市覆盖成 'Unknown'
+        """
+        rows = []
+        for proxy_data in proxies:
+            try:
+                rows.append(self._proxy_row(proxy_data))
+            except ValueError as e:
+                self.logger.debug(f"跳过代理: {e}")
+        if not rows:
+            return {}
+        
+        cursor.executemany("""
+            INSERT INTO proxies (
+                addr_key, country, country_code,
+                city, isp, is_mobile, is_proxy
+            ) VALUES (
+                :key, COALESCE(:country, 'Unknown'), COALESCE(:country_code, 'UN'),
+                COALESCE(:city, 'Unknown'), :isp, COALESCE(:is_mobile, 0), COALESCE(:is_proxy, 0)
+            )
+            ON CONFLICT(addr_key) DO UPDATE SET
+                last_seen = CURRENT_TIMESTAMP,
+                country = COALESCE(:country, country),
+                country_code = COALESCE(:country_code, country_code),
+                city = COALESCE(:city, city),
+                isp = COALESCE(:isp, isp),
+                is_mobile = COALESCE(:is_mobile, is_mobile),
+                is_proxy = COALESCE(:is_proxy, is_proxy)
+        """, rows)
+        
+        return self._resolve_proxy_ids(cursor, [row['proxy'] for row in rows])
+    
+    @staticmethod
+    def _proxy_row(proxy_data: Dict) -> Dict:
+        """代理信息转为 upsert 参数，地址不是规范的 IPv4 ip:port 时抛出 ValueError"""
+        proxy_address = proxy_data.get('proxy')
+        addr_key = pack_address(proxy_address) if isinstance(proxy_address, str) else None
+        if addr_key is None:
+            raise ValueError(f"无效的代理地址: {proxy_address}")
+        
+        return {
+            'proxy': proxy_address,
+            'key': addr_key,
+            'country': proxy_data.get('country'),
+            'country_code': proxy_data.get('country_code'),
+            'city': proxy_data.get('city'),
+            'isp': proxy_data.get('isp'),
+            'is_mobile': proxy_data.get('is_mobile'),
+            'is_proxy': proxy_data.get('is_proxy'),
+        }
+    
+    def _fill_temp_keys(self, cursor: sqlite3.Cursor, addresses: Iterable[str]) -> Dict[int, str]:
+        """
+        将一批代理地址打包后写入临时表 temp_proxy_keys，供批量查询 JOIN
+        
+        Returns:
+            {addr_key: 代理地址}（无效地址不在其中）
+        """
+        keys = {}
+        for address in addresses:
+            addr_key = pack_address(address)
+            if addr_key is not None:
+                keys[addr_key] = address
+        
+        # 在 Python 中去重，临时表不建索引（JOIN 时走 proxies 的唯一索引），大批量写入更快
+        cursor.execute("CREATE TEMP TABLE IF NOT EXISTS temp_proxy_keys (addr_key INTEGER)")
+        cursor.execute("DELETE FROM temp_proxy_keys")
+        cursor.executemany("INSERT INTO temp_proxy_keys (addr_key) VALUES (?)", ((key,) for key in keys))
+        return keys
+    
+    def _resolve_proxy_ids(self, cursor: sqlite3.Cursor, addresses: Iterable[str]) -> Dict[str, int]:
+        """一次 JOIN 查出一批代理地址对应的ID（不存在的地址不在结果中）"""
+        keys = self._fill_temp_keys(cursor, addresses)
+        cursor.execute("""
+            SELECT p.addr_key, p.id
+            FROM temp_proxy_keys k
+            INNER JOIN proxies p ON p.addr_key = k.addr_key
+        """)
+        ids = {keys[row['addr_key']]: row['id'] for row in cursor.fetchall()}
+        cursor.execute("DELETE FROM temp_proxy_keys")
+        return ids
     
     def save_validation_result(self, proxy_address: str, validation_data: Dict):
         """保存验证结果"""
+        if not self.save_validation_results_batch([(proxy_address, validation_data)]):
+            self.logger.warning(f"代理 {proxy_address} 不存在于数据库中")
+    
+    def save_validation_results_batch(self, results: Iterable[Tuple[str, Dict]]) -> int:
+        """
+        在一个事务中批量保存验证结果
+        
+        Args:
+            results: [(代理地址, 验证结果), ...]，数据库中不存在的代理跳过
+            
+        Returns:
+            写入的验证记录数
+        """
+        results = list(results)
+        start = time.perf_counter()
+        
         with self._get_connection() as conn:
             cursor = conn.cursor()
+            # 一次 JOIN 解析整批代理ID，而不是逐条 SELECT
+            proxy_ids = self._resolve_proxy_ids(cursor, (address for address, _ in results))
+            rows = [(proxy_ids[address], validation_data) for address, validation_data in results
+                    if address in proxy_ids]
+            self._insert_validations(cursor, rows)
+        
+        elapsed = time.perf_counter() - start
+        skipped = len(results) - len(rows)
+        self.logger.debug(
+            f"写入 {len(rows)} 条验证记录 ({len(rows) / elapsed if elapsed > 0 else 0:.0f} 条/秒)"
+            + (f", 跳过 {skipped} 条未知代理" if skipped else "")
+        )
+        return len(rows)
+    
+    def _insert_validations(self, cursor: sqlite3.Cursor, rows: List[Tuple[int, Dict]]):
+        """在给定游标的事务中批量写入验证记录 [(代理ID, 验证结果), ...]"""
+        if not rows:
+            return
+        
+        cursor.executemany("""
+            INSERT INTO validation_history (
+                proxy_id, is_valid, response_time, test_url, error_message, score,
+                bandwidth_kbps, ttfb
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, [(
+            proxy_id,
+            validation_data.get('is_valid', False),
+            validation_data.get('response_time'),
+            validation_data.get('test_url'),
+            validation_data.get('error'),
+            validation_data.get('score', 0),
+            validation_data.get('bandwidth_kbps'),
+            validation_data.get('ttfb')
+        ) for proxy_id, validation_data in rows])
+        
+        # 原地更新加权成功率/延迟、延迟草图和统计聚合表 (延迟只统计成功的验证)
+        now = time.time()
+        params = [{
+            'success': 1 if validation_data.get('is_valid') else 0,
+            'latency': validation_data.get('response_time') if validation_data.get('is_valid') else None,
+            'score': validation_data.get('score', 0),
+            'now': now,
+            'id': proxy_id,
+        } for proxy_id, validation_data in rows]
+        
+        cursor.executemany("""
+            UPDATE proxies SET
+                ewma_success = ewma(ewma_success, ewma_success_at, :success, :now),
+                ewma_success_at = :now,
+                ewma_latency = ewma(ewma_latency, ewma_latency_at, :latency, :now),
+                ewma_latency_at = CASE WHEN :latency IS NULL THEN ewma_latency_at ELSE :now END,
+                latency_sketch = sketch_add(latency_sketch, :latency)
+            WHERE id = :id
+        """, params)
+        
+        cursor.executemany("""
+            INSERT INTO proxy_stats (
+                proxy_id, total_checks, success_count, latency_sum, latency_count,
+                score_sum, score_count, avg_response_time, avg_score, last_check, is_blacklisted
+            ) VALUES (
+                :id, 1, :success, COALESCE(:latency, 0), :latency IS NOT NULL,
+                COALESCE(:score, 0), :score IS NOT NULL, :latency, :score, CURRENT_TIMESTAMP,
+                EXISTS (
+                    SELECT 1 FROM proxies p
+                    INNER JOIN proxy_blacklist bl ON bl.addr_key = p.addr_key
+                    WHERE p.id = :id
+                )
+            )
+            ON CONFLICT(proxy_id) DO UPDATE SET
+                total_checks = total_checks + 1,
+                success_count = success_count + excluded.success_count,
+                latency_sum = latency_sum + excluded.latency_sum,
+                latency_count = latency_count + excluded.latency_count,
+                score_sum = score_sum + excluded.score_sum,
+                score_count = score_count + excluded.score_count,
+                avg_response_time = (latency_sum + excluded.latency_sum)
+                                    / NULLIF(latency_count + excluded.latency_count, 0),
+                avg_score = (score_sum + excluded.score_sum) / NULLIF(score_count + excluded.score_count, 0),
+                last_check = excluded.last_check
+        """, params)
+        
+        # 分位数只在有新延迟样本（草图刚更新）且落入其他桶时改写，避免无谓地更新分位数索引
+        sampled = [(proxy_id,) for proxy_id, validation_data in rows
+                   if validation_data.get('is_valid') and validation_data.get('response_time') is not None]
+        if sampled:
+            cursor.executemany(f"""
+                UPDATE proxy_stats SET {_STATS_PERCENTILES_SET}
+                WHERE proxy_id = ?
+                    AND ({', '.join(_STATS_PERCENTILES)}) IS NOT ({_STATS_PERCENTILES_VALUES})
+            """, sampled)
+    
+    def save_validation_batch(self, entries: List[Tuple[Dict, Dict]], scorer=None) -> int:
+        """
+        在一个事务中保存一批验证结果
+        
+        Args:
+            entries: [(代理信息, 验证结果), ...]
+            scorer: 评分器（ProxyScorer），成功的验证在写入记录前按历史统计批量评分，
+                    评分同时写回代理信息和验证结果的 'score'
             
-            # 获取代理ID
-            cursor.execute("SELECT id FROM proxies WHERE proxy_address = ?", (proxy_address,))
-            row = cursor.fetchone()
+        Returns:
+            写入的验证记录数
+        """
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
             
-            if not row:
-                self.logger.warning(f"代理 {proxy_address} 不存在于数据库中")
-                return
+            # 一条 executemany 完成整批代理的 upsert
+            proxy_ids = self._upsert_proxies(cursor, (proxy_data for proxy_data, _ in entries))
+            saved = [(proxy_ids[proxy_data['proxy']], proxy_data, validation_data)
+                     for proxy_data, validation_data in entries
+                     if proxy_data.get('proxy') in proxy_ids]
             
-            proxy_id = row['id']
+            if scorer:
+                valid = [(proxy_data, validation_data) for _, proxy_data, validation_data in saved
+                         if validation_data.get('is_valid')]
+                if valid:
+                    # 一次查询取回整批的历史统计，再一次向量化评分
+                    stats_map = self._query_stats_bulk(cursor, [p['proxy'] for p, _ in valid])
+                    scores = scorer.score_batch([p for p, _ in valid], stats_map)
+                    for (proxy_data, validation_data), score in zip(valid, scores):
+                        proxy_data['score'] = score
+                        validation_data['score'] = score
             
-            cursor.execute("""
-                INSERT INTO validation_history (
-                    proxy_id, is_valid, response_time, test_url, error_message, score
-                ) VALUES (?, ?, ?, ?, ?, ?)
-            """, (
-                proxy_id,
-                validation_data.get('is_valid', False),
-                validation_data.get('response_time'),
-                validation_data.get('test_url'),
-                validation_data.get('error'),
-                validation_data.get('score', 0)
-            ))
+            self._insert_validations(cursor, [(proxy_id, validation_data)
+                                              for proxy_id, _, validation_data in saved])
+        
+        return len(saved)
     
     def get_proxy_stats(self, proxy_address: str) -> Optional[Dict]:
         """获取代理的统计信息"""
         with self._get_connection() as conn:
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                SELECT 
-                    p.*,
-                    COUNT(vh.id) as total_checks,
-                    SUM(CASE WHEN vh.is_valid THEN 1 ELSE 0 END) as success_count,
-                    AVG(CASE WHEN vh.is_valid THEN vh.response_time END) as avg_response_time,
-                    MAX(vh.timestamp) as last_check,
-                    AVG(vh.score) as avg_score
-                FROM proxies p
-                LEFT JOIN validation_history vh ON p.id = vh.proxy_id
-                WHERE p.proxy_address = ?
-                GROUP BY p.id
-            """, (proxy_address,))
-            
-            row = cursor.fetchone()
-            if not row:
-                return None
-            
-            stats = dict(row)
-            if stats['total_checks'] > 0:
-                stats['success_rate'] = stats['success_count'] / stats['total_checks']
-            else:
-                stats['success_rate'] = 0
+            return self._query_proxy_stats(conn.cursor(), proxy_address)
+    
+    def get_stats_bulk(self, addresses: Iterable[str]) -> Dict[str, Dict]:
+        """
+        批量获取代理的统计信息（一次查询）
+        
+        Args:
+            addresses: 代理地址列表
             
-            return stats
+        Returns:
+            {代理地址: 统计信息}，格式同 get_proxy_stats，数据库中不存在的代理不在结果中
+        """
+        with self._get_connection() as conn:
+            return self._query_stats_bulk(conn.cursor(), addresses)
+    
+    def _query_proxy_stats(self, cursor: sqlite3.Cursor, proxy_address: str) -> Optional[Dict]:
+        """在给定游标上查询代理的统计信息"""
+        cursor.execute(_PROXY_STATS_SELECT + """
+            FROM proxies p
+            LEFT JOIN proxy_stats s ON s.proxy_id = p.id
+            WHERE p.addr_key = ?
+        """, (pack_address(proxy_address),))
+        
+        row = cursor.fetchone()
+        return self._row_to_stats(row) if row else None
+    
+    def _query_stats_bulk(self, cursor: sqlite3.Cursor, addresses: Iterable[str]) -> Dict[str, Dict]:
+        """在给定游标上批量查询统计信息（地址写入临时表后做一次连接查询）"""
+        addresses = list(dict.fromkeys(addresses))
+        if not addresses:
+            return {}
+        
+        keys = self._fill_temp_keys(cursor, addresses)
+        
+        cursor.execute(_PROXY_STATS_SELECT + """
+            FROM temp_proxy_keys k
+            INNER JOIN proxies p ON p.addr_key = k.addr_key
+            LEFT JOIN proxy_stats s ON s.proxy_id = p.id
+        """)
+        stats_map = {keys[row['addr_key']]: self._row_to_stats(row) for row in cursor.fetchall()}
+        
+        cursor.execute("DELETE FROM temp_proxy_keys")
+        return stats_map
+    
+    def _row_to_stats(self, row: sqlite3.Row) -> Dict:
+        """统计查询结果转为字典并计算成功率和延迟分位数"""
+        stats = dict(row)
+        stats.update(sketch_percentiles(stats.pop('latency_sketch', None)))
+        if stats['total_checks'] > 0:
+            stats['success_rate'] = stats['success_count'] / stats['total_checks']
+        else:
+            stats['success_rate'] = 0
+        
+        return stats
+    
+    def get_latency_percentiles(self, proxy_address: str) -> Optional[Dict]:
+        """
+        获取代理的延迟分位数（读取草图，不扫描验证历史）
+        
+        Returns:
+            {'p50', 'p90', 'p99', 'samples'}，代理不存在返回 None
+        """
+        with self._get_connection() as conn:
+            row = conn.execute(
+                "SELECT latency_sketch FROM proxies WHERE addr_key = ?", (pack_address(proxy_address),)
+            ).fetchone()
+            return sketch_percentiles(row['latency_sketch']) if row else None
     
     def get_best_proxies(self, limit: int = 50, min_checks: int = 3, 
-                         min_success_rate: float = 0.5) -> List[Dict]:
+                         min_success_rate: float = 0.5, order_by: str = 'score') -> List[Dict]:
         """
         获取最佳代理列表
         
         Args:
             limit: 返回数量
             min_checks: 最小检查次数
-            min_success_rate: 最小成功率
+            min_success_rate: 最小成功率（按时间衰减的加权成功率）
+            order_by: 排序方式，'score' 按评分从高到低；'p50'/'p90'/'p99' 按延迟分位数从低到高
+                      （只包含有延迟样本的代理）
         """
+        if order_by not in _BEST_PROXIES_ORDER:
+            raise ValueError(f"不支持的排序方式: {order_by}")
+        percentile_filter = "" if order_by == 'score' else f"AND s.latency_{order_by} IS NOT NULL"
+        
         with self._get_connection() as conn:
             cursor = conn.cursor()
             
-            cursor.execute("""
+            cursor.execute(f"""
                 SELECT 
                     p.proxy_address,
                     p.country,
@@ -380,27 +1264,32 @@ class ProxyDatabase:
                     p.is_mobile,
                     p.first_seen,
                     p.last_seen,
-                    COUNT(vh.id) as total_checks,
-                    SUM(CASE WHEN vh.is_valid THEN 1 ELSE 0 END) as success_count,
-                    AVG(CASE WHEN vh.is_valid THEN vh.response_time END) as avg_response_time,
-                    AVG(vh.score) as avg_score,
-                    MAX(vh.timestamp) as last_check
-                FROM proxies p
-                INNER JOIN validation_history vh ON p.id = vh.proxy_id
-                LEFT JOIN proxy_blacklist bl ON p.proxy_address = bl.proxy_address
-                WHERE bl.id IS NULL
-                GROUP BY p.id
-                HAVING 
-                    total_checks >= ? 
-                    AND (success_count * 1.0 / total_checks) >= ?
-                ORDER BY avg_score DESC, avg_response_time ASC
+                    p.ewma_success,
+                    p.ewma_latency,
+                    p.latency_sketch,
+                    s.total_checks,
+                    s.success_count,
+                    s.avg_response_time,
+                    s.avg_score,
+                    s.last_check
+                FROM proxy_stats s
+                INNER JOIN proxies p ON p.id = s.proxy_id
+                WHERE s.is_blacklisted = 0
+                    AND s.total_checks >= ?
+                    AND COALESCE(p.ewma_success, s.success_count * 1.0 / s.total_checks) >= ?
+                    {percentile_filter}
+                ORDER BY {_BEST_PROXIES_ORDER[order_by]}
                 LIMIT ?
             """, (min_checks, min_success_rate, limit))
             
             results = []
             for row in cursor.fetchall():
                 proxy = dict(row)
-                proxy['success_rate'] = proxy['success_count'] / proxy['total_checks']
+                # 成功率取时间衰减后的值，近期表现权重更高
+                proxy['success_rate'] = proxy['ewma_success'] if proxy['ewma_success'] is not None \
+                    else proxy['success_count'] / proxy['total_checks']
+                # 延迟分位数 (p50/p90/p99) 直接由草图得到
+                proxy.update(sketch_percentiles(proxy.pop('latency_sketch')))
                 results.append(proxy)
             
             return results
@@ -420,32 +1309,79 @@ class ProxyDatabase:
             """, (cutoff_time,))
             
             return [row['proxy_address'] for row in cursor.fetchall()]
-    
-    def cleanup_old_records(self, days: int = 30):
-        """清理旧记录"""
+
+    def get_subnet_proxies(self, address: str, prefix_len: int = 24) -> List[str]:
+        """
+        获取与给定 IP 处于同一网段的代理地址（整数键上的范围扫描）
+
+        Args:
+            address: IP 或 ip:port
+            prefix_len: 网段前缀长度，默认 /24
+        """
+        if not 0 <= prefix_len <= 32:
+            raise ValueError(f"无效的网段前缀长度: {prefix_len}")
+
+        host = address.rpartition(':')[0] if ':' in address else address
+        addr_key = pack_address(f"{host}:0")
+        if addr_key is None:
+            return []
+
+        # 键的高 32 位是 IP，同一网段即一段连续的键
+        span = 1 << (48 - prefix_len)
+        low = addr_key & ~(span - 1)
+
+        with self._get_connection() as conn:
+            cursor = conn.execute("""
+                SELECT proxy_address FROM proxies
+                WHERE addr_key >= ? AND addr_key < ?
+                ORDER BY addr_key
+            """, (low, low + span))
+            return [row['proxy_address'] for row in cursor.fetchall()]
+
+    def cleanup_old_records(self, days: int = 30, chunk_size: int = 5000,
+                            vacuum_pages: int = 2000):
+        """
+        清理旧记录
+        
+        按 rowid 区间分批删除，每批一个短事务，期间不会长时间独占数据库；
+        删除后只回收 vacuum_pages 页空闲空间（增量压缩），不重写整个文件
+        
+        Args:
+            days: 保留天数
+            chunk_size: 每个事务删除的最大 rowid 跨度
+            vacuum_pages: 本次最多回收的空闲页数
+        """
+        cutoff_date = now_utc() - timedelta(days=days)
+        
+        # 删除旧的验证历史（原始记录和每日汇总），返回的条数均按验证次数计
+        deleted_validations = 0
+        for table in _STATS_SOURCES:
+            deleted_validations += self._expire_stats_rows(table, cutoff_date, chunk_size)
+        
+        # 删除长期未见且没有任何验证记录的代理（反连接走 proxy_id 索引 / 主键）
+        deleted_proxies = 0
+        while True:
+            with self._get_connection() as conn:
+                cursor = conn.execute("""
+                    DELETE FROM proxies WHERE id IN (
+                        SELECT p.id FROM proxies p
+                        WHERE p.last_seen < ?
+                        AND NOT EXISTS (
+                            SELECT 1 FROM validation_history vh WHERE vh.proxy_id = p.id
+                        )
+                        AND NOT EXISTS (
+                            SELECT 1 FROM validation_daily vd WHERE vd.proxy_id = p.id
+                        )
+                        LIMIT ?
+                    )
+                """, (cutoff_date, chunk_size))
+                deleted_proxies += cursor.rowcount
+            if cursor.rowcount < chunk_size:
+                break
+        
         with self._get_connection() as conn:
             cursor = conn.cursor()
             
-            cutoff_date = now_utc() - timedelta(days=days)
-            
-            # 删除旧的验证历史
-            cursor.execute("""
-                DELETE FROM validation_history 
-                WHERE timestamp < ?
-            """, (cutoff_date,))
-            deleted_validations = cursor.rowcount
-            
-            # 删除长期未见的代理
-            cursor.execute("""
-                DELETE FROM proxies 
-                WHERE last_seen < ? 
-                AND id NOT IN (
-                    SELECT DISTINCT proxy_id 
-                    FROM validation_history
-                )
-            """, (cutoff_date,))
-            deleted_proxies = cursor.rowcount
-            
             # 清理旧的黑名单记录
             cursor.execute("""
                 DELETE FROM proxy_blacklist
@@ -453,21 +1389,324 @@ class ProxyDatabase:
             """, (cutoff_date,))
             deleted_blacklist = cursor.rowcount
             
-            self.logger.info(
-                f"清理完成: 删除 {deleted_validations} 条验证记录, "
-                f"{deleted_proxies} 个代理, {deleted_blacklist} 条黑名单记录"
-            )
+            if deleted_blacklist:
+                cursor.execute("""
+                    UPDATE proxy_stats SET is_blacklisted = 0
+                    WHERE is_blacklisted = 1 AND NOT EXISTS (
+                        SELECT 1 FROM proxies p
+                        INNER JOIN proxy_blacklist bl ON bl.addr_key = p.addr_key
+                        WHERE p.id = proxy_stats.proxy_id
+                    )
+                """)
+        
+        self.logger.info(
+            f"清理完成: 删除 {deleted_validations} 条验证记录, "
+            f"{deleted_proxies} 个代理, {deleted_blacklist} 条黑名单记录"
+        )
+        
+        self._reclaim_free_pages(vacuum_pages)
         
-        # VACUUM 必须在事务外执行
+        return deleted_validations, deleted_proxies
+    
+    def _expire_stats_rows(self, table: str, cutoff_date, chunk_size: int) -> int:
+        """按时间索引定位过期记录的 rowid 区间，逐段删除，返回删除的验证次数"""
+        _, time_column = _STATS_SOURCES[table]
+        with self._get_connection() as conn:
+            row = conn.execute(f"""
+                SELECT MIN(rowid) AS min_id, MAX(rowid) AS max_id FROM {table}
+                WHERE {time_column} < ?
+            """, (cutoff_date,)).fetchone()
+        
+        deleted = 0
+        if row['min_id'] is not None:
+            for low in range(row['min_id'], row['max_id'] + 1, chunk_size):
+                deleted += self._delete_stats_chunk(table, low, low + chunk_size, cutoff_date)
+        return deleted
+    
+    def _delete_stats_chunk(self, table: str, low_id: int, high_id: int, cutoff_date) -> int:
+        """
+        在一个事务中删除 [low_id, high_id) 区间内的过期记录，返回删除的验证次数
+        
+        被删除记录的计数和总和从 proxy_stats 中减去（不重新聚合剩余历史），
+        删除的是最旧的记录，因此 last_check 不变；记录全部删除的代理移除其统计
+        """
+        rows_sql, time_column = _STATS_SOURCES[table]
+        params = (low_id, high_id, cutoff_date)
+        
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT COALESCE(SUM(checks), 0) AS checks FROM ({rows_sql})
+                WHERE row_id >= ? AND row_id < ? AND checked_at < ?
+            """, params)
+            checks = cursor.fetchone()['checks']
+            if not checks:
+                return 0
+            
+            cursor.execute(f"""
+                INSERT INTO proxy_stats (
+                    proxy_id, total_checks, success_count, latency_sum, latency_count,
+                    score_sum, score_count
+                )
+                SELECT
+                    proxy_id,
+                    SUM(checks),
+                    SUM(successes),
+                    SUM(latency_sum),
+                    SUM(latency_count),
+                    SUM(score_sum),
+                    SUM(score_count)
+                FROM ({rows_sql})
+                WHERE row_id >= ? AND row_id < ? AND checked_at < ?
+                GROUP BY proxy_id
+                ON CONFLICT(proxy_id) DO UPDATE SET
+                    total_checks = total_checks - excluded.total_checks,
+                    success_count = success_count - excluded.success_count,
+                    latency_sum = latency_sum - excluded.latency_sum,
+                    latency_count = latency_count - excluded.latency_count,
+                    score_sum = score_sum - excluded.score_sum,
+                    score_count = score_count - excluded.score_count,
+                    avg_response_time = (latency_sum - excluded.latency_sum)
+                                        / NULLIF(latency_count - excluded.latency_count, 0),
+                    avg_score = (score_sum - excluded.score_sum) / NULLIF(score_count - excluded.score_count, 0)
+            """, params)
+            
+            cursor.execute(f"""
+                DELETE FROM proxy_stats WHERE proxy_id IN (
+                    SELECT DISTINCT proxy_id FROM {table}
+                    WHERE rowid >= ? AND rowid < ? AND {time_column} < ?
+                ) AND total_checks <= 0
+            """, params)
+            
+            cursor.execute(f"""
+                DELETE FROM {table}
+                WHERE rowid >= ? AND rowid < ? AND {time_column} < ?
+            """, params)
+            return checks
+    
+    def compact_validation_history(self, days: int = 7, chunk_size: int = 5000) -> Tuple[int, int]:
+        """
+        将早于 days 天的原始验证记录折叠为每日汇总 (validation_daily) 并删除原始记录
+        
+        每 (代理, 日期) 一行：检查次数、成功次数、延迟总和/最小/最大值、评分总和、
+        失败代码计数。proxy_stats 和各统计查询同时读取汇总与原始记录，结果不变
+        
+        Args:
+            days: 原始记录保留天数
+            chunk_size: 每个事务处理的最大 rowid 跨度
+            
+        Returns:
+            (折叠的原始记录数, 写入/更新的汇总行数)
+        """
+        cutoff_date = now_utc() - timedelta(days=days)
+        
+        with self._get_connection() as conn:
+            row = conn.execute("""
+                SELECT MIN(id) AS min_id, MAX(id) AS max_id FROM validation_history
+                WHERE timestamp < ?
+            """, (cutoff_date,)).fetchone()
+        
+        compacted = 0
+        daily_rows = 0
+        if row['min_id'] is not None:
+            for low in range(row['min_id'], row['max_id'] + 1, chunk_size):
+                with self._get_connection() as conn:
+                    cursor = conn.cursor()
+                    params = (low, low + chunk_size, cutoff_date)
+                    cursor.execute("""
+                        INSERT INTO validation_daily (
+                            proxy_id, day, checks, successes, latency_sum, latency_count,
+                            latency_min, latency_max, score_sum, score_count, last_check, failure_codes
+                        )
+                        SELECT
+                            proxy_id,
+                            date(timestamp),
+                            COUNT(*),
+                            SUM(CASE WHEN is_valid THEN 1 ELSE 0 END),
+                            COALESCE(SUM(CASE WHEN is_valid THEN response_time END), 0),
+                            COUNT(CASE WHEN is_valid THEN response_time END),
+                            MIN(CASE WHEN is_valid THEN response_time END),
+                            MAX(CASE WHEN is_valid THEN response_time END),
+                            COALESCE(SUM(score), 0),
+                            COUNT(score),
+                            MAX(timestamp),
+                            failure_counts(CASE WHEN NOT is_valid THEN failure_code(error_message) END)
+                        FROM validation_history
+                        WHERE id >= ? AND id < ? AND timestamp < ?
+                        GROUP BY proxy_id, date(timestamp)
+                        ON CONFLICT(proxy_id, day) DO UPDATE SET
+                            checks = checks + excluded.checks,
+                            successes = successes + excluded.successes,
+                            latency_sum = latency_sum + excluded.latency_sum,
+                            latency_count = latency_count + excluded.latency_count,
+                            latency_min = COALESCE(MIN(latency_min, excluded.latency_min),
+                                                   latency_min, excluded.latency_min),
+                            latency_max = COALESCE(MAX(latency_max, excluded.latency_max),
+                                                   latency_max, excluded.latency_max),
+                            score_sum = score_sum + excluded.score_sum,
+                            score_count = score_count + excluded.score_count,
+                            last_check = MAX(last_check, excluded.last_check),
+                            failure_codes = merge_counts(failure_codes, excluded.failure_codes)
+                    """, params)
+                    daily_rows += cursor.rowcount
+                    
+                    cursor.execute("""
+                        DELETE FROM validation_history
+                        WHERE id >= ? AND id < ? AND timestamp < ?
+                    """, params)
+                    compacted += cursor.rowcount
+        
+        if compacted:
+            self.logger.info(f"验证历史压缩: {compacted} 条原始记录折叠为 {daily_rows} 行每日汇总")
+        return compacted, daily_rows
+    
+    def get_daily_history(self, proxy_address: str, days: int = 30) -> List[Dict]:
+        """
+        获取代理按天汇总的验证历史（每日汇总与尚未折叠的原始记录合并）
+        
+        Returns:
+            [{'day', 'checks', 'successes', 'success_rate', 'avg_response_time',
+              'latency_min', 'latency_max', 'failure_codes'}, ...]，按日期升序
+        """
+        cutoff_day = (now_utc() - timedelta(days=days)).strftime('%Y-%m-%d')
+        addr_key = pack_address(proxy_address)
+        
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            # 时间戳按 'YYYY-MM-DD HH:MM:SS' 存储，直接与日期字符串比较等价于 date(timestamp) >= 日期，且可走索引
+            cursor.execute("""
+                SELECT
+                    day,
+                    SUM(checks) AS checks,
+                    SUM(successes) AS successes,
+                    SUM(latency_sum) / NULLIF(SUM(latency_count), 0) AS avg_response_time,
+                    MIN(latency_min) AS latency_min,
+                    MAX(latency_max) AS latency_max,
+                    GROUP_CONCAT(failure_codes, '|') AS failure_codes
+                FROM (
+                    SELECT vd.day, vd.checks, vd.successes, vd.latency_sum, vd.latency_count,
+                           vd.latency_min, vd.latency_max, vd.failure_codes
+                    FROM validation_daily vd
+                    INNER JOIN proxies p ON p.id = vd.proxy_id
+                    WHERE p.addr_key = ? AND vd.day >= ?
+                    UNION ALL
+                    SELECT date(vh.timestamp), COUNT(*),
+                           SUM(CASE WHEN vh.is_valid THEN 1 ELSE 0 END),
+                           COALESCE(SUM(CASE WHEN vh.is_valid THEN vh.response_time END), 0),
+                           COUNT(CASE WHEN vh.is_valid THEN vh.response_time END),
+                           MIN(CASE WHEN vh.is_valid THEN vh.response_time END),
+                           MAX(CASE WHEN vh.is_valid THEN vh.response_time END),
+                           failure_counts(CASE WHEN NOT vh.is_valid THEN failure_code(vh.error_message) END)
+                    FROM validation_history vh
+                    INNER JOIN proxies p ON p.id = vh.proxy_id
+                    WHERE p.addr_key = ? AND vh.timestamp >= ?
+                    GROUP BY date(vh.timestamp)
+                )
+                GROUP BY day
+                ORDER BY day
+            """, (addr_key, cutoff_day, addr_key, cutoff_day))
+            
+            history = []
+            for row in cursor.fetchall():
+                entry = dict(row)
+                codes = None
+                for part in (entry['failure_codes'] or '').split('|'):
+                    codes = merge_counts(codes, part or None)
+                entry['failure_codes'] = json.loads(codes) if codes else {}
+                entry['success_rate'] = entry['successes'] / entry['checks'] if entry['checks'] else 0
+                history.append(entry)
+            return history
+    
+    def publish_snapshot(self, snapshot_path: Optional[str] = None) -> Optional[str]:
+        """
+        发布只读快照
+
+        用 SQLite 在线备份 API 把当前数据库复制到同目录的新文件（备份过程本身是一个一致的读事务），
+        改为回滚日志模式后原子重命名为快照文件。已打开旧快照的读者继续读取旧文件，
+        下次取连接时切换到新快照
+
+        Args:
+            snapshot_path: 快照路径，默认为 "<数据库路径>.snapshot"
+
+        Returns:
+            快照路径，失败时返回 None
+        """
+        snapshot_path = snapshot_path or self.snapshot_path
+        directory = os.path.dirname(os.path.abspath(snapshot_path))
+        start = time.time()
+
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(snapshot_path)}_",
+                                        suffix=".tmp")
+        os.close(fd)
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.execute("VACUUM")
-            conn.close()
-            self.logger.info("数据库压缩完成")
+            target = sqlite3.connect(tmp_path)
+            try:
+                self._connect().backup(target)
+                # 快照以只读方式打开，不能依赖 WAL 的 -shm/-wal 文件
+                target.execute("PRAGMA journal_mode=DELETE")
+            finally:
+                target.close()
+            # mkstemp 创建的文件权限为 0600，改为与数据库相同，其他用户运行的 API/面板才能读取
+            if self.db_path != ':memory:':
+                os.chmod(tmp_path, stat.S_IMODE(os.stat(self.db_path).st_mode))
+            os.replace(tmp_path, snapshot_path)
+        except (sqlite3.Error, OSError) as e:
+            self.logger.error(f"发布快照失败: {e}")
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            return None
+
+        self.logger.info(f"只读快照已发布: {snapshot_path} "
+                         f"({os.path.getsize(snapshot_path) / 1024 / 1024:.1f}MB, {time.time() - start:.2f}s)")
+        return snapshot_path
+
+    def _reclaim_free_pages(self, pages: int):
+        """
+        回收空闲页：增量压缩模式下只处理 pages 页
+
+        旧数据库（非增量压缩模式）不在例行清理中转换，转换需要整库 VACUUM 并独占数据库，
+        由 enable_incremental_vacuum() / db_maintenance.py 单独执行
+        """
+        conn = self._connect()
+        try:
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                self.logger.info(
+                    "数据库不是增量压缩模式，跳过空间回收 "
+                    "(可在扫描器停止时运行 python db_maintenance.py --enable-incremental-vacuum 转换)"
+                )
+                return
+            
+            freelist = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if freelist:
+                # incremental_vacuum 每执行一步回收一页，executescript 会执行到结束
+                conn.executescript(f"PRAGMA incremental_vacuum({int(pages)})")
+                # 检查点后 WAL 中的截断才会反映到数据库文件大小（PASSIVE 不等待读者）
+                conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+                self.logger.info(f"数据库增量压缩: 回收 {min(freelist, pages)}/{freelist} 个空闲页")
         except Exception as e:
             self.logger.warning(f"数据库压缩失败: {e}")
+    
+    def enable_incremental_vacuum(self) -> bool:
+        """
+        将旧数据库转换为增量压缩模式 (auto_vacuum=INCREMENTAL)
+
+        auto_vacuum 只能在建表前设置，已有数据库需要一次完整 VACUUM 才能生效；
+        VACUUM 重写整个文件并在此期间独占数据库，应在扫描器和其他写入者停止时执行
+
+        Returns:
+            是否执行了转换（已是增量压缩模式时返回 False）
+        """
+        conn = self._connect()
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            return False
         
-        return deleted_validations, deleted_proxies
+        start = time.time()
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+        self.logger.info(f"数据库已切换为增量压缩模式 (auto_vacuum=INCREMENTAL), 耗时 {time.time() - start:.1f}s")
+        return True
     
     def get_database_stats(self) -> Dict:
         """获取数据库统计信息"""
@@ -487,17 +1726,20 @@ class ProxyDatabase:
             """)
             stats['active_proxies_24h'] = cursor.fetchone()['count']
             
-            # 总验证次数
-            cursor.execute("SELECT COUNT(*) as count FROM validation_history")
+            # 总验证次数（原始记录 + 每日汇总）
+            cursor.execute("""
+                SELECT (SELECT COUNT(*) FROM validation_history)
+                     + (SELECT COALESCE(SUM(checks), 0) FROM validation_daily) as count
+            """)
             stats['total_validations'] = cursor.fetchone()['count']
             
             # 最近24小时验证成功率
             cursor.execute("""
                 SELECT 
-                    COUNT(*) as total,
-                    SUM(CASE WHEN is_valid THEN 1 ELSE 0 END) as valid
-                FROM validation_history
-                WHERE timestamp >= datetime('now', '-24 hours')
+                    COALESCE(SUM(checks), 0) as total,
+                    SUM(successes) as valid
+                FROM validation_combined
+                WHERE checked_at >= datetime('now', '-24 hours')
             """)
             row = cursor.fetchone()
             if row['total'] > 0:
@@ -511,11 +1753,9 @@ class ProxyDatabase:
             
             # 24小时平均响应时间
             cursor.execute("""
-                SELECT AVG(response_time) as avg_time
-                FROM validation_history
-                WHERE timestamp >= datetime('now', '-24 hours')
-                    AND is_valid = 1
-                    AND response_time IS NOT NULL
+                SELECT SUM(latency_sum) / NULLIF(SUM(latency_count), 0) as avg_time
+                FROM validation_combined
+                WHERE checked_at >= datetime('now', '-24 hours')
             """)
             row = cursor.fetchone()
             stats['avg_response_time_24h'] = row['avg_time'] if row['avg_time'] else 0
@@ -15,8 +15,12 @@ from proxy_sources_fixed import ProxySourceManager
 from validators import ProxyValidator
 from exporters import ResultExporter
 from proxy_database import ProxyDatabase
+from async_database import AsyncProxyDatabase
 from enhanced_validator import EnhancedValidator, ProxyScorer
 from source_health_checker import SourceHealthChecker
+from geo_cache import GeoCache
+from db_writer import DatabaseWriter
+from scoring import ScoringWeights
 from timezone_utils import get_display_time
 
 
@@ -32,8 +36,16 @@ async def main():
                        help='日志级别')
     parser.add_argument('--db-path', type=str, default='proxies.db', help='数据库路径')
     parser.add_argument('--cleanup-days', type=int, default=30, help='清理天数')
+    parser.add_argument('--compact-days', type=int, default=7,
+                       help='超过该天数的验证记录折叠为每日汇总 (0 表示不压缩)')
+    parser.add_argument('--ewma-half-life', type=float, default=24,
+                       help='成功率/延迟加权平均的半衰期(小时)')
     parser.add_argument('--enable-enhanced', action='store_true', 
                        help='启用增强验证(DNS泄露、带宽测试等)')
+    parser.add_argument('--enhanced-top-k', type=int, default=20,
+                       help='增强验证: 每个国家仅对初步评分前K名做带宽/DNS泄露检测 (0 表示只看评分阈值)')
+    parser.add_argument('--enhanced-min-score', type=float, default=None,
+                       help='增强验证: 初步评分不低于该值的代理也做带宽/DNS泄露检测')
     parser.add_argument('--check-sources', action='store_true',
                        help='检查代理源健康状况')
     parser.add_argument('--enable-telegram', action='store_true',
@@ -46,6 +58,14 @@ async def main():
                        help='自动将持续失败的代理加入黑名单')
     parser.add_argument('--blacklist-threshold', type=int, default=5,
                        help='自动加入黑名单的失败次数阈值')
+    parser.add_argument('--judge-url', type=str, default=None,
+                       help='Judge地址(可用 judge_server.py 自建), 默认 httpbin.org/get')
+    parser.add_argument('--geo-cache-ttl', type=float, default=168,
+                       help='地理位置缓存有效期(小时)')
+    parser.add_argument('--geoip-db', type=str, default=None,
+                       help='本地GeoIP库(.mmdb)路径, 设置后探测前按入口IP预过滤国家白名单')
+    parser.add_argument('--geoip-tolerance', type=float, default=0.05,
+                       help='GeoIP预过滤容差: 非白名单候选仍抽样探测的比例(0~1)')
     
     args = parser.parse_args()
     
@@ -70,12 +90,19 @@ async def main():
         max_concurrency=args.max_concurrency,
         output_file=args.output
     )
+    if args.judge_url:
+        config.judge_url = args.judge_url
+    config.geoip_db_path = args.geoip_db
+    config.geoip_tolerance = args.geoip_tolerance
     
     
-    # 初始化数据库
-    db = ProxyDatabase(args.db_path)
+    # 初始化数据库 (所有调用在后台读写线程中执行，不阻塞正在进行的探测)
+    db = AsyncProxyDatabase(ProxyDatabase(args.db_path, ewma_half_life_hours=args.ewma_half_life))
     logger.info(f"数据库初始化完成: {args.db_path}")
     
+    # 地理位置缓存 (与数据库共用同一文件，跨运行复用)
+    geo_cache = GeoCache(args.db_path, ttl_hours=args.geo_cache_ttl)
+    
     # 检查代理源健康状况(可选)
     if args.check_sources:
         logger.info("\n开始检查代理源健康状况...")
@@ -86,7 +113,7 @@ async def main():
         
         # 保存源状态到数据库
         for result in source_results:
-            db.update_source_stats(
+            await db.update_source_stats(
                 result['url'],
                 result['is_available'],
                 result.get('valid_proxies', 0)
@@ -106,95 +133,62 @@ async def main():
     # 黑名单过滤
     if args.enable_blacklist:
         logger.info("\n应用黑名单过滤...")
-        blacklist = db.get_blacklisted_proxies()
+        blacklist = await db.get_blacklist_index()
         logger.info(f"   当前黑名单: {len(blacklist)} 个代理")
         
         original_count = len(all_proxies)
-        all_proxies = {p for p in all_proxies if p not in blacklist}
+        all_proxies = set(blacklist.filter(all_proxies))
         filtered_count = original_count - len(all_proxies)
         
         logger.info(f"   ✅ 过滤掉 {filtered_count} 个黑名单代理")
         logger.info(f"   剩余 {len(all_proxies)} 个代理待验证")
     
-    # 验证代理
+    # 验证代理 (验证结果经队列由后台任务批量写入数据库)
     logger.info("\n开始验证代理...")
+    scorer = ProxyScorer(db.db, ScoringWeights.from_dict(config.scoring_weights))
+    db_writer = DatabaseWriter(db, scorer, failure_test_url=config.judge_url)
+    db_writer.start()
     
-    if args.enable_enhanced:
-        # 使用增强验证器
-        logger.info("使用增强验证模式 (包含DNS泄露、带宽测试)")
-        validator = EnhancedValidator(timeout=args.timeout)
-        valid_results = await validator.validate_batch(
-            list(all_proxies),
-            max_concurrency=args.max_concurrency
-        )
-    else:
-        # 使用标准验证器
-        validator = ProxyValidator(config)
-        valid_results = await validator.validate_proxies(list(all_proxies))
+    try:
+        if args.enable_enhanced:
+            # 使用增强验证器
+            logger.info("使用增强验证模式 (包含DNS泄露、带宽测试)")
+            validator = EnhancedValidator(timeout=args.timeout, geo_cache=geo_cache, config=config)
+            valid_results = await validator.validate_batch(
+                list(all_proxies),
+                test_url=config.judge_url,
+                max_concurrency=args.max_concurrency,
+                on_result=db_writer.submit,
+                deep_top_k=args.enhanced_top_k,
+                deep_min_score=args.enhanced_min_score
+            )
+        else:
+            # 使用标准验证器
+            validator = ProxyValidator(config, geo_cache=geo_cache)
+            valid_results = await validator.validate_proxies(list(all_proxies), on_result=db_writer.submit)
+    finally:
+        # 写完剩余结果 (评分在写入时结合历史统计计算)
+        await db_writer.close()
     
     # 过滤有效代理
     valid_proxies = [r for r in valid_results if r.get('is_valid')]
     logger.info(f"✅ 验证完成: {len(valid_proxies)}/{len(all_proxies)} 个代理有效")
     
-    # 评分和保存到数据库
-    logger.info("\n计算评分并保存到数据库...")
-    scorer = ProxyScorer(db)
-    
-    for proxy_data in valid_proxies:
-        try:
-            # 保存代理信息
-            proxy_id = db.save_proxy(proxy_data)
-            
-            # 获取历史统计
-            historical_stats = db.get_proxy_stats(proxy_data['proxy'])
-            
-            # 计算综合评分
-            score = scorer.calculate_score(proxy_data, historical_stats)
-            proxy_data['score'] = score
-            
-            # 保存验证结果
-            db.save_validation_result(proxy_data['proxy'], {
-                'is_valid': True,
-                'response_time': proxy_data.get('response_time'),
-                'test_url': proxy_data.get('test_url'),
-                'score': score
-            })
-            
-        except Exception as e:
-            logger.error(f"处理代理 {proxy_data.get('proxy')} 时出错: {e}")
-    
-    # 保存失败代理的验证记录（用于黑名单系统）
-    logger.info("\n保存失败代理的验证记录...")
-    failed_count = 0
-    for result in valid_results:
-        if not result.get('is_valid'):
-            try:
-                proxy_address = result.get('proxy')
-                if proxy_address:
-                    # 尝试保存代理信息（如果有基本信息）
-                    try:
-                        db.save_proxy({
-                            'proxy': proxy_address,
-                            'country': 'Unknown',
-                            'country_code': 'UN',
-                            'city': 'Unknown'
-                        })
-                    except:
-                        pass  # 代理可能已存在
-                    
-                    # 保存失败的验证记录
-                    db.save_validation_result(proxy_address, {
-                        'is_valid': False,
-                        'response_time': None,
-                        'test_url': config.test_urls[0] if config.test_urls else None,
-                        'error': result.get('error', 'Validation failed'),
-                        'score': 0
-                    })
-                    failed_count += 1
-            except Exception as e:
-                logger.debug(f"保存失败记录时出错 {proxy_address}: {e}")
+    geo_stats = geo_cache.get_stats()
+    logger.info(
+        f"   地理位置缓存: 命中 {geo_stats['hits']} (内存 {geo_stats['memory_hits']}, "
+        f"磁盘 {geo_stats['db_hits']}), 未命中 {geo_stats['misses']}, "
+        f"实际查询 {geo_stats['lookups']} 次"
+    )
     
-    logger.info(f"   ✅ 已保存 {failed_count} 个失败代理的验证记录")
+    writer_stats = db_writer.get_stats()
+    logger.info(
+        f"   数据库写入: 有效 {writer_stats['valid_saved']} 条, 失败 {writer_stats['failed_saved']} 条, "
+        f"{writer_stats['transactions']} 个事务, 耗时 {writer_stats['write_time']:.2f}s "
+        f"({writer_stats['rows_per_sec']:.0f} 条/秒)"
+    )
+    if writer_stats['errors']:
+        logger.warning(f"   ⚠️ {writer_stats['errors']} 条验证结果写入失败")
     
     # 导出结果
     logger.info(f"\n导出结果到 {args.output}...")
@@ -203,7 +197,7 @@ async def main():
     
     # 获取最佳代理并额外导出
     logger.info("\n生成最佳代理列表...")
-    best_proxies = db.get_best_proxies(limit=50, min_checks=2, min_success_rate=0.6)
+    best_proxies = await db.get_best_proxies(limit=50, min_checks=2, min_success_rate=0.6)
     if best_proxies:
         best_proxies_file = 'subscribe/best_proxies.txt'
         with open(best_proxies_file, 'w', encoding='utf-8') as f:
@@ -213,7 +207,7 @@ async def main():
     
     # 数据库统计
     logger.info("\n数据库统计:")
-    stats = db.get_database_stats()
+    stats = await db.get_database_stats()
     logger.info(f"  总代理数: {stats['total_proxies']}")
     logger.info(f"  24小时活跃: {stats['active_proxies_24h']}")
     logger.info(f"  24小时成功率: {stats['success_rate_24h']*100:.1f}%")
@@ -221,13 +215,19 @@ async def main():
     
     # 清理旧数据
     logger.info(f"\n清理 {args.cleanup_days} 天前的旧数据...")
-    deleted_validations, deleted_proxies = db.cleanup_old_records(days=args.cleanup_days)
+    deleted_validations, deleted_proxies = await db.cleanup_old_records(days=args.cleanup_days)
     logger.info(f"✅ 清理完成: 删除 {deleted_validations} 条验证记录, {deleted_proxies} 个代理")
     
+    # 折叠旧验证记录为每日汇总
+    if args.compact_days > 0:
+        compacted, daily_rows = await db.compact_validation_history(days=args.compact_days)
+        if compacted:
+            logger.info(f"✅ 历史压缩: {compacted} 条验证记录折叠为 {daily_rows} 行每日汇总")
+    
     # 自动加入黑名单
     if args.auto_blacklist:
         logger.info(f"\n执行自动黑名单检查 (阈值: {args.blacklist_threshold}次失败)...")
-        blacklisted_count = db.auto_blacklist_failing_proxies(
+        blacklisted_count = await db.auto_blacklist_failing_proxies(
             fail_threshold=args.blacklist_threshold,
             days=7
         )
@@ -235,7 +235,7 @@ async def main():
             logger.info(f"   ✅ 新增 {blacklisted_count} 个代理到黑名单")
             
             # 显示黑名单统计
-            bl_stats = db.get_blacklist_stats()
+            bl_stats = await db.get_blacklist_stats()
             logger.info(f"   黑名单总数: {bl_stats['total_blacklisted']}")
             logger.info(f"   自动添加: {bl_stats['auto_added']}")
             logger.info(f"   手动添加: {bl_stats['manual_added']}")
@@ -246,19 +246,25 @@ async def main():
     if args.enable_blacklist:
         try:
             blacklist_file = 'subscribe/blacklist.txt'
-            all_blacklisted = db.get_blacklisted_proxies()
+            # 与启动时过滤用的是同一份索引（已按指纹刷新），无需再把整张表读成字符串集合
+            all_blacklisted = await db.get_blacklist_index()
             if all_blacklisted:
                 logger.info(f"\n导出黑名单到 {blacklist_file}...")
                 with open(blacklist_file, 'w', encoding='utf-8') as f:
                     f.write("# Proxy Blacklist\n")
                     f.write(f"# Total: {len(all_blacklisted)}\n")
                     f.write(f"# Updated: {get_display_time()} (北京时间)\n\n")
-                    for proxy in sorted(all_blacklisted):
+                    # 索引按打包整数有序，即按 IP、端口数值排序
+                    for proxy in all_blacklisted:
                         f.write(f"{proxy}\n")
                 logger.info(f"✅ 黑名单已保存 ({len(all_blacklisted)}个)")
         except Exception as e:
             logger.error(f"导出黑名单失败: {e}")
-    
+
+    # 发布只读快照 (API/Web面板读取快照，不受下次扫描的写入和清理影响)
+    await db.publish_snapshot()
+    await db.close()
+
     # 启动可选功能
     # 启动可选功能
     if args.enable_telegram:
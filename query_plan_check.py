@@ -0,0 +1,205 @@
+"""
+热点查询执行计划检查
+生成一个较大的合成数据库，调用 ProxyDatabase 的热点方法并记录实际执行的 SQL，
+对每条语句执行 EXPLAIN QUERY PLAN，发现对持久表的全表扫描时以非零状态退出，
+避免新增功能时查询性能悄悄退化。
+覆盖索引扫描同样与表大小成正比，只有列入 COVERING_SCAN_ALLOWLIST 的方法和表才允许。
+回归测试见 tests/test_query_plans.py（随 pytest 运行）；本脚本用于在更大规模的数据库上手动检查并打印计划
+"""
+
+import argparse
+import os
+import random
+import re
+import sqlite3
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from db_benchmark import make_entries
+from proxy_database import ProxyDatabase
+
+
+# 需要检查的语句类型（BEGIN/COMMIT/PRAGMA 等跳过）
+_CHECKED_STATEMENTS = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH')
+
+# FROM/JOIN 后的表名及可选别名
+_TABLE_REF = re.compile(r'\b(?:FROM|JOIN|UPDATE|INTO)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?', re.IGNORECASE)
+_SQL_KEYWORDS = {'where', 'on', 'inner', 'left', 'join', 'group', 'order', 'limit', 'set', 'using',
+                 'select', 'values', 'union', 'as', 'natural', 'cross', 'having', 'default'}
+
+# 热点方法: 名称 -> 调用 (参数为数据库和一批已存在的代理地址)
+HOT_QUERIES: Dict[str, Callable[[ProxyDatabase, List[str]], object]] = {
+    'save_validation_batch': lambda db, addresses: db.save_validation_batch([
+        ({'proxy': address}, {'is_valid': False, 'error': 'timeout'}) for address in addresses[:200]
+    ]),
+    'get_proxy_stats': lambda db, addresses: db.get_proxy_stats(addresses[0]),
+    'get_stats_bulk': lambda db, addresses: db.get_stats_bulk(addresses),
+    'get_latency_percentiles': lambda db, addresses: db.get_latency_percentiles(addresses[0]),
+    'get_best_proxies': lambda db, addresses: db.get_best_proxies(limit=50),
+    'get_best_proxies_p90': lambda db, addresses: db.get_best_proxies(limit=50, order_by='p90'),
+    'get_all_active_proxies': lambda db, addresses: db.get_all_active_proxies(hours=24),
+    'get_subnet_proxies': lambda db, addresses: db.get_subnet_proxies(addresses[0]),
+    'get_daily_history': lambda db, addresses: db.get_daily_history(addresses[0]),
+    'get_database_stats': lambda db, addresses: db.get_database_stats(),
+    'get_blacklist_index': lambda db, addresses: db.get_blacklist_index(),
+    'auto_blacklist_failing_proxies': lambda db, addresses: db.auto_blacklist_failing_proxies(),
+    'compact_validation_history': lambda db, addresses: db.compact_validation_history(days=7),
+    'cleanup_old_records': lambda db, addresses: db.cleanup_old_records(days=30),
+}
+
+# 允许的覆盖索引扫描: 方法名 -> {表名: 原因}。只列入确实需要读取整张表（或整个索引）的方法
+COVERING_SCAN_ALLOWLIST: Dict[str, Dict[str, str]] = {
+    'get_database_stats': {
+        'proxies': '统计面板的代理总数 COUNT(*)',
+        'validation_history': '统计面板的验证总数 COUNT(*)',
+        'validation_daily': '统计面板的验证总数 SUM(checks)',
+        'proxy_blacklist': '统计面板的黑名单总数 COUNT(*)',
+    },
+    'get_blacklist_index': {
+        'proxy_blacklist': '指纹 COUNT(*) 及重建索引时按序读出全部地址（黑名单远小于代理池）',
+    },
+}
+
+
+def build_synthetic_db(db_path: str, checks: int = 200000, pool_size: int = 20000,
+                       days: int = 45, seed: int = 0) -> ProxyDatabase:
+    """
+    生成合成数据库：验证记录的时间均匀分布在最近 days 天内，
+    7 天前的记录折叠为每日汇总，约 5% 的代理在黑名单中
+    """
+    rng = random.Random(seed)
+    db = ProxyDatabase(db_path)
+    for _ in range(max(1, checks // 5000)):
+        db.save_validation_batch(make_entries(5000, pool_size, rng))
+
+    with db._get_connection() as conn:
+        conn.execute("""
+            UPDATE validation_history
+            SET timestamp = datetime('now', '-' || (abs(random()) % (? * 86400)) || ' seconds')
+        """, (days,))
+        conn.execute("""
+            UPDATE proxies SET last_seen = datetime('now', '-' || (abs(random()) % (? * 86400)) || ' seconds')
+        """, (days,))
+    db.compact_validation_history(days=7)
+
+    addresses = [row['proxy_address'] for row in db._connect().execute("SELECT proxy_address FROM proxies")]
+    for address in rng.sample(addresses, len(addresses) // 20):
+        db.add_to_blacklist(address)
+    return db
+
+
+def capture_statements(db: ProxyDatabase, func: Callable[[], object]) -> List[str]:
+    """执行 func 并返回当前线程连接上实际执行的 SQL（参数已展开，去重并保持顺序）"""
+    statements: List[str] = []
+    conn = db._connect()
+    conn.set_trace_callback(statements.append)
+    try:
+        func()
+    finally:
+        conn.set_trace_callback(None)
+    return [sql for sql in dict.fromkeys(statements)
+            if sql.lstrip().split(None, 1)[0].upper() in _CHECKED_STATEMENTS]
+
+
+def _table_aliases(sql: str, tables: set) -> Dict[str, str]:
+    """SQL 中引用的持久表: 名称或别名 -> 表名"""
+    aliases = {}
+    for table, alias in _TABLE_REF.findall(sql):
+        if table.lower() not in tables:
+            continue
+        aliases[table.lower()] = table.lower()
+        if alias and alias.lower() not in _SQL_KEYWORDS:
+            aliases[alias.lower()] = table.lower()
+    return aliases
+
+
+def full_scans(conn: sqlite3.Connection, sql: str, allowed_tables: Iterable[str] = ()) -> List[str]:
+    """
+    返回语句执行计划中对持久表的全表扫描
+
+    扫描临时表、子查询、视图结果不计入；覆盖索引扫描只在表属于 allowed_tables 时不计入
+    """
+    tables = {row[0].lower() for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+    )}
+    aliases = _table_aliases(sql, tables)
+    allowed = {table.lower() for table in allowed_tables}
+
+    scans = []
+    for row in conn.execute("EXPLAIN QUERY PLAN " + sql):
+        detail = row[3]
+        match = re.match(r'SCAN (\w+)', detail)
+        if not match:
+            continue
+        table = aliases.get(match.group(1).lower())
+        if table is None or ('COVERING INDEX' in detail and table in allowed):
+            continue
+        scans.append(detail)
+    return scans
+
+
+def check_query_plans(db: ProxyDatabase, addresses: List[str]) -> Dict[str, List[Tuple[str, str]]]:
+    """
+    依次执行各热点方法并检查其 SQL 的执行计划
+
+    Returns:
+        {方法名: [(SQL, 全表扫描的计划行), ...]}，只包含有问题的方法
+    """
+    conn = db._connect()
+    problems = {}
+    for name, query in HOT_QUERIES.items():
+        statements = capture_statements(db, lambda: query(db, addresses))
+        allowed = COVERING_SCAN_ALLOWLIST.get(name, {})
+        found = [(sql, detail) for sql in statements for detail in full_scans(conn, sql, allowed)]
+        if found:
+            problems[name] = found
+    return problems
+
+
+def run_check(db_path: str, checks: int, pool_size: int) -> int:
+    """生成数据库并检查，返回进程退出码"""
+    start = time.perf_counter()
+    db = build_synthetic_db(db_path, checks, pool_size)
+    print(f"合成数据库: {checks} 条验证记录, {pool_size} 个代理, 耗时 {time.perf_counter() - start:.1f}s")
+
+    addresses = [row['proxy_address'] for row in db._connect().execute(
+        "SELECT proxy_address FROM proxies ORDER BY random() LIMIT 500"
+    )]
+    problems = check_query_plans(db, addresses)
+    db.close()
+
+    for name in HOT_QUERIES:
+        print(f"{'❌' if name in problems else '✅'} {name}")
+        for sql, detail in problems.get(name, []):
+            print(f"     {detail}")
+            print(f"       {' '.join(sql.split())[:160]}")
+
+    if problems:
+        print(f"\n{len(problems)} 个热点方法存在全表扫描")
+        return 1
+    print("\n所有热点查询均未出现全表扫描")
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='热点查询执行计划检查')
+    parser.add_argument('--db-path', type=str, default=None,
+                        help='合成数据库路径（默认使用临时文件，检查后删除）')
+    parser.add_argument('--checks', type=int, default=200000, help='合成的验证记录数')
+    parser.add_argument('--pool-size', type=int, default=20000, help='代理池规模')
+    args = parser.parse_args()
+
+    tmp_dir = None
+    db_path = args.db_path
+    if db_path is None:
+        tmp_dir = tempfile.TemporaryDirectory()
+        db_path = os.path.join(tmp_dir.name, 'query_plan.db')
+
+    try:
+        exit_code = run_check(db_path, args.checks, args.pool_size)
+    finally:
+        if tmp_dir:
+            tmp_dir.cleanup()
+    sys.exit(exit_code)
@@ -0,0 +1,238 @@
+"""
+批量评分引擎模块
+以列式数组（延迟、成功率、检查次数、移动网络、国家代码、带宽等）为输入，
+用 NumPy 一次计算整批代理的综合评分 (0-100)，各模块统一调用，保证评分口径一致
+"""
+
+import time
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+from country_codes import compile_country_set, resolve_country_code
+
+
+# 地理位置加分的默认国家
+DEFAULT_TARGET_COUNTRIES = [
+    "United States", "Germany", "United Kingdom", "France",
+    "Japan", "South Korea", "Taiwan", "Singapore", "Canada"
+]
+
+
+@dataclass
+class ScoringWeights:
+    """评分权重配置"""
+
+    # 1. 延迟评分: 响应时间 < 阈值[i] 得 points[i]，超过所有阈值得最后一档
+    latency_thresholds: Tuple[float, ...] = (1, 2, 3, 5, 8)
+    latency_points: Tuple[float, ...] = (30, 25, 20, 15, 10, 5)
+
+    # 2. 稳定性评分: 历史成功率 × stability，无历史但本次验证成功得 new_proxy_stability
+    stability: float = 20
+    new_proxy_stability: float = 10
+
+    # 3. ISP类型评分
+    isp_mobile: float = 15
+    isp_residential: float = 10
+    isp_proxy: float = 5
+
+    # 4. 地理位置评分
+    geo_target: float = 15
+    geo_other: float = 8
+    target_countries: List[str] = field(default_factory=lambda: list(DEFAULT_TARGET_COUNTRIES))
+
+    # 5. 历史表现评分: 检查次数 >= 阈值[i] 得 points[i+1]，有历史但不足最低阈值得 points[0]
+    history_thresholds: Tuple[float, ...] = (3, 5, 10)
+    history_points: Tuple[float, ...] = (5, 10, 15, 20)
+
+    # 带宽奖励 (每个带宽评分点) 与 DNS泄露扣分
+    bandwidth: float = 0.5
+    dns_leak_penalty: float = 10
+
+    max_score: float = 100
+
+    @classmethod
+    def from_dict(cls, data: Optional[Mapping]) -> 'ScoringWeights':
+        """从配置字典创建（未知键忽略）"""
+        if not data:
+            return cls()
+        known = {k: v for k, v in data.items() if k in cls.__dataclass_fields__}
+        for key in ('latency_thresholds', 'latency_points', 'history_thresholds', 'history_points'):
+            if key in known:
+                known[key] = tuple(known[key])
+        return cls(**known)
+
+
+# 列名 -> dtype
+COLUMNS = {
+    'response_time': np.float64,   # 秒，缺失为 NaN
+    'is_valid': np.bool_,
+    'has_history': np.bool_,
+    'success_rate': np.float64,    # 缺失为 NaN
+    'total_checks': np.float64,
+    'is_mobile': np.bool_,
+    'is_proxy': np.bool_,
+    'country_code': 'U2',
+    'has_country': np.bool_,
+    'bandwidth_score': np.float64,
+    'dns_leak': np.bool_,
+}
+
+
+def build_columns(proxies: List[Dict], stats_map: Optional[Mapping[str, Dict]] = None) -> Dict[str, np.ndarray]:
+    """
+    将代理字典列表转换为评分所需的列式数组
+
+    Args:
+        proxies: 代理数据（验证结果或数据库记录）
+        stats_map: {代理地址: 历史统计}（ProxyDatabase.get_proxy_stats 的结果格式）
+    """
+    stats_map = stats_map or {}
+    rows = {name: [] for name in COLUMNS}
+
+    for proxy in proxies:
+        stats = stats_map.get(proxy.get('proxy') or proxy.get('proxy_address'))
+        ip_info = proxy.get('ip_info') or {}
+        country = ip_info.get('country') or proxy.get('country') or ''
+        response_time = proxy.get('response_time', 999)
+        dns_leak = proxy.get('dns_leak')
+
+        rows['response_time'].append(response_time if response_time else np.nan)
+        rows['is_valid'].append(bool(proxy.get('is_valid')))
+        rows['has_history'].append(bool(stats))
+        rows['success_rate'].append(_success_rate(stats))
+        rows['total_checks'].append((stats or {}).get('total_checks') or 0)
+        rows['is_mobile'].append(
+            bool(proxy.get('is_mobile')) or 'mobile' in str(ip_info.get('isp', '')).lower()
+        )
+        rows['is_proxy'].append(bool(proxy.get('is_proxy', False)))
+        rows['country_code'].append(resolve_country_code(proxy.get('country_code'), country))
+        rows['has_country'].append(bool(country))
+        rows['bandwidth_score'].append(proxy.get('bandwidth_score') or 0)
+        rows['dns_leak'].append(bool(dns_leak and dns_leak.get('leak_detected')))
+
+    return {name: np.asarray(values, dtype=COLUMNS[name]) for name, values in rows.items()}
+
+
+def _success_rate(stats: Optional[Dict]) -> float:
+    """历史成功率：优先使用时间衰减的加权成功率"""
+    if not stats:
+        return np.nan
+    if stats.get('ewma_success') is not None:
+        return stats['ewma_success']
+    return stats.get('success_rate', np.nan)
+
+
+class ScoringEngine:
+    """向量化评分引擎"""
+
+    def __init__(self, weights: Optional[ScoringWeights] = None):
+        self.weights = weights or ScoringWeights()
+        self.target_codes: FrozenSet[str] = compile_country_set(self.weights.target_countries)
+        self._target_array = np.asarray(sorted(self.target_codes), dtype='U2')
+
+        w = self.weights
+        if len(w.latency_points) != len(w.latency_thresholds) + 1:
+            raise ValueError("latency_points 数量必须比 latency_thresholds 多 1")
+        if len(w.history_points) != len(w.history_thresholds) + 1:
+            raise ValueError("history_points 数量必须比 history_thresholds 多 1")
+
+    def score_columns(self, columns: Mapping[str, np.ndarray]) -> np.ndarray:
+        """
+        按列计算整批评分
+
+        Args:
+            columns: build_columns 的结果（或同名同类型的数组）
+
+        Returns:
+            评分数组 (0-max_score，保留两位小数)
+        """
+        w = self.weights
+        rt = columns['response_time']
+        score = np.zeros(len(rt), dtype=np.float64)
+
+        # 1. 延迟评分
+        latency_points = np.asarray(w.latency_points, dtype=np.float64)
+        has_rt = ~np.isnan(rt)
+        tier = np.searchsorted(np.asarray(w.latency_thresholds, dtype=np.float64),
+                               np.where(has_rt, rt, 0), side='right')
+        score += np.where(has_rt, latency_points[tier], 0)
+
+        # 2. 稳定性评分
+        success_rate = columns['success_rate']
+        has_rate = ~np.isnan(success_rate)
+        score += np.where(
+            has_rate, np.where(has_rate, success_rate, 0) * w.stability,
+            np.where(columns['is_valid'], w.new_proxy_stability, 0)
+        )
+
+        # 3. ISP类型评分
+        score += np.where(
+            columns['is_mobile'], w.isp_mobile,
+            np.where(columns['is_proxy'], w.isp_proxy, w.isp_residential)
+        )
+
+        # 4. 地理位置评分
+        in_target = np.isin(columns['country_code'], self._target_array)
+        score += np.where(in_target, w.geo_target, np.where(columns['has_country'], w.geo_other, 0))
+
+        # 5. 历史表现评分
+        history_points = np.asarray(w.history_points, dtype=np.float64)
+        tier = np.searchsorted(np.asarray(w.history_thresholds, dtype=np.float64),
+                               columns['total_checks'], side='right')
+        score += np.where(columns['has_history'], history_points[tier], 0)
+
+        # 带宽奖励 / DNS泄露扣分
+        score += columns['bandwidth_score'] * w.bandwidth
+        score -= np.where(columns['dns_leak'], w.dns_leak_penalty, 0)
+
+        return np.round(np.minimum(score, w.max_score), 2)
+
+    def score_batch(self, proxies: List[Dict], stats_map: Optional[Mapping[str, Dict]] = None) -> List[float]:
+        """计算一批代理的评分（顺序与输入一致）"""
+        if not proxies:
+            return []
+        return self.score_columns(build_columns(proxies, stats_map)).tolist()
+
+    def score_one(self, proxy: Dict, historical_stats: Optional[Dict] = None) -> float:
+        """计算单个代理的评分"""
+        address = proxy.get('proxy') or proxy.get('proxy_address')
+        stats_map = {address: historical_stats} if historical_stats else None
+        return self.score_batch([proxy], stats_map)[0]
+
+
+def random_columns(n: int, seed: int = 0) -> Dict[str, np.ndarray]:
+    """生成随机列数据（用于性能测试）"""
+    rng = np.random.default_rng(seed)
+    codes = np.asarray(['US', 'JP', 'DE', 'BR', 'IN', 'RU', 'UN'], dtype='U2')
+    has_history = rng.random(n) < 0.7
+    return {
+        'response_time': np.where(rng.random(n) < 0.05, np.nan, rng.exponential(2.5, n)),
+        'is_valid': rng.random(n) < 0.9,
+        'has_history': has_history,
+        'success_rate': np.where(has_history, rng.random(n), np.nan),
+        'total_checks': np.where(has_history, rng.integers(1, 30, n), 0).astype(np.float64),
+        'is_mobile': rng.random(n) < 0.1,
+        'is_proxy': rng.random(n) < 0.5,
+        'country_code': codes[rng.integers(0, len(codes), n)],
+        'has_country': rng.random(n) < 0.95,
+        'bandwidth_score': rng.integers(0, 11, n).astype(np.float64),
+        'dns_leak': rng.random(n) < 0.02,
+    }
+
+
+def example_usage():
+    """示例：对 10 万条记录按两套权重重新评分"""
+    columns = random_columns(100_000)
+
+    for weights in (ScoringWeights(), ScoringWeights(stability=30, geo_target=5)):
+        engine = ScoringEngine(weights)
+        start = time.perf_counter()
+        scores = engine.score_columns(columns)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"{len(scores)} 条评分耗时 {elapsed:.1f}ms, 平均分 {scores.mean():.2f}")
+
+
+if __name__ == "__main__":
+    example_usage()
@@ -200,7 +200,7 @@ class SourceHealthChecker:
         
         Args:
             results: 健康检查结果
-            db: 数据库实例
+            db: 数据库实例（AsyncProxyDatabase）
             min_proxies: 最小代理数量阈值
             max_fails: 最大失败次数
             
@@ -209,17 +209,21 @@ class SourceHealthChecker:
         """
         disabled_sources = []
         
+        # 源的历史统计只在有源不可用时查询一次
+        source_stats = {}
+        if db and any(not result['is_available'] for result in results):
+            source_stats = await self._get_source_stats(db)
+        
         for result in results:
             source_url = result['url']
             
             # 条件1: 当前不可用
             if not result['is_available']:
-                if db:
-                    # 检查历史失败次数
-                    source_stats = await self._get_source_stats(db, source_url)
-                    if source_stats and source_stats['fail_count'] >= max_fails:
-                        disabled_sources.append(source_url)
-                        self.logger.warning(f"禁用源 {source_url}: 连续失败{max_fails}次")
+                # 检查历史失败次数
+                stats = source_stats.get(source_url)
+                if stats and stats['fail_count'] >= max_fails:
+                    disabled_sources.append(source_url)
+                    self.logger.warning(f"禁用源 {source_url}: 连续失败{max_fails}次")
             
             # 条件2: 代理数量太少
             elif result.get('valid_proxies', 0) < min_proxies:
@@ -228,13 +232,11 @@ class SourceHealthChecker:
         
         return disabled_sources
     
-    async def _get_source_stats(self, db, source_url: str) -> Dict:
-        """从数据库获取源统计信息"""
+    async def _get_source_stats(self, db) -> Dict[str, Dict]:
+        """从数据库获取所有源的统计信息 {源URL: 统计}（在数据库读线程中查询）"""
         try:
-            sources = db.get_source_health()
-            for source in sources:
-                if source['source_url'] == source_url:
-                    return source
-        except:
-            pass
-        return None
+            sources = await db.get_source_health()
+            return {source['source_url']: source for source in sources}
+        except Exception as e:
+            self.logger.warning(f"读取源统计失败: {e}")
+            return {}
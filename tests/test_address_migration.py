@@ -0,0 +1,90 @@
+"""
+旧版本（文本地址为键）数据库迁移测试
+"""
+
+import sqlite3
+
+import pytest
+
+from proxy_database import ProxyDatabase
+
+
+_OLD_SCHEMA = """
+    CREATE TABLE proxies (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        proxy_address TEXT NOT NULL,
+        ip TEXT NOT NULL,
+        port INTEGER NOT NULL,
+        country TEXT,
+        country_code TEXT,
+        city TEXT,
+        isp TEXT,
+        is_mobile BOOLEAN DEFAULT 0,
+        is_proxy BOOLEAN DEFAULT 0,
+        first_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        last_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE(proxy_address)
+    );
+    CREATE TABLE validation_history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        proxy_id INTEGER NOT NULL,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        is_valid BOOLEAN NOT NULL,
+        response_time REAL,
+        test_url TEXT,
+        error_message TEXT,
+        score REAL DEFAULT 0
+    );
+    CREATE TABLE proxy_blacklist (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        proxy_address TEXT UNIQUE NOT NULL,
+        fail_count INTEGER DEFAULT 1,
+        first_failed TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        last_failed TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        reason TEXT,
+        auto_added BOOLEAN DEFAULT 1
+    );
+"""
+
+
+def test_unpackable_rows_are_kept_in_side_tables(tmp_path):
+    path = str(tmp_path / 'proxies.db')
+    conn = sqlite3.connect(path)
+    conn.executescript(_OLD_SCHEMA)
+    for address in ('1.2.3.4:1080', '[2001:db8::1]:1080', '5.6.7.8:080'):
+        ip, _, port = address.rpartition(':')
+        conn.execute("INSERT INTO proxies (proxy_address, ip, port) VALUES (?, ?, ?)", (address, ip, int(port)))
+    conn.executemany("INSERT INTO validation_history (proxy_id, is_valid, response_time) VALUES (?, 1, 0.5)",
+                     [(1,), (2,), (2,), (3,)])
+    conn.executemany("INSERT INTO proxy_blacklist (proxy_address, reason) VALUES (?, 'old')",
+                     [('9.9.9.9:1080',), ('bad-host:1080',)])
+    conn.commit()
+    conn.close()
+
+    db = ProxyDatabase(path)
+    with db._get_connection() as conn:
+        def rows(sql):
+            return [tuple(row) for row in conn.execute(sql)]
+
+        assert rows("SELECT id, proxy_address FROM proxies") == [(1, '1.2.3.4:1080')]
+        assert rows("SELECT id, proxy_address FROM proxies_unmigrated ORDER BY id") == [
+            (2, '[2001:db8::1]:1080'), (3, '5.6.7.8:080'),
+        ]
+        assert rows("SELECT proxy_id FROM validation_history") == [(1,)]
+        assert rows("SELECT proxy_id FROM validation_history_unmigrated ORDER BY id") == [(2,), (2,), (3,)]
+        assert rows("SELECT proxy_id FROM proxy_stats") == [(1,)]
+        assert rows("SELECT proxy_address FROM proxy_blacklist") == [('9.9.9.9:1080',)]
+        assert rows("SELECT proxy_address, reason FROM proxy_blacklist_unmigrated") == [('bad-host:1080', 'old')]
+
+    # 自增序列保留，新代理不会复用旁表中的 id
+    db.save_validation_batch([({'proxy': '4.4.4.4:1080'}, {'is_valid': True, 'response_time': 0.2, 'score': 1})])
+    assert db.get_proxy_stats('4.4.4.4:1080')['id'] > 3
+    db.close()
+
+
+def test_rejects_sqlite_without_generated_columns(tmp_path, monkeypatch):
+    monkeypatch.setattr(sqlite3, 'sqlite_version_info', (3, 30, 1))
+    monkeypatch.setattr(sqlite3, 'sqlite_version', '3.30.1')
+    with pytest.raises(RuntimeError, match='3.30.1'):
+        ProxyDatabase(str(tmp_path / 'proxies.db'))
+    assert not (tmp_path / 'proxies.db').exists()
@@ -0,0 +1,98 @@
+"""
+bandwidth_meter 测试（对本地文件服务器测量）
+"""
+
+import asyncio
+
+import aiohttp
+from aiohttp import web
+
+from bandwidth_meter import bandwidth_score, measure_bandwidth, start_file_server
+
+
+def with_file_server(test, **server_kwargs):
+    """启动本地文件服务器，在其上运行 test(session, url)"""
+    async def run():
+        runner, url = await start_file_server(**server_kwargs)
+        try:
+            async with aiohttp.ClientSession() as session:
+                return await test(session, url)
+        finally:
+            await runner.cleanup()
+    return asyncio.run(run())
+
+
+def test_reads_whole_file_and_reports_ttfb():
+    size = 256 * 1024
+
+    async def test(session, url):
+        return await measure_bandwidth(session, url, min_bytes=size * 2)
+
+    result = with_file_server(test, size=size, delay=0.2)
+    assert result['stopped'] == 'complete'
+    assert result['bytes'] == size
+    assert result['ttfb'] >= 0.2
+    assert result['bandwidth_kbps'] > 0
+
+
+def test_stops_at_max_bytes():
+    async def test(session, url):
+        return await measure_bandwidth(session, url, max_bytes=128 * 1024, min_bytes=10 ** 9)
+
+    result = with_file_server(test, size=1024 * 1024)
+    assert result['stopped'] == 'max_bytes'
+    assert 128 * 1024 <= result['bytes'] < 1024 * 1024
+
+
+def test_stops_when_estimate_is_stable():
+    async def test(session, url):
+        return await measure_bandwidth(session, url, window=0.25, min_bytes=16 * 1024,
+                                       stable_tolerance=0.3, floor_kbps=1)
+
+    result = with_file_server(test, size=4 * 1024 * 1024, rate_kbps=200)
+    assert result['stopped'] == 'stable'
+    assert 100 < result['bandwidth_kbps'] < 300
+
+
+def test_below_floor_reports_the_triggering_window():
+    """先快后停顿：报告的应是触发下限的窗口估值，而不是之前较快窗口的估值"""
+    async def handle(request):
+        response = web.StreamResponse()
+        await response.prepare(request)
+        chunk = b'\0' * 1024
+        try:
+            for _ in range(100):            # 约 100KB/s，持续 1 秒
+                await response.write(chunk)
+                await asyncio.sleep(0.01)
+            await asyncio.sleep(0.6)        # 停顿
+            for _ in range(20):             # 之后每秒仅约 2KB
+                await response.write(chunk)
+                await asyncio.sleep(0.5)
+        except ConnectionResetError:
+            pass
+        return response
+
+    async def run():
+        app = web.Application()
+        app.router.add_get('/test.bin', handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, '127.0.0.1', 0).start()
+        url = f"http://127.0.0.1:{runner.addresses[0][1]}/test.bin"
+        try:
+            async with aiohttp.ClientSession() as session:
+                return await measure_bandwidth(session, url, window=0.25, min_bytes=10 ** 9,
+                                               floor_kbps=20, floor_grace=1.0)
+        finally:
+            await runner.cleanup()
+
+    result = asyncio.run(run())
+    assert result['stopped'] == 'below_floor'
+    assert result['bandwidth_kbps'] < 20
+
+
+def test_bandwidth_score_tiers():
+    assert bandwidth_score(None) == 0
+    assert bandwidth_score(30) == 1
+    assert bandwidth_score(150) == 4
+    assert bandwidth_score(2000) == 10
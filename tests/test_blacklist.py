@@ -0,0 +1,25 @@
+"""
+黑名单测试
+"""
+
+from proxy_database import ProxyDatabase
+
+
+def test_auto_blacklist_keeps_existing_entries(tmp_path):
+    db = ProxyDatabase(str(tmp_path / 'proxies.db'))
+    failure = {'is_valid': False, 'response_time': None, 'score': 0}
+    db.save_validation_batch([({'proxy': f"10.0.0.{i}:1080"}, failure) for i in range(5)] * 3)
+    db.add_to_blacklist('10.0.0.1:1080', '手动加入', auto_added=False)
+
+    assert db.auto_blacklist_failing_proxies(fail_threshold=2) == 4
+    assert db.auto_blacklist_failing_proxies(fail_threshold=2) == 0
+
+    with db._get_connection() as conn:
+        manual = conn.execute(
+            "SELECT reason, fail_count, auto_added FROM proxy_blacklist WHERE proxy_address = ?",
+            ('10.0.0.1:1080',)).fetchone()
+        flagged = conn.execute("SELECT COUNT(*) FROM proxy_stats WHERE is_blacklisted = 1").fetchone()[0]
+    assert (manual['reason'], manual['fail_count'], manual['auto_added']) == ('手动加入', 1, 0)
+    assert flagged == 5
+    assert len(db.get_blacklist_index()) == 5
+    db.close()
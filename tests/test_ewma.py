@@ -0,0 +1,34 @@
+"""
+时间衰减加权成功率/延迟测试
+"""
+
+import pytest
+
+from proxy_database import ProxyDatabase
+
+
+def test_repeated_samples_in_one_batch_are_not_dropped(tmp_path):
+    db = ProxyDatabase(str(tmp_path / 'proxies.db'))
+    address = '1.2.3.4:1080'
+    db.save_validation_batch([
+        ({'proxy': address}, {'is_valid': True, 'response_time': 1.0, 'score': 50}),
+        ({'proxy': address}, {'is_valid': False, 'response_time': None, 'score': 0}),
+        ({'proxy': address}, {'is_valid': True, 'response_time': 3.0, 'score': 50}),
+    ])
+
+    stats = db.get_proxy_stats(address)
+    alpha = db.ewma_min_alpha
+    assert 0 < alpha < 1
+    # 三次观测共用一个 now：每次至少以最小权重计入
+    success = 1.0 + alpha * (0.0 - 1.0)
+    success += alpha * (1.0 - success)
+    assert stats['ewma_success'] == pytest.approx(success)
+    assert stats['ewma_latency'] == pytest.approx(1.0 + alpha * (3.0 - 1.0))
+    db.close()
+
+
+def test_elapsed_half_life_still_halves_old_weight(tmp_path):
+    db = ProxyDatabase(str(tmp_path / 'proxies.db'), ewma_half_life_hours=24)
+    assert db._ewma(0.0, 0.0, 1.0, 24 * 3600) == pytest.approx(0.5)
+    assert db._ewma(0.0, 0.0, 1.0, 0.0) == pytest.approx(db.ewma_min_alpha)
+    db.close()
@@ -0,0 +1,69 @@
+"""
+批量地理位置查询测试（对本地模拟的 ip-api /batch 接口）
+"""
+
+import asyncio
+import sqlite3
+import time
+
+from geo_batch import GeoBatchResolver, start_mock_batch_server
+from geo_cache import GeoCache
+
+
+def test_resolve_uses_persistent_cache_in_one_query(tmp_path):
+    path = str(tmp_path / 'proxies.db')
+    ips = [f"10.0.{i // 256}.{i % 256}" for i in range(250)]
+
+    async def resolve(cache):
+        runner, app, batch_url = await start_mock_batch_server()
+        try:
+            results = await GeoBatchResolver(cache, batch_url=batch_url).resolve(ips)
+            return results, app['requests']
+        finally:
+            await runner.cleanup()
+
+    results, requests = asyncio.run(resolve(GeoCache(path)))
+    assert len(results) == 250 and len(requests) == 3
+
+    # 新进程：进程内缓存为空，全部命中持久化缓存，不再发出请求
+    cache = GeoCache(path)
+    statements = []
+    cache._conn.set_trace_callback(statements.append)
+    results, requests = asyncio.run(resolve(cache))
+    assert len(results) == 250 and requests == []
+    assert cache.get_stats()['db_hits'] == 250
+    assert len([sql for sql in statements if sql.startswith('SELECT')]) == 1
+
+
+def test_resolve_does_not_block_loop_on_write_lock(tmp_path):
+    """另一连接持有写锁时，写回缓存在线程中等待，事件循环照常运行"""
+    path = str(tmp_path / 'proxies.db')
+    cache = GeoCache(path)
+    writer = sqlite3.connect(path, isolation_level=None)
+
+    async def run():
+        runner, app, batch_url = await start_mock_batch_server()
+        writer.execute("BEGIN IMMEDIATE")
+        loop = asyncio.get_running_loop()
+        loop.call_later(0.5, writer.execute, "COMMIT")
+        try:
+            ticks = []
+
+            async def heartbeat():
+                while True:
+                    ticks.append(time.perf_counter())
+                    await asyncio.sleep(0.02)
+
+            ticker = asyncio.create_task(heartbeat())
+            results = await GeoBatchResolver(cache, batch_url=batch_url).resolve(['1.1.1.1'])
+            ticker.cancel()
+            return results, ticks
+        finally:
+            await runner.cleanup()
+
+    results, ticks = asyncio.run(run())
+    assert '1.1.1.1' in results
+    assert ticks[-1] - ticks[0] >= 0.4
+    assert max(b - a for a, b in zip(ticks, ticks[1:])) < 0.2
+    writer.close()
+    cache.close()
@@ -0,0 +1,49 @@
+"""
+延迟草图及按分位数排序的最佳代理查询测试
+"""
+
+import random
+import struct
+
+from latency_sketch import SKETCH_BUCKETS, LatencySketch, sketch_quantile
+from proxy_database import ProxyDatabase
+
+
+def test_blob_is_little_endian():
+    sketch = LatencySketch.from_values([0.005] * 3 + [1000.0] * 258)
+    data = sketch.to_bytes()
+    counts = struct.unpack(f'<{SKETCH_BUCKETS}H', data)
+    assert counts[0] == 3
+    assert counts[-1] == 258
+    assert LatencySketch.from_bytes(data).counts == sketch.counts
+
+
+def test_sketch_quantile_matches_sketch():
+    rng = random.Random(0)
+    sketch = LatencySketch.from_values(rng.lognormvariate(0, 1) for _ in range(500))
+    for q in (0.5, 0.9, 0.99):
+        assert sketch_quantile(sketch.to_bytes(), q) == round(sketch.quantile(q), 4)
+    assert sketch_quantile(None, 0.5) is None
+
+
+def test_best_proxies_ordered_by_percentile_over_all_proxies(tmp_path):
+    db = ProxyDatabase(str(tmp_path / 'proxies.db'))
+    rng = random.Random(1)
+    entries = []
+    for i in range(300):
+        address = f"10.0.{i // 100}.{i % 100}:1080"
+        # 评分与延迟无关：最快的代理不一定评分最高
+        score = rng.uniform(0, 100)
+        base = rng.uniform(0.05, 3)
+        for _ in range(4):
+            entries.append(({'proxy': address}, {
+                'is_valid': True, 'response_time': base * rng.uniform(0.8, 1.25), 'score': score,
+            }))
+    rng.shuffle(entries)
+    db.save_validation_batch(entries)
+
+    everything = db.get_best_proxies(limit=1000, min_checks=1)
+    for order_by in ('p50', 'p90', 'p99'):
+        best = db.get_best_proxies(limit=10, min_checks=1, order_by=order_by)
+        assert [p[order_by] for p in best] == sorted(p[order_by] for p in everything)[:10]
+    db.close()
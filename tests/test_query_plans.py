@@ -0,0 +1,43 @@
+"""
+热点查询执行计划回归测试
+在小规模合成数据库上执行 query_plan_check 的全部热点方法，断言没有全表扫描
+（覆盖索引扫描只允许 COVERING_SCAN_ALLOWLIST 中列出的方法和表）
+"""
+
+import pytest
+
+from query_plan_check import (
+    COVERING_SCAN_ALLOWLIST, HOT_QUERIES, build_synthetic_db, capture_statements, full_scans,
+)
+
+
+@pytest.fixture(scope='module')
+def synthetic_db(tmp_path_factory):
+    db = build_synthetic_db(str(tmp_path_factory.mktemp('plans') / 'query_plan.db'),
+                            checks=20000, pool_size=2000)
+    addresses = [row['proxy_address'] for row in db._connect().execute(
+        "SELECT proxy_address FROM proxies ORDER BY random() LIMIT 200"
+    )]
+    yield db, addresses
+    db.close()
+
+
+@pytest.mark.parametrize('name', list(HOT_QUERIES))
+def test_hot_query_has_no_full_scan(synthetic_db, name):
+    db, addresses = synthetic_db
+    conn = db._connect()
+    statements = capture_statements(db, lambda: HOT_QUERIES[name](db, addresses))
+    assert statements, f"{name} 未执行任何 SQL"
+
+    allowed = COVERING_SCAN_ALLOWLIST.get(name, {})
+    problems = [(detail, ' '.join(sql.split())[:160])
+                for sql in statements for detail in full_scans(conn, sql, allowed)]
+    assert problems == []
+
+
+def test_covering_scans_outside_allowlist_are_reported(synthetic_db):
+    db, _ = synthetic_db
+    conn = db._connect()
+    sql = "SELECT COUNT(*) FROM proxy_blacklist"
+    assert full_scans(conn, sql)
+    assert full_scans(conn, sql, COVERING_SCAN_ALLOWLIST['get_blacklist_index']) == []
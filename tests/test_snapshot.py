@@ -0,0 +1,52 @@
+"""
+只读快照测试
+"""
+
+import os
+import sqlite3
+import stat
+
+import pytest
+
+from proxy_database import ProxyDatabase
+
+
+def _save(db, address):
+    db.save_validation_batch([({'proxy': address}, {'is_valid': True, 'response_time': 0.3, 'score': 50})])
+
+
+def test_reader_switches_to_snapshot_once_published(tmp_path):
+    path = str(tmp_path / 'proxies.db')
+    live = ProxyDatabase(path)
+    _save(live, '1.1.1.1:1080')
+
+    reader = ProxyDatabase.open_snapshot(path)
+    assert reader.get_database_stats()['total_proxies'] == 1
+
+    live.publish_snapshot()
+    _save(live, '2.2.2.2:1080')
+    # 同一个实例在快照发布后读取快照，不再看到之后的写入
+    assert reader.get_database_stats()['total_proxies'] == 1
+    assert live.get_database_stats()['total_proxies'] == 2
+
+    live.publish_snapshot()
+    assert reader.get_database_stats()['total_proxies'] == 2
+    reader.close()
+    live.close()
+
+
+def test_snapshot_has_database_permissions(tmp_path):
+    path = str(tmp_path / 'proxies.db')
+    live = ProxyDatabase(path)
+    os.chmod(path, 0o644)
+    snapshot_path = live.publish_snapshot()
+    assert stat.S_IMODE(os.stat(snapshot_path).st_mode) == 0o644
+    live.close()
+
+
+def test_missing_snapshot_and_database_fails(tmp_path):
+    path = str(tmp_path / 'proxies.db')
+    reader = ProxyDatabase.open_snapshot(path)
+    with pytest.raises(sqlite3.OperationalError):
+        reader.get_best_proxies()
+    assert not os.path.exists(path)
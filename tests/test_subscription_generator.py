@@ -0,0 +1,46 @@
+"""
+订阅生成器评分门槛测试
+"""
+
+import json
+from types import SimpleNamespace
+
+from optional.subscription.subscription_generator import MIN_SCORE, SubscriptionGenerator
+
+
+def _generator(tmp_path, proxies, **kwargs):
+    json_path = tmp_path / 'proxies.json'
+    json_path.write_text(json.dumps({'proxies': proxies}), encoding='utf-8')
+    return SubscriptionGenerator(str(json_path), str(tmp_path / 'out'), **kwargs)
+
+
+def _proxy(address, response_time, **extra):
+    return dict(proxy=address, is_valid=True, response_time=response_time,
+                country='Brazil', country_code='BR', **extra)
+
+
+def test_standard_cutoff_matches_old_validator_rule(tmp_path):
+    # 旧 0-17 分制的 10 分门槛：响应 < 5 秒保留；被标记为代理时响应 < 3 秒保留
+    assert MIN_SCORE == 40.0
+    generator = _generator(tmp_path, [
+        _proxy('1.0.0.1:1080', 4.0),
+        _proxy('1.0.0.2:1080', 6.0),
+        _proxy('1.0.0.3:1080', 2.5, is_proxy=True),
+        _proxy('1.0.0.4:1080', 4.0, is_proxy=True),
+        {'proxy': '1.0.0.5:1080', 'score': 39.9},
+        {'proxy': '1.0.0.6:1080', 'score': 40.0},
+    ])
+    generator.generate_socks5_subscriptions()
+
+    lines = (tmp_path / 'out' / 'socks5-all.txt').read_text(encoding='utf-8').splitlines()
+    assert sorted(line for line in lines if line and not line.startswith('#')) == [
+        '1.0.0.1:1080', '1.0.0.3:1080', '1.0.0.6:1080',
+    ]
+
+
+def test_fallback_scores_use_configured_weights(tmp_path):
+    proxies = [_proxy('1.0.0.1:1080', 4.0)]
+    default = _generator(tmp_path, proxies)
+    config = SimpleNamespace(scoring_weights={'geo_other': 30})
+    weighted = _generator(tmp_path, proxies, config=config)
+    assert weighted._get_score(weighted.proxies[0]) == default._get_score(default.proxies[0]) + 22
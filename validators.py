@@ -7,28 +7,58 @@ import aiohttp
 import time
 import logging
 import sys
-from typing import List, Dict
+import json
+from typing import Callable, List, Dict, Optional
 from aiohttp_socks import ProxyConnector
 from tqdm.asyncio import tqdm # 引入tqdm
 
+from geo_cache import GeoCache
+from geo_batch import GeoBatchResolver
+from geoip_filter import GeoIPPreFilter
+from country_codes import resolve_country_code
+from scoring import ScoringEngine, ScoringWeights
+from judge_server import determine_anonymity, detect_real_ip, parse_judge_response
+from proxy_utils import is_valid_proxy_format
+
 
 class ProxyValidator:
     """代理验证器"""
     
-    def __init__(self, config):
+    def __init__(self, config, geo_cache: GeoCache = None, geo_resolver: GeoBatchResolver = None):
         self.config = config
         self.logger = logging.getLogger(__name__)
         self.semaphore = asyncio.Semaphore(config.max_concurrency)
-        # IP-API 速率限制保护 (45次/分钟 → 40次/分钟安全值)
-        self.geo_semaphore = asyncio.Semaphore(40)
+        # 地理位置缓存（未传入时仅使用进程内缓存）
+        self.geo_cache = geo_cache or GeoCache(db_path=None)
+        # 探测结束后从本机批量查询出口IP的地理位置
+        self.geo_resolver = geo_resolver or GeoBatchResolver(self.geo_cache)
+        # 扫描主机的真实出口IP（用于识别透明代理）
+        self.real_ip = None
+        # 统一评分引擎（与 ProxyScorer 同一口径）
+        self.scoring_engine = ScoringEngine(ScoringWeights.from_dict(getattr(config, 'scoring_weights', None)))
+        
+    async def validate_proxies(self, proxies: List[str],
+                               on_result: Optional[Callable[[Dict], None]] = None) -> List[Dict]:
+        """
+        验证代理列表
         
-    async def validate_proxies(self, proxies: List[str]) -> List[Dict]:
-        """验证代理列表"""
+        Args:
+            proxies: 代理列表
+            on_result: 结果回调（如 DatabaseWriter.submit）。失败结果在探测结束时立即回调，
+                       成功结果在补全地理位置并完成国家过滤后回调
+        """
+        if not proxies:
+            return []
+        
+        # 国家白名单 + 本地 GeoIP 库：探测前跳过入口IP不在白名单的候选
+        proxies = self._prefilter_by_country(proxies)
         if not proxies:
             return []
         
         self.logger.info(f"开始验证 {len(proxies)} 个代理")
         
+        await self._detect_real_ip()
+        
         tasks = [self._validate_single_proxy(proxy) for proxy in proxies]
         all_results = []  # 改为保存所有结果
 
@@ -50,6 +80,9 @@ class ProxyValidator:
                 all_results.append(result)
                 processed += 1
                 
+                if on_result and result and not result.get('is_valid'):
+                    on_result(result)
+                
                 # 在非终端环境（如GitHub Actions）中，每1000个打印一次进度
                 if not use_tqdm and processed % 1000 == 0:
                     valid_count = len([r for r in all_results if r and r.get('is_valid')])
@@ -71,39 +104,54 @@ class ProxyValidator:
         valid_proxies = [r for r in all_results if r and r.get('is_valid')]
         self.logger.info(f"验证完成，{len(valid_proxies)}/{len(proxies)} 个代理有效")
         
+        # 批量补全地理位置和评分
+        await self._attach_geo_info(valid_proxies)
+        
         # 应用国家白名单过滤
-        if self.config.target_countries:
+        if self.config.target_country_codes:
             filtered_proxies = self._filter_by_country(valid_proxies)
             self.logger.info(f"国家白名单过滤后，{len(filtered_proxies)}/{len(valid_proxies)} 个代理保留")
-            # 返回所有结果：过滤后的成功 + 所有失败
-            failed_results = [r for r in all_results if r and not r.get('is_valid')]
-            return filtered_proxies + failed_results
+            valid_proxies = filtered_proxies
+        
+        if on_result:
+            for proxy in valid_proxies:
+                on_result(proxy)
         
-        return all_results  # 返回所有结果（包括None的会被过滤）
+        # 返回所有结果：(过滤后的) 成功 + 所有失败
+        failed_results = [r for r in all_results if r and not r.get('is_valid')]
+        return valid_proxies + failed_results
+    
+    def _prefilter_by_country(self, proxies: List[str]) -> List[str]:
+        """用本地 GeoIP 库按入口IP预过滤（未配置时原样返回）"""
+        prefilter = GeoIPPreFilter.from_config(self.config)
+        if prefilter is None:
+            return proxies
+        
+        try:
+            candidates = prefilter.filter(proxies)
+        finally:
+            prefilter.close()
+        
+        stats = prefilter.get_stats()
+        self.logger.info(
+            f"GeoIP 预过滤: 跳过 {stats['skipped']}/{stats['total']} 个候选 "
+            f"(白名单 {stats['kept']}, 抽样 {stats['sampled']}, 未知 {stats['unknown']})"
+        )
+        return candidates
     
     def _filter_by_country(self, proxies: List[Dict]) -> List[Dict]:
-        """根据国家白名单过滤代理"""
+        """根据国家白名单过滤代理（预编译的国家代码集合）"""
+        target_codes = self.config.target_country_codes
         filtered = []
-        target_countries = [country.lower() for country in self.config.target_countries]
         
         for proxy in proxies:
-            country = proxy.get('country', 'Unknown').lower()
-            city = proxy.get('city', 'Unknown')
-            
-            # 检查国家是否在白名单中
-            if country in target_countries:
+            if proxy.get('country_code') in target_codes:
                 filtered.append(proxy)
             else:
-                # 检查国家别名
-                country_found = False
-                for alias, full_name in getattr(self.config, 'country_aliases', {}).items():
-                    if country == full_name.lower() and full_name.lower() in target_countries:
-                        filtered.append(proxy)
-                        country_found = True
-                        break
-                
-                if not country_found:
-                    self.logger.debug(f"代理 {proxy['proxy']} 被过滤（国家: {country}, 城市: {city}）")
+                self.logger.debug(
+                    f"代理 {proxy['proxy']} 被过滤（国家: {proxy.get('country', 'Unknown')}, "
+                    f"城市: {proxy.get('city', 'Unknown')}）"
+                )
         
         return filtered
     
@@ -129,36 +177,24 @@ class ProxyValidator:
                     timeout=aiohttp.ClientTimeout(total=total_timeout, sock_connect=conn_timeout)
                 ) as session:
                     
-                    test_url = self.config.test_urls[0]
+                    test_url = self._get_test_url()
                     async with session.get(test_url) as response:
                         if response.status == 200:
                             response_time = time.time() - start_time
-                            try:
-                                geo_info = await self._get_geo_info(session)
-                            except Exception as e:
-                                self.logger.debug(f"获取地理位置失败 (非致命): {e}")
-                                geo_info = {}
+                            exit_ip, anonymity = self._parse_probe_response(await response.text(), ip)
 
-                            # 创建完整的验证结果
-                            result = {
+                            # 地理位置和评分在所有探测结束后批量补全
+                            return {
                                 'proxy': proxy,
                                 'ip': ip,
                                 'port': port,
                                 'is_valid': True,
                                 'response_time': response_time,
                                 'test_url': test_url,
-                                'country': geo_info.get('country', 'Unknown'),
-                                'country_code': self._get_country_code(geo_info.get('country', 'Unknown')),
-                                'city': geo_info.get('city', 'Unknown'),
-                                'isp': geo_info.get('isp', 'Unknown'),
-                                'is_mobile': geo_info.get('mobile', False),
-                                'is_proxy': geo_info.get('proxy', False),
-                                'anonymity_level': geo_info.get('anonymity', 'Unknown'),  # 新增
+                                'exit_ip': exit_ip,
+                                'anonymity_level': anonymity,
                                 'speed_tier': self._classify_speed(response_time),  # 新增
-                                'score': self._calculate_score(response_time, geo_info)
                             }
-                            
-                            return result
                         else:
                             # 返回失败结果而不是 None
                             return {
@@ -193,77 +229,77 @@ class ProxyValidator:
                 except:
                     return None  # 如果连解析都失败，返回None
     
-    async def _get_geo_info(self, session: aiohttp.ClientSession) -> Dict:
-        """获取地理位置信息（带速率限制保护）"""
-        async with self.geo_semaphore:  # 控制并发调用
-            try:
-                async with session.get("http://ip-api.com/json/") as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        return {
-                            'country': data.get('country', 'Unknown'),
-                            'city': data.get('city', 'Unknown'),
-                            'isp': data.get('isp', 'Unknown'),
-                            'mobile': data.get('mobile', False),
-                            'proxy': data.get('proxy', False),
-                            'anonymity': self._determine_anonymity(data)
-                        }
-            except Exception as e:
-                self.logger.warning(f"获取地理位置失败: {e}")
-                raise  # 重新抛出异常，让上层捕获
+    def _get_test_url(self) -> str:
+        """探测地址：优先使用 Judge，未配置时退回第一个测试URL"""
+        return getattr(self.config, 'judge_url', None) or self.config.test_urls[0]
     
-    def _calculate_score(self, response_time: float, geo_info: Dict) -> float:
-        """计算代理评分"""
-        score = 10.0
+    async def _detect_real_ip(self):
+        """不经代理请求一次 Judge，记录扫描主机的真实出口IP"""
+        if self.real_ip:
+            return
         
-        if response_time < 1.0:
-            score += 5.0
-        elif response_time < 3.0:
-            score += 3.0
-        elif response_time < 5.0:
-            score += 1.0
-        else:
-            score -= 2.0
+        try:
+            self.real_ip = await detect_real_ip(self._get_test_url(), float(self.config.timeout))
+            self.logger.debug(f"扫描主机出口IP: {self.real_ip}")
+        except Exception as e:
+            self.logger.warning(f"获取本机出口IP失败，无法识别透明代理: {e}")
+    
+    def _parse_probe_response(self, body: str, default: str):
+        """
+        解析探测响应，返回 (出口IP, 匿名级别)
+        
+        Judge 响应 (judge_server.py / httpbin.org/get) 可得到匿名级别；
+        其它测试URL (httpbin 的 /ip 或 icanhazip 纯文本) 只能得到出口IP
+        """
+        body = (body or '').strip()
+        anonymity = 'Unknown'
+        try:
+            data = json.loads(body)
+            judge = parse_judge_response(data, self.real_ip)
+            candidate = judge['exit_ip']
+            if isinstance(data, dict) and 'headers' in data:
+                anonymity = self._determine_anonymity(judge['headers'])
+        except (ValueError, AttributeError):
+            candidate = body.splitlines()[0].strip() if body else ''
         
-        if geo_info.get('mobile'):
-            score += 2.0
+        if is_valid_proxy_format(f"{candidate}:1", allow_private=True, allow_auth=False):
+            return candidate, anonymity
+        return default, anonymity
+    
+    async def _attach_geo_info(self, results: List[Dict]):
+        """按出口IP批量查询地理位置，并填充国家/ISP等字段和评分"""
+        if not results:
+            return
         
-        if geo_info.get('proxy'):
-            score -= 3.0
+        try:
+            geo_map = await self.geo_resolver.resolve(r['exit_ip'] for r in results)
+        except Exception as e:
+            self.logger.warning(f"批量获取地理位置失败 (非致命): {e}")
+            geo_map = {}
         
-        return max(0.0, score)
+        for result in results:
+            geo_info = geo_map.get(result['exit_ip'], {})
+            
+            result.update({
+                'country': geo_info.get('country', 'Unknown'),
+                'country_code': self._get_country_code(geo_info.get('country', 'Unknown'), geo_info.get('country_code')),
+                'city': geo_info.get('city', 'Unknown'),
+                'isp': geo_info.get('isp', 'Unknown'),
+                'is_mobile': geo_info.get('mobile', False),
+                'is_proxy': geo_info.get('proxy', False),
+            })
+        
+        # 初步评分（无历史数据，写库时再结合历史统计重新评分）
+        for result, score in zip(results, self.scoring_engine.score_batch(results)):
+            result['score'] = score
     
-    def _get_country_code(self, country: str) -> str:
-        """根据国家名获取国家代码"""
-        country_codes = {
-            'United States': 'US',
-            'Japan': 'JP',
-            'Germany': 'DE',
-            'Singapore': 'SG',
-            'Netherlands': 'NL',
-            'United Kingdom': 'GB',
-            'Canada': 'CA',
-            'France': 'FR',
-            'South Korea': 'KR',
-            'Taiwan': 'TW',
-            'Switzerland': 'CH',
-            'Sweden': 'SE',
-            'Australia': 'AU',
-            'Unknown': 'UN'
-        }
-        return country_codes.get(country, country[:2].upper() if len(country) >= 2 else 'UN')
+    def _get_country_code(self, country: str, country_code: str = None) -> str:
+        """根据国家名（或地理位置服务返回的代码）获取 ISO 国家代码"""
+        return resolve_country_code(country_code, country)
     
-    def _determine_anonymity(self, geo_data: Dict) -> str:
-        """确定匿名级别"""
-        is_proxy = geo_data.get('proxy', False)
-        is_mobile = geo_data.get('mobile', False)
-        
-        if is_proxy:
-            return 'Transparent'  # 被识别为代理
-        elif is_mobile:
-            return 'Anonymous'     # 移动IP，较难追踪
-        else:
-            return 'Elite'         # 未被识别，精英匿名
+    def _determine_anonymity(self, headers: Dict) -> str:
+        """根据 Judge 回显的请求头确定匿名级别 (Transparent/Anonymous/Elite)"""
+        return determine_anonymity(headers, self.real_ip)
     
     def _classify_speed(self, response_time: float) -> str:
         """响应时间分级"""